@@ -1,376 +1,646 @@
-from flask import Blueprint, jsonify, request
 import json
-from ortools.sat.python import cp_model
+import queue
+import threading
+import time
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from config import Config
+from Solver.model import ENCODINGS, parse_blocked_slots, parse_fixed_positions
+from Solver.batch import solve_departments
+from Solver.compact import FORMATS, from_compact, to_compact
+from Solver.decompose import solve_schema
+from Solver.jobs import QueueFullError, job_manager
+from Solver.cache import solution_cache, solve_request_key
+from Solver.feasibility import analyze_schema, explain_infeasibility, has_errors
+from Solver.metrics import solver_metrics
+from Solver.profiles import fit_to_cores, profile_key, resolve_profile
+from Solver.repair import repair_timetable
+from Solver.scheduler import (
+    ANONYMOUS, PRIORITIES, QueueTimeoutError, QuotaExceededError, default_priority, solver_scheduler,
+)
+from Solver.sessions import RevisionConflictError, schema_sessions
+from Solver.store import timetable_store
+from Solver.verify import verify_timetable
 
 # Define the Blueprint
 solver_bp = Blueprint('solver', __name__)
 
-# Constants
-DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-SLOTS_PER_DAY = 9
-LUNCH_BREAK_SLOTS = [5]  # Only slot 5 (01:00 PM - 01:40 PM)
-LECTURES_PER_DAY = 4  # Enforce exactly 4 lectures per day per batch
-TIME_SLOTS = [
-    "08:50-09:40", "09:40-10:30", "10:30-11:20", "11:20-12:10", "12:10-01:00",
-    "01:00-01:40",  # LUNCH BREAK
-    "01:40-02:30", "02:30-03:20", "03:20-04:10"
-]
-
-def load_schema(path):
-    """Load the timetable schema JSON."""
-    with open(path, "r") as f:
-        return json.load(f)
-
-def solve_timetable(schema, fixed_positions=None):
+EVENT_POLL_SECONDS = 0.25  # How often a job's event stream looks for new events
+EVENT_KEEPALIVE_SECONDS = 15  # Comment line sent on a quiet event stream so proxies keep it open
+
+def _read_solve_request():
     """
-    Solve timetable using Google OR-Tools CP-SAT.
-    Returns frontend-ready timetable grid with proper display format using day names and time slots.
-    Enforces exactly 4 lectures per day per batch.
+    Turn a generate request body into (solve_args, cache_key, use_cache, error).
+    solve_args are the keyword arguments for solve_schema. A warm start takes the
+    previous timetable either inline ("previous_solution", nested or compact) or by the
+    cache key a previous generate returned ("previous_key"). "profile" names a solver
+    profile and "solver_options" overrides its settings. "anytime": true spends the
+    profile's time limit improving the timetable's soft goals (onehot and interval only).
     """
+    data = request.get_json() or {}
+    schema = data.get('schema')
+    encoding = data.get('encoding', 'onehot')
+
+    if not schema:
+        return None, None, False, (jsonify({"error": "Schema is required"}), 400)
+    if encoding not in ENCODINGS:
+        return None, None, False, (jsonify({"error": f"encoding must be one of {list(ENCODINGS)}"}), 400)
+    anytime = bool(data.get('anytime', False))
+    if anytime and encoding == 'intvar':
+        return None, None, False, (jsonify({"error": "anytime needs the onehot or interval encoding"}), 400)
     try:
-        print("=== SOLVER DEBUG: Starting solver ===")
-        model = cp_model.CpModel()
-        divisions = schema["divisions"]
-        subjects = schema["subjects"]
-        faculty = schema["faculty"]
-        rooms = schema["rooms"]
-        print(f"Solver input: {len(divisions)} divisions, {len(subjects)} subjects, {len(faculty)} faculty, {len(rooms)} rooms")
-
-        # Separate subjects into lectures and labs
-        lecture_subjects = [s for s in subjects if s['type'] == 'Theory']
-        lab_subjects = [s for s in subjects if s['type'] == 'Lab']
-
-        print(f"Subject breakdown: {len(lecture_subjects)} lectures, {len(lab_subjects)} labs")
-
-        # Create index maps
-        lecture_index_map = {subj["code"]: idx for idx, subj in enumerate(lecture_subjects)}
-        lab_index_map = {subj["code"]: idx for idx, subj in enumerate(lab_subjects)}
-
-        # Variables for lectures: timetable_lecture[(day, slot, division)] = lecture_subject_index (-1 means free)
-        timetable_lecture = {}
-        for d in range(len(DAYS)):
-            for s in range(SLOTS_PER_DAY):
-                for div in divisions:
-                    timetable_lecture[(d, s, div["name"])] = model.NewIntVar(
-                        -1, max(0, len(lecture_subjects) - 1),
-                        f"lec_{d}{s}{div['name']}"
-                    )
-
-        # Variables for labs: timetable_lab[(day, slot, division, batch)] = lab_subject_index (-1 means free)
-        timetable_lab = {}
-        for d in range(len(DAYS)):
-            for s in range(SLOTS_PER_DAY):
-                for div in divisions:
-                    for batch in div["batches"]:
-                        timetable_lab[(d, s, div["name"], batch)] = model.NewIntVar(
-                            -1, max(0, len(lab_subjects) - 1),
-                            f"lab_{d}{s}{div['name']}_{batch}"
-                        )
-
-        print("=== SOLVER DEBUG: Variables created ===")
-
-        # Constraint: No classes during lunch break (only slot 5 now)
-        for d in range(len(DAYS)):
-            for s in LUNCH_BREAK_SLOTS:
-                for div in divisions:
-                    model.Add(timetable_lecture[(d, s, div["name"])] == -1)
-                    for batch in div["batches"]:
-                        model.Add(timetable_lab[(d, s, div["name"], batch)] == -1)
-
-        # Apply fixed positions if provided
-        if fixed_positions:
-            print(f"Applying {len(fixed_positions)} fixed positions")
-            for (div_name, batch_name, d, s), subj_code in fixed_positions.items():
-                if subj_code in lecture_index_map:
-                    model.Add(timetable_lecture[(d, s, div_name)] == lecture_index_map[subj_code])
-                elif subj_code in lab_index_map and batch_name:
-                    model.Add(timetable_lab[(d, s, div_name, batch_name)] == lab_index_map[subj_code])
-
-        # Constraint: A division cannot have a lecture and a lab at the same time for the same slot
-        for d in range(len(DAYS)):
-            for s in range(SLOTS_PER_DAY):
-                if s in LUNCH_BREAK_SLOTS:
-                    continue
-                for div in divisions:
-                    # For each batch, ensure no conflict between division lecture and batch lab
-                    for batch in div["batches"]:
-                        is_lecture = model.NewBoolVar(f"is_lec_{d}{s}{div['name']}")
-                        is_lab = model.NewBoolVar(f"is_lab_{d}{s}{div['name']}_{batch}")
-
-                        model.Add(timetable_lecture[(d, s, div["name"])] >= 0).OnlyEnforceIf(is_lecture)
-                        model.Add(timetable_lecture[(d, s, div["name"])] == -1).OnlyEnforceIf(is_lecture.Not())
-
-                        model.Add(timetable_lab[(d, s, div["name"], batch)] >= 0).OnlyEnforceIf(is_lab)
-                        model.Add(timetable_lab[(d, s, div["name"], batch)] == -1).OnlyEnforceIf(is_lab.Not())
-
-                        # At most one can be scheduled
-                        model.Add(is_lecture + is_lab <= 1)
-
-        # Constraint: Exactly 4 lectures per day per batch
-        print("Adding daily lecture count constraint (4 lectures per day per batch)...")
-        for d in range(len(DAYS)):
-            for div in divisions:
-                for batch in div["batches"]:
-                    daily_class_vars = []
-
-                    # Count lectures (these apply to the whole division, so affect this batch)
-                    for s in range(SLOTS_PER_DAY):
-                        if s not in LUNCH_BREAK_SLOTS:
-                            # Boolean variable for whether there's a lecture in this slot
-                            has_lecture = model.NewBoolVar(f"has_lec_{d}{s}{div['name']}")
-                            model.Add(timetable_lecture[(d, s, div["name"])] >= 0).OnlyEnforceIf(has_lecture)
-                            model.Add(timetable_lecture[(d, s, div["name"])] == -1).OnlyEnforceIf(has_lecture.Not())
-                            daily_class_vars.append(has_lecture)
-
-                            # Boolean variable for whether there's a lab for this batch in this slot
-                            has_lab = model.NewBoolVar(f"has_lab_{d}{s}{div['name']}_{batch}")
-                            model.Add(timetable_lab[(d, s, div["name"], batch)] >= 0).OnlyEnforceIf(has_lab)
-                            model.Add(timetable_lab[(d, s, div["name"], batch)] == -1).OnlyEnforceIf(has_lab.Not())
-                            daily_class_vars.append(has_lab)
-
-                    # Exactly 4 classes per day per batch
-                    model.Add(sum(daily_class_vars) == LECTURES_PER_DAY)
-                    print(f"Added constraint: Division {div['name']}, Batch {batch} must have exactly {LECTURES_PER_DAY} classes per day")
-
-        # Lecture frequency constraints (min/max per week) - adjusted for new daily constraint
-        if lecture_subjects:
-            print("Adding lecture frequency constraints...")
-            for subj_index, subj in enumerate(lecture_subjects):
-                min_pw = max(1, subj.get("min_per_week", 1))
-                max_pw = min(subj.get("max_per_week", 7), 7)
-
-                vars_for_subj = []
-                for d in range(len(DAYS)):
-                    for s in range(SLOTS_PER_DAY):
-                        if s not in LUNCH_BREAK_SLOTS:
-                            for div in divisions:
-                                bvar = model.NewBoolVar(f"lec_subj_{subj_index}{d}{s}_{div['name']}")
-                                model.Add(timetable_lecture[(d, s, div["name"])] == subj_index).OnlyEnforceIf(bvar)
-                                model.Add(timetable_lecture[(d, s, div["name"])] != subj_index).OnlyEnforceIf(bvar.Not())
-                                vars_for_subj.append(bvar)
-
-                if vars_for_subj:
-                    model.Add(sum(vars_for_subj) >= min_pw)
-                    model.Add(sum(vars_for_subj) <= max_pw)
-
-        # Lab frequency constraints (simplified)
-        if lab_subjects:
-            print("Adding lab frequency constraints...")
-            for subj_index, subj in enumerate(lab_subjects):
-                min_pw = max(1, subj.get("min_per_week", 1))
-                max_pw = min(subj.get("max_per_week", 5), 5)
-
-                vars_for_subj = []
-                for d in range(len(DAYS)):
-                    for s in range(SLOTS_PER_DAY):
-                        if s not in LUNCH_BREAK_SLOTS:
-                            for div in divisions:
-                                for batch in div["batches"]:
-                                    # Only count if this batch is supposed to take this lab
-                                    batch_names = subj.get("batches", [])
-                                    if not batch_names or batch in batch_names:
-                                        bvar = model.NewBoolVar(f"lab_subj_{subj_index}{d}{s}{div['name']}{batch}")
-                                        model.Add(timetable_lab[(d, s, div["name"], batch)] == subj_index).OnlyEnforceIf(bvar)
-                                        model.Add(timetable_lab[(d, s, div["name"], batch)] != subj_index).OnlyEnforceIf(bvar.Not())
-                                        vars_for_subj.append(bvar)
-
-                if vars_for_subj:
-                    model.Add(sum(vars_for_subj) >= min_pw)
-                    model.Add(sum(vars_for_subj) <= max_pw)
-
-        # Enhanced faculty constraints
-        print("Adding faculty constraints...")
-        for fac in faculty:
-            max_per_day = min(fac.get("max_per_day", 5), 7)
-            max_per_week = min(fac.get("max_per_week", 25), 35)
-
-            weekly_assignments = []
-
-            for d in range(len(DAYS)):
-                daily_assignments = []
-
-                # Check lecture assignments
-                for subj_index, subj in enumerate(lecture_subjects):
-                    if fac["abbr"] in subj.get("faculty", []):
-                        for div in divisions:
-                            for s in range(SLOTS_PER_DAY):
-                                if s not in LUNCH_BREAK_SLOTS:
-                                    bvar = model.NewBoolVar(f"fac_{fac['abbr']}lec{d}{s}{div['name']}_{subj_index}")
-                                    model.Add(timetable_lecture[(d, s, div["name"])] == subj_index).OnlyEnforceIf(bvar)
-                                    model.Add(timetable_lecture[(d, s, div["name"])] != subj_index).OnlyEnforceIf(bvar.Not())
-                                    daily_assignments.append(bvar)
-                                    weekly_assignments.append(bvar)
-
-                # Check lab assignments
-                for subj_index, subj in enumerate(lab_subjects):
-                    if fac["abbr"] in subj.get("faculty", []):
-                        for div in divisions:
-                            for batch in div["batches"]:
-                                batch_names = subj.get("batches", [])
-                                if not batch_names or batch in batch_names:
-                                    for s in range(SLOTS_PER_DAY):
-                                        if s not in LUNCH_BREAK_SLOTS:
-                                            bvar = model.NewBoolVar(f"fac_{fac['abbr']}lab{d}{s}{div['name']}{batch}{subj_index}")
-                                            model.Add(timetable_lab[(d, s, div["name"], batch)] == subj_index).OnlyEnforceIf(bvar)
-                                            model.Add(timetable_lab[(d, s, div["name"], batch)] != subj_index).OnlyEnforceIf(bvar.Not())
-                                            daily_assignments.append(bvar)
-                                            weekly_assignments.append(bvar)
-
-                # Faculty can't be in multiple places at once & daily limit
-                if daily_assignments:
-                    model.Add(sum(daily_assignments) <= max_per_day)
-
-            # Weekly limit for faculty
-            if weekly_assignments:
-                model.Add(sum(weekly_assignments) <= max_per_week)
-
-        # Room capacity and availability constraints
-        print("Adding room constraints...")
-        for room in rooms:
-            room_name = room["name"]
-            room_type = room["type"]
-
-            for d in range(len(DAYS)):
-                for s in range(SLOTS_PER_DAY):
-                    if s not in LUNCH_BREAK_SLOTS:
-                        room_assignments = []
-
-                        # Check if any lectures use this room
-                        for subj_index, subj in enumerate(lecture_subjects):
-                            if subj.get("room_type") == room_type or subj.get("required_room") == room_name:
-                                for div in divisions:
-                                    bvar = model.NewBoolVar(f"room_{room_name}lec{d}{s}{div['name']}_{subj_index}")
-                                    model.Add(timetable_lecture[(d, s, div["name"])] == subj_index).OnlyEnforceIf(bvar)
-                                    model.Add(timetable_lecture[(d, s, div["name"])] != subj_index).OnlyEnforceIf(bvar.Not())
-                                    room_assignments.append(bvar)
-
-                        # Check if any labs use this room
-                        for subj_index, subj in enumerate(lab_subjects):
-                            if subj.get("room_type") == room_type or subj.get("required_room") == room_name:
-                                for div in divisions:
-                                    for batch in div["batches"]:
-                                        batch_names = subj.get("batches", [])
-                                        if not batch_names or batch in batch_names:
-                                            bvar = model.NewBoolVar(f"room_{room_name}lab{d}{s}{div['name']}{batch}{subj_index}")
-                                            model.Add(timetable_lab[(d, s, div["name"], batch)] == subj_index).OnlyEnforceIf(bvar)
-                                            model.Add(timetable_lab[(d, s, div["name"], batch)] != subj_index).OnlyEnforceIf(bvar.Not())
-                                            room_assignments.append(bvar)
-
-                        # Room can only be used by one class at a time
-                        if room_assignments:
-                            model.Add(sum(room_assignments) <= 1)
-
-        print("=== SOLVER DEBUG: All constraints added, starting solve ===")
-
-        # Solve
-        solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = 180
-        solver.parameters.log_search_progress = True
-
-        status = solver.Solve(model)
-
-        print(f"Solver status: {status}")
-        print(f"Solver statistics: {solver.ResponseStats()}")
-
-        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-            print("=== SOLVER DEBUG: Solution found, building output ===")
-
-            output = {}
-            for div in divisions:
-                div_name = div["name"]
-                output[div_name] = {"batches": {}}
-
-                for batch in div["batches"]:
-                    batch_schedule = {}
-
-                    for d in range(len(DAY_NAMES)):
-                        day_name = DAY_NAMES[d]
-                        day_slots = []
-                        daily_class_count = 0
-
-                        for s in range(SLOTS_PER_DAY):
-                            slot_content = "-"
-
-                            if s in LUNCH_BREAK_SLOTS:
-                                slot_content = "LUNCH BREAK"
-                            else:
-                                lec_index = solver.Value(timetable_lecture[(d, s, div_name)])
-                                if lec_index >= 0 and lec_index < len(lecture_subjects):
-                                    subj = lecture_subjects[lec_index]
-                                    faculty_list = subj.get("faculty", [])
-                                    faculty_str = faculty_list[0] if faculty_list else "TBA"
-                                    slot_content = f"{subj['code']}\n{faculty_str}"
-                                    daily_class_count += 1
-
-                                elif batch:
-                                    lab_index = solver.Value(timetable_lab[(d, s, div_name, batch)])
-                                    if lab_index >= 0 and lab_index < len(lab_subjects):
-                                        subj = lab_subjects[lab_index]
-                                        batch_names = subj.get("batches", [])
-                                        if not batch_names or batch in batch_names:
-                                            faculty_list = subj.get("faculty", [])
-                                            faculty_str = faculty_list[0] if faculty_list else "TBA"
-                                            slot_content = f"{subj['code']}\n{faculty_str}"
-                                            daily_class_count += 1
-
-                            day_slots.append(slot_content)
-
-                        print(f"Division {div_name}, Batch {batch}, {day_name}: {daily_class_count} classes scheduled")
-                        batch_schedule[day_name] = day_slots
-
-                    output[div_name]["batches"][batch] = batch_schedule
-
-            print(f"=== SOLVER DEBUG: Output built for {len(output)} divisions ===")
-
-            for div_name, div_data in output.items():
-                print(f"Division {div_name}:")
-                for batch_name, batch_data in div_data["batches"].items():
-                    print(f"  Batch {batch_name}: {list(batch_data.keys())}")
-                    for day, slots in batch_data.items():
-                        class_slots = [i for i, slot in enumerate(slots) if slot not in ['-', 'LUNCH BREAK']]
-                        print(f"    {day}: {len(class_slots)} classes in slots {class_slots}")
-                        if len(class_slots) != LECTURES_PER_DAY:
-                            print(f"    WARNING: Expected {LECTURES_PER_DAY} classes but got {len(class_slots)}")
-
-            return output
-
-        else:
-            print(f"=== SOLVER DEBUG: No solution found, status: {status} ===")
-            if status == cp_model.INFEASIBLE:
-                print("Problem is INFEASIBLE - constraints are too restrictive")
-            elif status == cp_model.UNKNOWN:
-                print("Solver timed out or ran into issues")
-            return None
-
-    except Exception as e:
-        print(f"=== SOLVER EXCEPTION: {str(e)} ===")
-        import traceback
-        print(traceback.format_exc())
-        return None
+        fixed_positions = parse_fixed_positions(data.get('fixed_positions', {}))
+        parse_blocked_slots(schema.get('blocked_slots'))
+        profile = resolve_profile(data.get('profile'), data.get('solver_options'))
+    except ValueError as e:
+        return None, None, False, (jsonify({"error": str(e)}), 400)
+
+    previous = data.get('previous_solution')
+    if isinstance(previous, dict) and previous.get('format') == 'compact':
+        try:
+            previous = from_compact(previous)
+        except ValueError as e:
+            return None, None, False, (jsonify({"error": str(e)}), 400)
+    if previous is None and data.get('previous_key'):
+        previous = solution_cache.get(data['previous_key'])
+        if previous is None:
+            return None, None, False, (jsonify({"error": "Previous solution not found"}), 404)
+    keep_divisions = data.get('keep_divisions') if previous else None
+
+    solve_args = {
+        "schema": schema,
+        "fixed_positions": fixed_positions,
+        "encoding": encoding,
+        "previous": previous,
+        "keep_divisions": keep_divisions,
+        "decompose": bool(data.get('decompose', True)),
+        "profile": profile,
+        "anytime": anytime,
+    }
+    # A preview's first feasible answer must not be served to a request for a thorough run,
+    # whether it named the preview profile or overrode another, nor a plain solve to one
+    # for an optimized timetable
+    cache_key = solve_request_key(
+        schema, fixed_positions, encoding=encoding, previous=previous, keep_divisions=keep_divisions,
+        profile=profile_key(profile), **({"anytime": True} if anytime else {})
+    )
+    return solve_args, cache_key, data.get('use_cache', True), None
+
+def _read_tenant(profile):
+    """
+    (tenant, priority, error) of a solve request. The tenant is the signed-in admin
+    (the JWT identity's id), else "admin_id" (or the save's), else the requesting
+    client's address, so callers that send neither do not queue behind each other as
+    one tenant; a missing or unusable token is not an error. "priority" is
+    "interactive" or "final" and defaults to interactive for first-solution profiles
+    (see Solver.scheduler).
+    """
+    data = request.get_json() or {}
+    identity = None
+    if "flask-jwt-extended" in current_app.extensions:
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except (JWTExtendedException, PyJWTError):
+            pass  # The solver routes do not require a login, an unusable token names no admin
+    admin_id = identity.get('id') if isinstance(identity, dict) else identity
+    if admin_id is None:
+        admin_id = data.get('admin_id')
+    if admin_id is None and isinstance(data.get('save'), dict):
+        admin_id = data['save'].get('admin_id')
+    if admin_id is not None and not str(admin_id).isdigit():
+        return None, None, (jsonify({"error": "admin_id must be a number"}), 400)
+    priority = data.get('priority') or default_priority(profile)
+    if priority not in PRIORITIES:
+        return None, None, (jsonify({"error": f"priority must be one of {list(PRIORITIES)}"}), 400)
+    if admin_id is not None:
+        return str(int(admin_id)), priority, None
+    return f"{ANONYMOUS}:{request.remote_addr or 'unknown'}", priority, None
+
+def _with_cores(solve_args, cores):
+    """solve_args limited to the search workers the scheduler gave the solve."""
+    profile, max_workers = fit_to_cores(solve_args["profile"], cores)
+    return {**solve_args, "profile": profile, "max_workers": max_workers}
+
+def _turn(tenant, priority, profile):
+    """Wait for a synchronous solve's turn (see scheduler.turn)."""
+    return solver_scheduler.turn(tenant, priority, profile["workers"], Config.SOLVER_QUEUE_WAIT_SECONDS)
+
+def _scheduler_error(error):
+    return jsonify({"error": str(error)}), 429 if isinstance(error, QuotaExceededError) else 503
+
+def _output_format(value):
+    """The requested timetable format ("nested" when not given), or None if it is unknown."""
+    value = value or FORMATS[0]
+    return value if value in FORMATS else None
+
+def _format_error():
+    return jsonify({"error": f"format must be one of {list(FORMATS)}"}), 400
+
+def _timetable_response(timetable, meta, with_meta, output_format="nested"):
+    """
+    Return the bare timetable, or {"timetable", "meta"} when the client asked for metadata.
+    output_format "compact" sends the timetable in the columnar form of Solver.compact.
+    """
+    if output_format == "compact":
+        timetable = to_compact(timetable)
+    if with_meta:
+        return jsonify({"timetable": timetable, "meta": meta})
+    return jsonify(timetable)
+
+def _save_timetable(save, schema, timetable, meta):
+    """Store a generated timetable as the next version of save's admin_id and term (see Solver.store)."""
+    rooms = [room["name"] for room in schema.get("rooms", [])]
+    meta["stored"] = timetable_store.save(int(save["admin_id"]), str(save["term"]), timetable, rooms=rooms,
+                                          label=save.get("label"), meta=meta)
 
 @solver_bp.route('/generate', methods=['POST'])
 def generate_timetable():
-    """API endpoint to generate a timetable."""
-    data = request.get_json()
-    schema = data.get('schema')
-    fixed_positions = data.get('fixed_positions', {})
-
-    if not schema:
-        return jsonify({"error": "Schema is required"}), 400
+    """
+    API endpoint to generate a timetable. "save": {"admin_id", "term", "label"} also
+    stores it as the next saved version (the version is in meta["stored"]).
+    """
+    solve_args, cache_key, use_cache, error = _read_solve_request()
+    if error:
+        return error
+    with_meta = (request.get_json() or {}).get('with_meta', False)
+    output_format = _output_format((request.get_json() or {}).get('format'))
+    if output_format is None:
+        return _format_error()
+    save = (request.get_json() or {}).get('save')
+    if save is not None and not (isinstance(save, dict) and str(save.get('admin_id', '')).isdigit() and save.get('term')):
+        return jsonify({"error": "save needs admin_id and term"}), 400
+    tenant, priority, error = _read_tenant(solve_args["profile"])
+    if error:
+        return error
+
+    timetable = solution_cache.get(cache_key) if use_cache else None
+    if timetable:
+        meta = {"status": "CACHED", "cache_key": cache_key}
+        if save:
+            _save_timetable(save, solve_args["schema"], timetable, meta)
+        response = _timetable_response(timetable, meta, with_meta, output_format)
+        response.headers['X-Timetable-Cache'] = 'hit'
+        response.headers['X-Timetable-Key'] = cache_key
+        return response
 
-    timetable = solve_timetable(schema, fixed_positions)
+    try:
+        with _turn(tenant, priority, solve_args["profile"]) as cores:
+            timetable, meta = solve_schema(**_with_cores(solve_args, cores))
+    except (QuotaExceededError, QueueTimeoutError) as e:
+        return _scheduler_error(e)
+    solver_metrics.record(meta)
     if timetable:
-        return jsonify(timetable)
+        solution_cache.put(cache_key, timetable)
+        meta["cache_key"] = cache_key
+        if save:
+            _save_timetable(save, solve_args["schema"], timetable, meta)
+        response = _timetable_response(timetable, meta, with_meta, output_format)
+        response.headers['X-Timetable-Cache'] = 'miss' if use_cache else 'bypass'
+        response.headers['X-Timetable-Key'] = cache_key
+        return response
+    elif meta["status"] == "INFEASIBLE":
+        return jsonify({"error": "No timetable satisfies the schema",
+                        "violations": meta.get("violations", []), "meta": meta}), 422
     else:
-        return jsonify({"error": "Failed to generate timetable"}), 500
+        return jsonify({"error": "Failed to generate timetable", "meta": meta}), 500
 
-if __name__ == "__main__":
-    # For testing this file directly
-    schema = load_schema("schema.json")
-    fixed_positions = {}
-    timetable = solve_timetable(schema, fixed_positions=fixed_positions)
+@solver_bp.route('/generate/alternatives', methods=['POST'])
+def generate_alternatives():
+    """
+    Stream up to "count" distinct timetables from one solve as newline-delimited JSON.
+    Each {"type": "solution"} line is sent as soon as CP-SAT finds a timetable that
+    differs from the ones already sent in at least "min_distance" of the cells; a
+    final {"type": "done"} line carries the solve metadata. "format": "compact" sends
+    the timetables in the columnar form. The stream opens at once; the solve waits
+    there for its turn and a full queue ends it with an {"type": "error"} line.
+    """
+    solve_args, _, _, error = _read_solve_request()
+    if error:
+        return error
+    tenant, priority, error = _read_tenant(solve_args["profile"])
+    if error:
+        return error
+    data = request.get_json() or {}
+    try:
+        count = int(data.get('count', 5))
+        min_distance = float(data.get('min_distance', 0.1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "count and min_distance must be numbers"}), 400
+    if not 1 <= count <= Config.SOLVER_MAX_ALTERNATIVES or not 0 <= min_distance <= 1:
+        return jsonify({"error": f"count must be 1-{Config.SOLVER_MAX_ALTERNATIVES} "
+                                 f"and min_distance between 0 and 1"}), 400
+    output_format = _output_format(data.get('format'))
+    if output_format is None:
+        return _format_error()
+
+    events = queue.Queue()
+    disconnected = threading.Event()
+
+    def run():
+        def on_solution(timetable, info):
+            if output_format == "compact":
+                timetable = to_compact(timetable)
+            events.put({"type": "solution", **info, "timetable": timetable})
+        try:
+            with _turn(tenant, priority, solve_args["profile"]) as cores:
+                _, meta = solve_schema(**_with_cores(solve_args, cores), solutions=count, min_distance=min_distance,
+                                       on_solution=on_solution, should_stop=disconnected.is_set)
+            solver_metrics.record(meta)
+            events.put({"type": "done", "meta": meta})
+        except Exception as e:
+            events.put({"type": "error", "error": str(e)})
+
+    def stream():
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            while True:
+                event = events.get()
+                yield json.dumps(event) + "\n"
+                if event["type"] != "solution":
+                    return
+        finally:
+            disconnected.set()  # Client went away or stream finished: stop the search
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+@solver_bp.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """
+    Generate the timetables of several departments in one request: "departments" is a
+    list of {"name", "schema", "fixed_positions"}. Departments sharing faculty or rooms
+    (by abbr and name) are solved together so they never clash, the others side by
+    side (see Solver.batch). Always 200 when the request is valid: each department has
+    its own timetable (null when its group was not solved) and meta with its timings.
+    """
+    data = request.get_json() or {}
+    encoding = data.get('encoding', 'onehot')
+    if encoding not in ENCODINGS:
+        return jsonify({"error": f"encoding must be one of {list(ENCODINGS)}"}), 400
+    output_format = _output_format(data.get('format'))
+    if output_format is None:
+        return _format_error()
+    try:
+        profile = resolve_profile(data.get('profile'), data.get('solver_options'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tenant, priority, error = _read_tenant(profile)
+    if error:
+        return error
+
+    try:
+        with _turn(tenant, priority, profile) as cores:
+            scheduled, max_workers = fit_to_cores(profile, cores)
+            report = solve_departments(data.get('departments'), encoding=encoding, profile=scheduled,
+                                       max_workers=max_workers)
+    except (QuotaExceededError, QueueTimeoutError) as e:
+        return _scheduler_error(e)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": f"Invalid departments: {e}"}), 400
+    for group in report["groups"]:
+        solver_metrics.record(group["meta"])
+    if output_format == "compact":
+        for department in report["departments"].values():
+            if department["timetable"]:
+                department["timetable"] = to_compact(department["timetable"])
+    return jsonify(report)
+
+@solver_bp.route('/generate/sessions', methods=['POST'])
+def create_schema_session():
+    """
+    Keep a schema and its pins on the server for iterative editing (see Solver.sessions).
+    Later edits are sent as JSON patches and only the parts they touch are solved again.
+    """
+    data = request.get_json() or {}
+    if not data.get('schema'):
+        return jsonify({"error": "Schema is required"}), 400
+    try:
+        summary = schema_sessions.create(data['schema'], data.get('fixed_positions'))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid schema: {e}"}), 400
+    return jsonify(summary), 201
+
+@solver_bp.route('/generate/sessions/<session_id>', methods=['GET'])
+def get_schema_session(session_id):
+    """A session's revision and sizes; ?with_schema=1 adds its {"schema", "fixed_positions"} document."""
+    summary = schema_sessions.get(session_id, with_document=bool(request.args.get('with_schema', type=int)))
+    if summary is None:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify(summary)
+
+def _patch_session(session_id, data):
+    """Apply a request's "patch" (at its optional "revision") to a session: (summary, error response)."""
+    try:
+        summary = schema_sessions.patch(session_id, data.get('patch'), data.get('revision'))
+    except RevisionConflictError as e:
+        return None, (jsonify({"error": str(e)}), 409)
+    except (ValueError, KeyError, TypeError) as e:
+        return None, (jsonify({"error": f"Invalid patch: {e}"}), 400)
+    if summary is None:
+        return None, (jsonify({"error": "Session not found"}), 404)
+    return summary, None
+
+@solver_bp.route('/generate/sessions/<session_id>', methods=['PATCH'])
+def patch_schema_session(session_id):
+    """
+    Apply {"patch": [JSON patch operations]} to a session as one new revision. With
+    "revision" the patch only applies to that revision (409 otherwise).
+    """
+    summary, error = _patch_session(session_id, request.get_json() or {})
+    return error or jsonify(summary)
+
+@solver_bp.route('/generate/sessions/<session_id>', methods=['DELETE'])
+def delete_schema_session(session_id):
+    """Forget a session."""
+    if not schema_sessions.delete(session_id):
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"session_id": session_id, "deleted": True})
+
+@solver_bp.route('/generate/sessions/<session_id>/generate', methods=['POST'])
+def generate_session_timetable(session_id):
+    """
+    Generate the timetable of a session's current revision, optionally after applying a
+    "patch" first. Takes the /generate options (encoding, profile, solver_options,
+    format, with_meta) except the schema. Components the edits left unchanged keep
+    their last timetable; meta["session"] says how many.
+    """
+    data = request.get_json() or {}
+    encoding = data.get('encoding', 'onehot')
+    if encoding not in ENCODINGS:
+        return jsonify({"error": f"encoding must be one of {list(ENCODINGS)}"}), 400
+    output_format = _output_format(data.get('format'))
+    if output_format is None:
+        return _format_error()
+    try:
+        profile = resolve_profile(data.get('profile'), data.get('solver_options'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tenant, priority, error = _read_tenant(profile)
+    if error:
+        return error
+    if data.get('patch') is not None:
+        _, error = _patch_session(session_id, data)
+        if error:
+            return error
+
+    try:
+        with _turn(tenant, priority, profile) as cores:
+            scheduled, max_workers = fit_to_cores(profile, cores)
+            timetable, meta = schema_sessions.solve(session_id, encoding=encoding, profile=scheduled,
+                                                    max_workers=max_workers)
+    except (QuotaExceededError, QueueTimeoutError) as e:
+        return _scheduler_error(e)
+    if meta is None:
+        return jsonify({"error": "Session not found"}), 404
+    solver_metrics.record(meta)
     if timetable:
-        print(json.dumps(timetable, indent=2))
+        return _timetable_response(timetable, meta, data.get('with_meta', False), output_format)
+    elif meta["status"] == "INFEASIBLE":
+        return jsonify({"error": "No timetable satisfies the schema",
+                        "violations": meta.get("violations", []), "meta": meta}), 422
     else:
-        print("Failed to generate timetable")
+        return jsonify({"error": "Failed to generate timetable", "meta": meta}), 500
+
+@solver_bp.route('/generate/check', methods=['POST'])
+def check_schema():
+    """
+    Check a schema for provably impossible bounds without solving it.
+    With "explain": true, a schema that passes the counting checks is also tested
+    with CP-SAT and any infeasibility core is reported.
+    """
+    data = request.get_json() or {}
+    schema = data.get('schema')
+    if not schema:
+        return jsonify({"error": "Schema is required"}), 400
+    try:
+        fixed_positions = parse_fixed_positions(data.get('fixed_positions', {}))
+        violations = analyze_schema(schema, fixed_positions)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": f"Invalid schema: {e}"}), 400
+
+    decided = True
+    if data.get('explain') and not has_errors(violations):
+        core = explain_infeasibility(schema, fixed_positions, Config.SOLVER_CORE_TIME_SECONDS)
+        decided = core is not None
+        violations += core or []
+    # feasible is null when CP-SAT ran out of time before deciding
+    return jsonify({"feasible": not has_errors(violations) if decided else None, "violations": violations})
+
+@solver_bp.route('/generate/verify', methods=['POST'])
+def verify_schedule():
+    """
+    Check a timetable (nested or compact) against its schema without solving, e.g.
+    after a manual edit. Reports every broken rule the solver would have enforced.
+    """
+    data = request.get_json() or {}
+    schema = data.get('schema')
+    timetable = data.get('timetable')
+    if not schema or not isinstance(timetable, dict):
+        return jsonify({"error": "Schema and timetable are required"}), 400
+    try:
+        violations = verify_timetable(timetable, schema, data.get('fixed_positions'))
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        return jsonify({"error": f"Invalid schema or timetable: {e}"}), 400
+    return jsonify({"valid": not has_errors(violations), "violations": violations})
+
+@solver_bp.route('/generate/repair', methods=['POST'])
+def repair_schedule():
+    """
+    Apply one change ("teacher unavailable", "room removed" or "cell pinned", see
+    Solver.repair) to an existing timetable and re-solve only the days it affects.
+    Returns {"timetable", "schema", "fixed_positions", "meta"}: the schema and pins
+    with the change applied, for the client to keep.
+    """
+    data = request.get_json() or {}
+    schema = data.get('schema')
+    timetable = data.get('timetable')
+    encoding = data.get('encoding', 'onehot')
+    if not schema or not isinstance(timetable, dict) or not data.get('change'):
+        return jsonify({"error": "Schema, timetable and change are required"}), 400
+    if encoding not in ENCODINGS:
+        return jsonify({"error": f"encoding must be one of {list(ENCODINGS)}"}), 400
+    output_format = _output_format(data.get('format'))
+    if output_format is None:
+        return _format_error()
+    try:
+        if timetable.get('format') == 'compact':
+            timetable = from_compact(timetable)
+        profile = resolve_profile(data.get('profile'), data.get('solver_options'))
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": f"Invalid repair request: {e}"}), 400
+    tenant, priority, error = _read_tenant(profile)
+    if error:
+        return error
+    try:
+        with _turn(tenant, priority, profile) as cores:
+            repaired, meta, schema, fixed_positions = repair_timetable(
+                schema, timetable, data['change'], data.get('fixed_positions'), encoding=encoding,
+                profile=fit_to_cores(profile, cores)[0]
+            )
+    except (QuotaExceededError, QueueTimeoutError) as e:
+        return _scheduler_error(e)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": f"Invalid repair request: {e}"}), 400
+    solver_metrics.record(meta)
+    if repaired is None:
+        status = 422 if meta["status"] == "INFEASIBLE" else 500
+        return jsonify({"error": "No timetable satisfies the changed schema",
+                        "violations": meta.get("violations", []), "meta": meta}), status
+    pins = [{"division": div_name, "batch": batch, "day": d, "slot": s, "subject": code}
+            for (div_name, batch, d, s), code in fixed_positions.items()]
+    return jsonify({"timetable": to_compact(repaired) if output_format == "compact" else repaired,
+                    "schema": schema, "fixed_positions": pins, "meta": meta})
+
+@solver_bp.route('/generate/jobs', methods=['POST'])
+def submit_generate_job():
+    """Queue a timetable solve in the background and return its job id."""
+    solve_args, cache_key, use_cache, error = _read_solve_request()
+    if error:
+        return error
+    tenant, priority, error = _read_tenant(solve_args["profile"])
+    if error:
+        return error
+
+    try:
+        job_id = job_manager.submit(solve_args, cache_key=cache_key, use_cache=use_cache,
+                                    tenant=tenant, priority=priority)
+    except QuotaExceededError as e:
+        return jsonify({"error": str(e)}), 429
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify(job_manager.status(job_id)), 202
+
+@solver_bp.route('/generate/jobs/<job_id>', methods=['GET'])
+def get_generate_job(job_id):
+    """Poll the status and progress of a solve job."""
+    info = job_manager.status(job_id)
+    if info is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(info)
+
+@solver_bp.route('/generate/jobs/<job_id>/result', methods=['GET'])
+def get_generate_job_result(job_id):
+    """
+    Fetch the timetable of a finished job (202 while it is still queued or running).
+    ?with_meta=1 wraps it as {"timetable", "meta"} and ?format=compact sends the columnar form.
+    An anytime job serves its best version so far while it runs, or the one in
+    ?version=N, with the version number in the X-Timetable-Version header.
+    """
+    output_format = _output_format(request.args.get('format'))
+    if output_format is None:
+        return _format_error()
+    version = request.args.get('version', type=int)
+    info, timetable = job_manager.result(job_id, version)
+    if info is None:
+        return jsonify({"error": "Job not found"}), 404
+    if "version" in info:
+        summary = next(v for v in info["versions"] if v["version"] == info["version"])
+        response = _timetable_response(timetable, {"status": info["status"], **summary},
+                                       request.args.get('with_meta', type=int), output_format)
+        response.headers['X-Timetable-Version'] = str(info["version"])
+        return response
+    if version is not None:
+        return jsonify({"error": "Version not found"}), 404
+    if info["status"] == "done":
+        return _timetable_response(timetable, info.get("meta"), request.args.get('with_meta', type=int),
+                                   output_format)
+    if info["status"] in ("queued", "running"):
+        return jsonify(info), 202
+    if info["status"] == "cancelled":
+        return jsonify({"error": "Job was cancelled", **info}), 409
+    return jsonify({"error": "Failed to generate timetable", **info}), 500
+
+@solver_bp.route('/generate/jobs/<job_id>/accept', methods=['POST'])
+def accept_generate_job(job_id):
+    """Stop a running anytime job and keep its best version so far as the result."""
+    try:
+        info = job_manager.accept(job_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    if info is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(info)
+
+def _sse(event_id, event_type, data):
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@solver_bp.route('/generate/jobs/<job_id>/events', methods=['GET'])
+def stream_generate_job(job_id):
+    """
+    Follow a job as Server-Sent Events: "phase" events as the model is built and solved
+    ("step" phases carry each finished phase's timing), "solution" events with the
+    objective and bound of each anytime version (and its timetable with ?partial=1),
+    then one "result" event with the final status and, for a finished job, the
+    timetable (?format=compact for the columnar form). A reconnecting EventSource
+    resumes after its Last-Event-ID.
+    """
+    output_format = _output_format(request.args.get('format'))
+    if output_format is None:
+        return _format_error()
+    if job_manager.status(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    partial = request.args.get('partial', type=int)
+    try:
+        start = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        start = 0
+
+    def convert(timetable):
+        return to_compact(timetable) if output_format == "compact" else timetable
+
+    def stream():
+        sent = start
+        quiet_since = time.time()
+        while True:
+            # Read the status first: once it is final, the worker has written every event
+            info = job_manager.status(job_id)
+            if info is None:
+                return
+            for event in job_manager.events(job_id, sent):
+                data = dict(event)
+                event_type = data.pop("type")
+                if partial and event_type == "solution":
+                    data["timetable"] = convert(job_manager.result(job_id, event["version"])[1])
+                yield _sse(sent, event_type, data)
+                sent += 1
+                quiet_since = time.time()
+            if info["status"] not in ("queued", "running"):
+                result = {key: info.get(key) for key in ("status", "meta", "error")}
+                if info["status"] == "done":
+                    result["timetable"] = convert(job_manager.result(job_id)[1])
+                yield _sse(None, "result", result)
+                return
+            if time.time() - quiet_since > EVENT_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                quiet_since = time.time()
+            time.sleep(EVENT_POLL_SECONDS)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@solver_bp.route('/generate/jobs/<job_id>', methods=['DELETE'])
+def cancel_generate_job(job_id):
+    """Cancel a queued job or stop a running one."""
+    info = job_manager.cancel(job_id)
+    if info is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(info)
+
+@solver_bp.route('/generate/cache', methods=['GET'])
+def get_solution_cache_stats():
+    """Hit/miss counters and sizes of the solution cache."""
+    return jsonify(solution_cache.stats())
+
+@solver_bp.route('/generate/metrics', methods=['GET'])
+def get_solver_metrics():
+    """Per-phase timings and per-status counts over the solves this server has run."""
+    return jsonify(solver_metrics.snapshot())
+
+@solver_bp.route('/generate/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    """Solver slots and cores in use, and per tenant (?admin_id= for one admin) queue waits and run times."""
+    admin_id = request.args.get('admin_id')
+    return jsonify(solver_scheduler.snapshot(admin_id))
@@ -0,0 +1,128 @@
+from flask import Blueprint, jsonify, request
+from Solver.compact import FORMATS
+from Solver.model import DAY_NAMES, LUNCH_BREAK_SLOTS, SLOTS_PER_DAY, day_index
+from Solver.store import current_slot, timetable_store
+
+# Saved timetables and the per-faculty / per-room views built when they are saved
+timetable_bp = Blueprint('timetables', __name__)
+
+def _version(version):
+    """A version path segment: "latest" or a number, else None."""
+    if version == "latest":
+        return version
+    return int(version) if version.isdigit() else None
+
+def _day_slot_args():
+    """(day, slot) from ?day=&slot= (day index or name), defaulting to now. Raises ValueError."""
+    if request.args.get('day') is None and request.args.get('slot') is None:
+        now = current_slot()
+        if now is None:
+            raise ValueError("No class is held right now, pass day and slot")
+        return now
+    day = day_index(request.args.get('day'), "request")
+    slot = request.args.get('slot', type=int)
+    if slot is None or not 0 <= slot < SLOTS_PER_DAY:
+        raise ValueError(f"slot must be between 0 and {SLOTS_PER_DAY - 1}")
+    return day, slot
+
+def _load_views(admin_id, term, version):
+    """(version, views, error response) for a saved version."""
+    version = _version(version)
+    if version is None:
+        return None, None, (jsonify({"error": "version must be a number or 'latest'"}), 400)
+    version, views = timetable_store.views(admin_id, term, version)
+    if views is None:
+        return None, None, (jsonify({"error": "Timetable not found"}), 404)
+    return version, views, None
+
+@timetable_bp.route('/timetables', methods=['POST'])
+def save_timetable():
+    """
+    Save a timetable (nested or compact) as the next version for an admin and term.
+    Passing the schema lets the free-room view know the rooms nothing is booked in.
+    """
+    data = request.get_json() or {}
+    admin_id = data.get('admin_id')
+    term = data.get('term')
+    timetable = data.get('timetable')
+    if not admin_id or not term or not isinstance(timetable, dict):
+        return jsonify({"error": "admin_id, term and timetable are required"}), 400
+    schema = data.get('schema') or {}
+    rooms = [room["name"] for room in schema["rooms"]] if schema.get("rooms") else None
+    try:
+        summary = timetable_store.save(int(admin_id), str(term), timetable, rooms=rooms,
+                                       label=data.get('label'), meta=data.get('meta'))
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        return jsonify({"error": f"Invalid timetable: {e}"}), 400
+    return jsonify(summary), 201
+
+@timetable_bp.route('/timetables', methods=['GET'])
+def list_timetables():
+    """Saved versions of an admin (?admin_id=), newest first, optionally for one ?term=."""
+    admin_id = request.args.get('admin_id', type=int)
+    if not admin_id:
+        return jsonify({"error": "admin_id is required"}), 400
+    return jsonify(timetable_store.versions(admin_id, request.args.get('term')))
+
+@timetable_bp.route('/timetables/<int:admin_id>/<term>/<version>', methods=['GET'])
+def get_timetable(admin_id, term, version):
+    """A saved version ("latest" or a number); ?format=compact sends the columnar form."""
+    output_format = request.args.get('format') or FORMATS[0]
+    if output_format not in FORMATS or _version(version) is None:
+        return jsonify({"error": f"format must be one of {list(FORMATS)} and version a number or 'latest'"}), 400
+    summary, timetable = timetable_store.timetable(admin_id, term, _version(version), output_format)
+    if summary is None:
+        return jsonify({"error": "Timetable not found"}), 404
+    return jsonify({**summary, "timetable": timetable})
+
+@timetable_bp.route('/timetables/<int:admin_id>/<term>/<version>/faculty/<abbr>', methods=['GET'])
+def get_faculty_week(admin_id, term, version, abbr):
+    """Every class a teacher holds in a saved version, in day and slot order."""
+    version, views, error = _load_views(admin_id, term, version)
+    if error:
+        return error
+    classes = [views["classes"][i] for i in views["faculty"].get(abbr, [])]
+    return jsonify({"version": version, "faculty": abbr, "classes": classes})
+
+@timetable_bp.route('/timetables/<int:admin_id>/<term>/<version>/rooms/<room>', methods=['GET'])
+def get_room_schedule(admin_id, term, version, room):
+    """A room's week, or with ?day=&slot= (or ?now=1) the class held in it then (null when free)."""
+    version, views, error = _load_views(admin_id, term, version)
+    if error:
+        return error
+    if request.args.get('day') is None and request.args.get('slot') is None and not request.args.get('now'):
+        classes = [views["classes"][i] for i in views["rooms"].get(room, [])]
+        return jsonify({"version": version, "room": room, "classes": classes})
+    try:
+        d, s = _day_slot_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    class_id = views["room_at"][d][s].get(room)
+    return jsonify({"version": version, "room": room, "day": DAY_NAMES[d], "slot": s,
+                    "class": views["classes"][class_id] if class_id is not None else None})
+
+@timetable_bp.route('/timetables/<int:admin_id>/<term>/<version>/slots', methods=['GET'])
+def get_slot_occupancy(admin_id, term, version):
+    """Everything held at ?day=&slot= (default now) and the rooms that are free then."""
+    version, views, error = _load_views(admin_id, term, version)
+    if error:
+        return error
+    try:
+        d, s = _day_slot_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"version": version, "day": DAY_NAMES[d], "slot": s, "lunch": s in LUNCH_BREAK_SLOTS,
+                    "classes": [views["classes"][i] for i in views["occupancy"][d][s]],
+                    "free_rooms": views["free_rooms"][d][s]})
+
+@timetable_bp.route('/timetables/<int:admin_id>/<term>/<version>/free-rooms', methods=['GET'])
+def get_free_rooms(admin_id, term, version):
+    """Rooms nothing is held in at ?day=&slot= (default now)."""
+    version, views, error = _load_views(admin_id, term, version)
+    if error:
+        return error
+    try:
+        d, s = _day_slot_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"version": version, "day": DAY_NAMES[d], "slot": s, "free_rooms": views["free_rooms"][d][s]})
@@ -0,0 +1,233 @@
+"""
+Several departments' timetables in one request.
+
+Departments share faculty (by abbr) and rooms (by name). Departments that declare a
+common teacher or room, directly or through another department, form a group, and
+each group is solved as one schema: its divisions, batches and subject codes are
+prefixed with their department ("CSE/A"), shared faculty and rooms become single
+entries and a room only hosts the subjects of the departments that declare it (see
+rooms.room_hosts). Groups share nothing, so they are solved side by side in a
+process pool, each further split by Solver.decompose, and a group that cannot be
+solved does not hold back the others. Timetables are split back per department
+without the prefixes.
+"""
+import copy
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import Config
+from Solver.decompose import solve_schema
+from Solver.model import DAYS, faculty_days, parse_blocked_slots, parse_fixed_positions
+from Solver.profiles import resolve_profile
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "/"
+
+
+def _check_departments(departments):
+    if not isinstance(departments, list) or not departments:
+        raise ValueError("departments must be a non-empty list")
+    names = []
+    for dept in departments:
+        if not isinstance(dept, dict) or not dept.get("name") or not isinstance(dept.get("schema"), dict):
+            raise ValueError("Every department needs a name and a schema")
+        name = str(dept["name"])
+        if SEPARATOR in name:
+            raise ValueError(f"Department name '{name}' must not contain '{SEPARATOR}'")
+        if name in names:
+            raise ValueError(f"Department '{name}' is listed twice")
+        names.append(name)
+
+
+def shared_resources(departments):
+    """{"faculty": {abbr: [departments]}, "rooms": {name: [departments]}} for what several declare."""
+    declared = {"faculty": {}, "rooms": {}}
+    for dept in departments:
+        for fac in dept["schema"].get("faculty", []):
+            declared["faculty"].setdefault(fac["abbr"], []).append(dept["name"])
+        for room in dept["schema"].get("rooms", []):
+            declared["rooms"].setdefault(room["name"], []).append(dept["name"])
+    return {kind: {key: names for key, names in owners.items() if len(names) > 1}
+            for kind, owners in declared.items()}
+
+
+def department_groups(departments, shared):
+    """Department names grouped by the faculty and rooms they share, in request order."""
+    parent = {dept["name"]: dept["name"] for dept in departments}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for owners in list(shared["faculty"].values()) + list(shared["rooms"].values()):
+        for name in owners[1:]:
+            parent[find(name)] = find(owners[0])
+
+    groups = {}
+    for dept in departments:
+        groups.setdefault(find(dept["name"]), []).append(dept["name"])
+    return list(groups.values())
+
+
+def merge_departments(departments):
+    """
+    One schema for a group of departments. Returns (schema, fixed_positions, warnings):
+    faculty declared differently keep the strictest limits and the days all
+    declarations allow, rooms the smallest capacity, each with a warning. Raises
+    ValueError when a room's type differs or the departments block different slots.
+    """
+    merged = {"divisions": [], "subjects": [], "faculty": [], "rooms": []}
+    fixed_positions = {}
+    warnings = []
+    faculty, rooms = {}, {}
+    blocked = None
+
+    for dept in departments:
+        name, schema = dept["name"], dept["schema"]
+        prefix = name + SEPARATOR
+
+        dept_blocked = parse_blocked_slots(schema.get("blocked_slots"))
+        if blocked is not None and dept_blocked != blocked:
+            raise ValueError(f"Departments sharing faculty or rooms must block the same slots ('{name}' differs)")
+        blocked = dept_blocked
+        if schema.get("blocked_slots"):
+            merged["blocked_slots"] = schema["blocked_slots"]
+
+        for div in schema["divisions"]:
+            merged["divisions"].append({**div, "name": prefix + div["name"],
+                                        "batches": [prefix + batch for batch in div["batches"]]})
+        # An empty list means every division or batch, which here must stay the department's own
+        own_divisions = [div["name"] for div in schema["divisions"]]
+        own_batches = [batch for div in schema["divisions"] for batch in div["batches"]]
+        for subj in schema["subjects"]:
+            merged["subjects"].append({
+                **subj, "code": prefix + subj["code"], "department": name,
+                "divisions": [prefix + div_name for div_name in subj.get("divisions") or own_divisions],
+                "batches": [prefix + batch for batch in subj.get("batches") or own_batches],
+            })
+        for (div_name, batch, d, s), code in parse_fixed_positions(dept.get("fixed_positions")).items():
+            fixed_positions[(prefix + div_name, prefix + batch if batch else "", d, s)] = prefix + code
+
+        for fac in schema["faculty"]:
+            known = faculty.get(fac["abbr"])
+            if known is None:
+                faculty[fac["abbr"]] = copy.deepcopy(fac)
+                continue
+            if any(known.get(key) != fac.get(key) for key in ("max_per_day", "max_per_week", "availability")):
+                warnings.append(f"Faculty {fac['abbr']} is declared differently by several departments, "
+                                f"the strictest limits apply")
+            for key, default in (("max_per_day", 5), ("max_per_week", 25)):
+                if key in known or key in fac:
+                    known[key] = min(known.get(key, default), fac.get(key, default))
+            days = [faculty_days([entry]).get(fac["abbr"], set(range(len(DAYS)))) for entry in (known, fac)]
+            if known.get("availability") is not None or fac.get("availability") is not None:
+                known["availability"] = sorted(days[0] & days[1])
+
+        for room in schema["rooms"]:
+            known = rooms.get(room["name"])
+            if known is None:
+                rooms[room["name"]] = {**room, "departments": [name]}
+                continue
+            if known.get("type") != room.get("type"):
+                raise ValueError(f"Room {room['name']} has type '{known.get('type')}' in "
+                                 f"{known['departments'][0]} but '{room.get('type')}' in {name}")
+            if known.get("capacity") != room.get("capacity"):
+                warnings.append(f"Room {room['name']} is declared with different capacities, the smallest applies")
+                known["capacity"] = min(known.get("capacity", 0), room.get("capacity", 0))
+            known["departments"].append(name)
+
+    merged["faculty"] = list(faculty.values())
+    merged["rooms"] = list(rooms.values())
+    return merged, fixed_positions, warnings
+
+
+def split_timetable(timetable, names):
+    """A merged timetable as {department: timetable} with the department prefixes taken off."""
+    def strip(value, prefix):
+        return value[len(prefix):] if value.startswith(prefix) else value
+
+    split = {name: {} for name in names}
+    for div_name, div_data in timetable.items():
+        name = div_name.split(SEPARATOR, 1)[0]
+        prefix = name + SEPARATOR
+        split[name][strip(div_name, prefix)] = {
+            **div_data,
+            "batches": {
+                strip(batch, prefix): {day: [strip(cell, prefix) for cell in cells] for day, cells in schedule.items()}
+                for batch, schedule in div_data.get("batches", {}).items()
+            },
+        }
+    return split
+
+
+def _seconds(meta, field):
+    if field in meta:
+        return meta[field]
+    return round(sum(component.get(field, 0) for component in meta.get("components", [])), 3)
+
+
+def _solve_group(solve_args):
+    """Pool entry point: solve one group's merged schema and time it."""
+    started = time.time()
+    timetable, meta = solve_schema(**solve_args)
+    meta["wall_seconds"] = round(time.time() - started, 3)
+    return timetable, meta
+
+
+def solve_departments(departments, encoding="onehot", profile=None, max_workers=None):
+    """
+    Solve several {"name", "schema", "fixed_positions"} departments. Returns a dict with
+    per department its timetable (None if its group was not solved) and meta (status,
+    group, timings), the groups with their solve meta, the shared faculty and rooms and
+    any merge warnings. Raises ValueError for malformed or conflicting departments.
+    """
+    profile = profile or resolve_profile()
+    _check_departments(departments)
+    departments = [{**dept, "name": str(dept["name"])} for dept in departments]
+    by_name = {dept["name"]: dept for dept in departments}
+    shared = shared_resources(departments)
+    groups = department_groups(departments, shared)
+
+    warnings = []
+    all_args = []
+    for names in groups:
+        schema, fixed_positions, group_warnings = merge_departments([by_name[name] for name in names])
+        warnings += group_warnings
+        all_args.append({"schema": schema, "fixed_positions": fixed_positions, "encoding": encoding,
+                         "profile": profile})
+
+    started = time.time()
+    max_workers = max_workers or Config.SOLVER_DECOMPOSE_WORKERS
+    logger.info("=== SOLVER DEBUG: %d departments form %d groups ===", len(departments), len(groups))
+    if len(groups) == 1 or max_workers <= 1:
+        results = [_solve_group({**solve_args, "max_workers": max_workers}) for solve_args in all_args]
+    else:
+        # Groups run side by side, so split the search workers rather than oversubscribe
+        pool_size = min(max_workers, len(groups))
+        for solve_args in all_args:
+            solve_args["profile"] = {**profile, "workers": max(1, profile["workers"] // pool_size)}
+            solve_args["max_workers"] = 1
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=pool_size, mp_context=ctx) as pool:
+            results = list(pool.map(_solve_group, all_args))
+
+    report = {"departments": {}, "groups": [], "shared": shared, "warnings": warnings}
+    for g, (names, (timetable, meta)) in enumerate(zip(groups, results)):
+        split = split_timetable(timetable, names) if timetable else {}
+        report["groups"].append({"departments": names, "meta": meta})
+        for name in names:
+            report["departments"][name] = {
+                "timetable": split.get(name),
+                "meta": {
+                    "status": meta["status"], "group": g, "coupled_with": [other for other in names if other != name],
+                    "build_seconds": _seconds(meta, "build_seconds"), "solve_seconds": _seconds(meta, "solve_seconds"),
+                    "wall_seconds": meta["wall_seconds"],
+                },
+            }
+    report["wall_seconds"] = round(time.time() - started, 3)
+    return report
@@ -0,0 +1,183 @@
+"""
+Solver benchmark: solve generated schemas across the size ladder and compare the
+numbers with a stored baseline.
+
+Run from the Backend directory:
+
+    python -m Solver.benchmark                          # tiny..large, compare with the baseline
+    python -m Solver.benchmark --sizes tiny,small --output run.json
+    python -m Solver.benchmark --save-baseline          # record this machine's numbers
+
+Each case runs in a fresh process so its peak RSS is its own. Every timetable found is
+checked with Solver.verify. The exit status is 1 when a case got slower than the
+baseline allows, stopped finding a solution or found an invalid one.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+from ortools import __version__ as ortools_version
+
+from Solver.decompose import solve_schema
+from Solver.profiles import resolve_profile
+from Solver.verify import verify_timetable
+from Solver.workload import SIZE_LADDER, ladder_schema
+
+DEFAULT_SIZES = ("tiny", "small", "medium", "large")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+SOLVED = ("OPTIMAL", "FEASIBLE")
+
+
+def _peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes
+
+
+def _component_sum(meta, field):
+    if field in meta:
+        return meta[field]
+    return round(sum(component.get(field, 0) for component in meta.get("components", [])), 3)
+
+
+def run_case(size, tightness, seed, encoding, profile):
+    """Solve one generated schema and return its measurements. Meant to run in its own process."""
+    schema = ladder_schema(size, tightness=tightness, seed=seed)
+    started = time.time()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        timetable, meta = solve_schema(schema, encoding=encoding, profile=profile)
+    violations = verify_timetable(timetable, schema) if timetable else []
+    return {
+        "case": f"{size}@{tightness}",
+        "size": size,
+        "tightness": tightness,
+        "params": SIZE_LADDER[size],
+        "status": meta["status"],
+        "build_seconds": _component_sum(meta, "build_seconds"),
+        "solve_seconds": _component_sum(meta, "solve_seconds"),
+        "wall_seconds": round(time.time() - started, 3),
+        "variables": meta.get("variables"),
+        "constraints": meta.get("constraints"),
+        "components": len(meta.get("components", [])) or 1,
+        "phases": meta.get("phases", []),
+        "invalid": [issue for issue in violations if issue["severity"] == "error"],
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, tightness=(0.8,), seed=0, encoding="onehot", profile=None, repeat=1):
+    """Run every size x tightness case (the fastest of repeat runs is kept) and return the report."""
+    profile = profile or resolve_profile("balanced", {"time_limit": 60, "log": False})
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for size in sizes:
+        for tight in tightness:
+            runs = []
+            for _ in range(repeat):
+                with ctx.Pool(1) as pool:
+                    runs.append(pool.apply(run_case, (size, tight, seed, encoding, profile)))
+            best = min(runs, key=lambda run: run["wall_seconds"])
+            print(f"{best['case']:<16} {best['status']:<10} build {best['build_seconds']:>7.3f}s  "
+                  f"solve {best['solve_seconds']:>8.3f}s  vars {best['variables']:>7}  "
+                  f"rss {best['peak_rss_kb'] // 1024} MB")
+            if best["invalid"]:
+                print(f"{'':<16} INVALID: {', '.join(issue['message'] for issue in best['invalid'][:5])}")
+            results.append(best)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "ortools": ortools_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {"seed": seed, "encoding": encoding, "profile": profile, "repeat": repeat},
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.25, min_seconds=0.05):
+    """
+    Compare a report with a baseline report case by case. A case regresses when its
+    build or solve time grows by more than tolerance (and min_seconds), when the
+    baseline solved it and this run did not, or when its timetable broke a rule.
+    Returns a list of finding dicts.
+    """
+    baseline_cases = {result["case"]: result for result in baseline.get("results", [])}
+    findings = []
+    for result in report["results"]:
+        if result.get("invalid"):
+            findings.append({"case": result["case"], "field": "invalid", "baseline": [],
+                             "current": [issue["check"] for issue in result["invalid"]], "regression": True})
+        old = baseline_cases.get(result["case"])
+        if old is None:
+            continue
+        if old["status"] in SOLVED and result["status"] not in SOLVED:
+            findings.append({"case": result["case"], "field": "status", "baseline": old["status"],
+                             "current": result["status"], "regression": True})
+        for field in ("build_seconds", "solve_seconds"):
+            limit = max(old[field] * (1 + tolerance), old[field] + min_seconds)
+            if result[field] > limit:
+                findings.append({"case": result["case"], "field": field, "baseline": old[field],
+                                 "current": result[field], "regression": True})
+        for field in ("variables", "constraints"):
+            if result[field] != old.get(field):
+                findings.append({"case": result["case"], "field": field, "baseline": old.get(field),
+                                 "current": result[field], "regression": False})
+    return findings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the timetable solver on generated schemas.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help=f"comma-separated rungs of {list(SIZE_LADDER)}")
+    parser.add_argument("--tightness", default="0.8", help="comma-separated tightness values in (0, 1]")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--encoding", default="onehot")
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--workers", type=int, default=0, help="CP-SAT workers, 0 for the server maximum")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest is kept")
+    parser.add_argument("--symmetry", action="store_true", help="order interchangeable batches and divisions")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+
+    profile = resolve_profile("balanced", {"time_limit": args.time_limit, "workers": args.workers,
+                                           "seed": args.seed, "log": False,
+                                           "symmetry_breaking": args.symmetry})
+    report = run_benchmark(
+        sizes=[size.strip() for size in args.sizes.split(",") if size.strip()],
+        tightness=[float(value) for value in args.tightness.split(",")],
+        seed=args.seed, encoding=args.encoding, profile=profile, repeat=args.repeat,
+    )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            report["comparison"] = compare(report, json.load(f), tolerance=args.tolerance)
+        for finding in report["comparison"]:
+            label = "REGRESSION" if finding["regression"] else "changed"
+            print(f"{label}: {finding['case']} {finding['field']} {finding['baseline']} -> {finding['current']}")
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(finding["regression"] for finding in report.get("comparison", [])) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Content-addressed cache of solved timetables.
+
+A solve request is reduced to a canonical JSON form and hashed. Solutions are kept
+in an in-memory LRU in front of a directory of JSON files, both bounded by size.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from config import Config
+
+CACHE_FORMAT_VERSION = 3  # Bump when the model changes what a valid solution looks like
+
+# Top-level schema lists and the field that identifies an entry in each
+_SCHEMA_LISTS = {"divisions": "name", "subjects": "code", "faculty": "abbr", "rooms": "name"}
+# Per-entry lists whose order carries no meaning (subject faculty order does: the first is displayed)
+_UNORDERED_FIELDS = {"subjects": ("batches", "divisions"), "faculty": ("availability",)}
+
+
+def _normalize_value(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    return value
+
+
+def canonical_schema(schema):
+    """Return a copy of the schema with whitespace, entry order and unordered lists normalized."""
+    canonical = _normalize_value(schema)
+    for list_name, id_field in _SCHEMA_LISTS.items():
+        entries = canonical.get(list_name)
+        if not isinstance(entries, list):
+            continue
+        for entry in entries:
+            for field in _UNORDERED_FIELDS.get(list_name, ()):
+                if isinstance(entry.get(field), list):
+                    entry[field] = sorted(entry[field], key=lambda v: json.dumps(v, sort_keys=True))
+        canonical[list_name] = sorted(entries, key=lambda e: str(e.get(id_field, "")))
+    return canonical
+
+
+def solve_request_key(schema, fixed_positions=None, **options):
+    """Hash of everything that determines a solve: schema, fixed positions and solver options."""
+    pins = sorted(
+        [[_normalize_value(list(k) if isinstance(k, tuple) else k), _normalize_value(v)]
+         for k, v in (fixed_positions or {}).items()],
+        key=lambda item: json.dumps(item, sort_keys=True),
+    )
+    payload = {
+        "version": CACHE_FORMAT_VERSION,
+        "schema": canonical_schema(schema),
+        "fixed_positions": pins,
+        "options": _normalize_value(options),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SolutionCache:
+    """Two-tier (memory LRU + disk) solution store with byte limits and hit/miss counters."""
+
+    def __init__(self, directory, max_memory_bytes, max_disk_bytes):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (solution, size in bytes)
+        self._memory_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, solution, size):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = (solution, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def get(self, key):
+        """Return the cached solution for key, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key][0]
+
+            path = self._path(key)
+            try:
+                with open(path, "r") as f:
+                    data = f.read()
+                solution = json.loads(data)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            os.utime(path)  # Disk eviction is least-recently-used by mtime
+            self.disk_hits += 1
+            self._remember(key, solution, len(data))
+            return solution
+
+    def put(self, key, solution):
+        """Store a solution in both tiers, evicting old entries past the size limits."""
+        data = json.dumps(solution, separators=(",", ":"))
+        with self._lock:
+            self._remember(key, solution, len(data))
+            if len(data) > self.max_disk_bytes:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def _evict_disk(self):
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+    def stats(self):
+        """Counters and current sizes, JSON-ready."""
+        with self._lock:
+            disk = self._disk_entries() if os.path.isdir(self.directory) else []
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(disk),
+                "disk_bytes": sum(size for _, size, _ in disk),
+            }
+
+
+solution_cache = SolutionCache(
+    Config.SOLVER_CACHE_DIR,
+    Config.SOLVER_CACHE_MEMORY_BYTES,
+    Config.SOLVER_CACHE_DISK_BYTES,
+)
@@ -0,0 +1,117 @@
+"""
+Compact columnar timetable format.
+
+The nested output spells every class out as a "CODE\\nFACULTY\\nROOM" string, once per
+batch, day and slot. The compact form holds the same timetable as one flat column of
+class ids, row-major over [division][batch][day][slot] with -1 for a free cell, and
+lookup tables: each class is a [subject id, faculty id, room id] triple into the
+subject, faculty and room name lists.
+
+    {"format": "compact", "shape": [divisions, batches, days, slots],
+     "divisions": [...], "batches": [[...], ...], "days": [...], "lunch_slots": [...],
+     "subjects": [...], "faculty": [...], "rooms": [...], "classes": [[s, f, r], ...],
+     "cells": [...]}
+
+Divisions with fewer batches than the largest one are padded with free cells. A
+class with no faculty ("TBA") or no room has faculty / room id -1.
+"""
+import numpy as np
+
+from Solver.model import DAY_NAMES, LUNCH_BREAK_SLOTS, SLOTS_PER_DAY
+
+FORMATS = ("nested", "compact")  # Timetable output formats, first is the default
+
+_FREE_CELLS = ("-", "LUNCH BREAK")
+
+
+def to_compact(timetable):
+    """Convert a timetable in the nested output format to the compact format."""
+    divisions = list(timetable)
+    batches = [list(timetable[div_name]["batches"]) for div_name in divisions]
+    shape = (len(divisions), max(map(len, batches), default=0), len(DAY_NAMES), SLOTS_PER_DAY)
+    tables = {"subjects": {}, "faculty": {}, "rooms": {}, "classes": {}}
+
+    def intern(table, name):
+        if not name or (table == "faculty" and name == "TBA"):
+            return -1
+        return tables[table].setdefault(name, len(tables[table]))
+
+    # The same class string shows up in every batch and slot it is held in, so each
+    # distinct string is split and interned once
+    ids = {cell: -1 for cell in _FREE_CELLS}
+    cells = np.full(shape, -1, dtype=np.int32)
+    for i, div_name in enumerate(divisions):
+        for b, batch in enumerate(batches[i]):
+            schedule = timetable[div_name]["batches"][batch]
+            for d, day_name in enumerate(DAY_NAMES):
+                row = schedule.get(day_name, [])[:SLOTS_PER_DAY]
+                for cell in row:
+                    if cell not in ids:
+                        parts = cell.split("\n") + ["", ""]
+                        triple = (intern("subjects", parts[0]), intern("faculty", parts[1]), intern("rooms", parts[2]))
+                        ids[cell] = tables["classes"].setdefault(triple, len(tables["classes"]))
+                cells[i, b, d, :len(row)] = [ids[cell] for cell in row]
+
+    return {
+        "format": "compact",
+        "shape": list(shape),
+        "divisions": divisions,
+        "batches": batches,
+        "days": list(DAY_NAMES),
+        "lunch_slots": list(LUNCH_BREAK_SLOTS),
+        "subjects": list(tables["subjects"]),
+        "faculty": list(tables["faculty"]),
+        "rooms": list(tables["rooms"]),
+        "classes": [list(triple) for triple in tables["classes"]],
+        "cells": cells.ravel().tolist(),
+    }
+
+
+def validate_compact(compact):
+    """
+    Check that a compact timetable's ids and shape agree with its lookup tables and
+    return its cells as an array shaped [division][batch][day][slot]. Raises
+    ValueError if malformed, so callers can index the tables without further checks.
+    """
+    try:
+        shape = [int(n) for n in compact["shape"]]
+        cells = np.array(compact["cells"], dtype=np.int64).reshape(shape)
+        classes = np.array(compact["classes"], dtype=np.int64).reshape(len(compact["classes"]), 3)
+        divisions, batches, days = compact["divisions"], compact["batches"], compact["days"]
+        sizes = [len(compact[table]) for table in ("subjects", "faculty", "rooms")]
+        if len(shape) != 4 or len(batches) != len(divisions) or shape[0] != len(divisions):
+            raise ValueError(f"shape {shape} does not match {len(divisions)} divisions")
+        if shape[2] != len(days) or any(len(names) > shape[1] for names in batches):
+            raise ValueError(f"shape {shape} does not match the batches and days")
+        # Subjects are required, faculty and room ids may be -1 for none
+        for column, (low, size) in enumerate(zip((0, -1, -1), sizes)):
+            if classes.size and not (low <= classes[:, column].min() and classes[:, column].max() < size):
+                raise ValueError(f"class ids out of range for {size} {('subjects', 'faculty', 'rooms')[column]}")
+        if cells.size and not (-1 <= cells.min() and cells.max() < len(classes)):
+            raise ValueError(f"cell ids must lie in [-1, {len(classes)})")
+    except (KeyError, TypeError, ValueError, IndexError) as e:
+        raise ValueError(f"Invalid compact timetable: {e}")
+    return cells
+
+
+def from_compact(compact):
+    """Convert a compact timetable back to the nested output format. Raises ValueError if malformed."""
+    cells = validate_compact(compact)
+    subjects, faculty, rooms = compact["subjects"], compact["faculty"], compact["rooms"]
+    # Index -1 (a free cell) picks the trailing "-"
+    labels = ["\n".join([subjects[subject], faculty[fac] if fac >= 0 else "TBA"]
+                        + ([rooms[room]] if room >= 0 else []))
+              for subject, fac, room in compact["classes"]] + ["-"]
+    divisions, batches, days = compact["divisions"], compact["batches"], compact["days"]
+    lunch = set(compact.get("lunch_slots", []))
+
+    output = {}
+    for i, div_name in enumerate(divisions):
+        schedules = {}
+        for b, batch in enumerate(batches[i]):
+            schedules[batch] = {
+                day_name: ["LUNCH BREAK" if s in lunch else labels[x] for s, x in enumerate(cells[i, b, d].tolist())]
+                for d, day_name in enumerate(days)
+            }
+        output[div_name] = {"batches": schedules}
+    return output
@@ -0,0 +1,295 @@
+"""
+Split a timetable schema into independent sub-problems and solve them in parallel.
+
+Divisions are coupled through the subjects they take (weekly limits are per subject),
+the faculty who teach those subjects and the rooms that can host them. Divisions in
+different connected components of that graph share nothing, so each component is
+solved as its own CP-SAT model in a process pool and the grids are merged back in
+the original division order.
+
+A caller solving the same schema again after small edits (see Solver.sessions) can
+pass a reuse dict: components whose sub-schema and pins are unchanged since the last
+solve keep their timetable without building or solving a model.
+"""
+import copy
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from config import Config
+from Solver.cache import solve_request_key
+from Solver.model import (
+    STOP_POLL_SECONDS, batch_takes, division_takes, solution_drift, solve_with_meta,
+)
+from Solver.rooms import room_hosts
+from Solver.feasibility import analyze_schema, explain_infeasibility, has_errors
+from Solver.profiles import profile_key, resolve_profile
+
+logger = logging.getLogger(__name__)
+
+# Worst status first: a merged solve is only as good as its weakest component
+_STATUS_ORDER = ("ERROR", "MODEL_INVALID", "INFEASIBLE", "STOPPED", "UNKNOWN", "FEASIBLE", "OPTIMAL")
+
+_component_stop_event = None
+
+
+def _subject_takers(subj, divisions):
+    """Names of the divisions that take a subject (for labs, through at least one batch)."""
+    takers = []
+    for div in divisions:
+        if not division_takes(subj, div["name"]):
+            continue
+        if subj["type"] == "Lab" and not any(batch_takes(subj, batch) for batch in div["batches"]):
+            continue
+        takers.append(div["name"])
+    return takers
+
+
+def split_schema(schema):
+    """
+    Return the schema's independent components as a list of sub-schemas, each with
+    only the divisions, subjects, faculty and rooms that component uses.
+    """
+    divisions = schema["divisions"]
+    parent = {div["name"]: div["name"] for div in divisions}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    def join(names):
+        roots = [find(name) for name in names]
+        for root in roots[1:]:
+            parent[root] = roots[0]
+
+    takers = {subj["code"]: _subject_takers(subj, divisions) for subj in schema["subjects"]}
+    for subj in schema["subjects"]:
+        join(takers[subj["code"]])
+    for fac in schema["faculty"]:
+        join([name for subj in schema["subjects"] if fac["abbr"] in subj.get("faculty", [])
+              for name in takers[subj["code"]]])
+    for room in schema["rooms"]:
+        join([name for subj in schema["subjects"] if room_hosts(room, subj)
+              for name in takers[subj["code"]]])
+
+    groups = {}
+    for div in divisions:
+        groups.setdefault(find(div["name"]), []).append(div)
+
+    components = []
+    for group in groups.values():
+        names = {div["name"] for div in group}
+        subjects = [subj for subj in schema["subjects"] if set(takers[subj["code"]]) & names]
+        teaching = {abbr for subj in subjects for abbr in subj.get("faculty", [])}
+        components.append({
+            **schema,
+            "divisions": group,
+            "subjects": subjects,
+            "faculty": [fac for fac in schema["faculty"] if fac["abbr"] in teaching],
+            "rooms": [room for room in schema["rooms"] if any(room_hosts(room, subj) for subj in subjects)],
+        })
+    return components
+
+
+def _component_args(component, fixed_positions, encoding, previous, keep_divisions, profile):
+    names = {div["name"] for div in component["divisions"]}
+    return {
+        "schema": component,
+        "fixed_positions": {key: code for key, code in (fixed_positions or {}).items() if key[0] in names},
+        "encoding": encoding,
+        "previous": {name: grid for name, grid in previous.items() if name in names} if previous else None,
+        "keep_divisions": keep_divisions,
+        "profile": profile,
+    }
+
+
+def _init_component_worker(stop_event):
+    global _component_stop_event
+    _component_stop_event = stop_event
+
+
+def _solve_component(solve_args):
+    """Pool entry point: solve one component, giving up once the shared stop event is set."""
+    return solve_with_meta(**solve_args, should_stop=_component_stop_event.is_set)
+
+
+def _merge(schema, results, previous, started):
+    timetable = {}
+    meta = {"components": []}
+    for component_args, (component_timetable, component_meta) in results:
+        meta["components"].append({
+            "divisions": [div["name"] for div in component_args["schema"]["divisions"]],
+            **component_meta,
+        })
+        if component_timetable:
+            timetable.update(component_timetable)
+
+    statuses = [component["status"] for component in meta["components"]]
+    meta["status"] = min(statuses, key=lambda status: _STATUS_ORDER.index(status)
+                         if status in _STATUS_ORDER else 0)
+    meta["encoding"] = meta["components"][0].get("encoding")
+    meta["profile"] = meta["components"][0].get("profile")
+    meta["variables"] = sum(component.get("variables", 0) for component in meta["components"])
+    meta["constraints"] = sum(component.get("constraints", 0) for component in meta["components"])
+    meta["wall_seconds"] = round(time.time() - started, 3)
+    costs = [component["cost"] for component in meta["components"] if "cost" in component]
+    if costs:
+        meta["cost"] = {field: round(sum(cost[field] for cost in costs), 3) for field in costs[0]}
+    unassigned = [item for component in meta["components"] for item in component.get("unassigned_rooms", [])]
+    if unassigned:
+        meta["unassigned_rooms"] = unassigned
+
+    if meta["status"] not in ("OPTIMAL", "FEASIBLE"):
+        return None, meta
+    timetable = {div["name"]: timetable[div["name"]] for div in schema["divisions"]}
+    if previous:
+        meta["drift"] = solution_drift(previous, timetable)
+    return timetable, meta
+
+
+def solve_schema(schema, fixed_positions=None, encoding="onehot", on_event=None, should_stop=None,
+                 previous=None, keep_divisions=None, decompose=True, max_workers=None, profile=None,
+                 solutions=1, min_distance=0.0, on_solution=None, anytime=False, reuse=None):
+    """
+    Solve a schema, splitting it into independent components first when decompose is set.
+    The schema is checked by the feasibility analyzer first: provably impossible input
+    returns INFEASIBLE with meta["violations"] without building a model, and an
+    INFEASIBLE solve is explained with an infeasibility core.
+    A single component is solved in this process exactly as solve_with_meta would;
+    several are solved in a process pool of up to max_workers, with the profile's CP-SAT
+    workers shared out between them. Returns (timetable, meta).
+    solutions > 1 or on_solution enumerates alternatives as solve_with_meta does; the
+    schema is then solved whole, since alternatives of separate components do not
+    combine one to one. The same goes for anytime solves, whose objective and versions
+    cover the whole timetable.
+    reuse maps component keys to the (timetable, meta) they were solved to; solved
+    components are reused from it and it is left holding this solve's components.
+    Alternatives and anytime solves neither read nor fill it.
+    """
+    profile = profile or resolve_profile()
+    analysis_started = time.perf_counter()
+    try:
+        violations = analyze_schema(schema, fixed_positions)
+    except Exception as e:
+        logger.exception("=== SOLVER EXCEPTION: %s ===", e)
+        return None, {"encoding": encoding, "status": "ERROR", "error": str(e), "profile": profile}
+    analysis = {"phase": "analysis", "seconds": round(time.perf_counter() - analysis_started, 4),
+                "variables": 0, "constraints": 0}
+    if has_errors(violations):
+        logger.warning("=== SOLVER DEBUG: Schema rejected before solving: %d violations ===", len(violations))
+        return None, {"encoding": encoding, "status": "INFEASIBLE", "profile": profile,
+                      "violations": violations, "phases": [analysis]}
+
+    if solutions > 1 or on_solution or anytime:
+        timetable, meta = solve_with_meta(schema, fixed_positions, encoding, on_event=on_event,
+                                          should_stop=should_stop, previous=previous,
+                                          keep_divisions=keep_divisions, profile=profile, solutions=solutions,
+                                          min_distance=min_distance, on_solution=on_solution, anytime=anytime)
+    else:
+        timetable, meta = _solve_components(schema, fixed_positions, encoding, on_event, should_stop, previous,
+                                            keep_divisions, decompose, max_workers, profile, reuse)
+    meta.setdefault("phases", []).insert(0, analysis)
+    if meta["status"] == "INFEASIBLE" and Config.SOLVER_CORE_TIME_SECONDS > 0:
+        core = explain_infeasibility(schema, fixed_positions, Config.SOLVER_CORE_TIME_SECONDS)
+        violations += core or []
+    if violations:
+        meta["violations"] = violations
+    return timetable, meta
+
+
+def _component_key(solve_args):
+    """
+    What a component's solution depends on: its schema, pins, encoding and resolved
+    profile with its overrides (see profiles.profile_key).
+    """
+    return solve_request_key(solve_args["schema"], solve_args["fixed_positions"], encoding=solve_args["encoding"],
+                             profile=profile_key(solve_args["profile"]))
+
+
+def _solve_components(schema, fixed_positions, encoding, on_event, should_stop, previous, keep_divisions,
+                      decompose, max_workers, profile, reuse=None):
+    components = split_schema(schema) if decompose else [schema]
+    if len(components) == 1 and reuse is None:
+        return solve_with_meta(schema, fixed_positions, encoding, on_event=on_event, should_stop=should_stop,
+                               previous=previous, keep_divisions=keep_divisions, profile=profile)
+
+    started = time.time()
+    all_args = [_component_args(c, fixed_positions, encoding, previous, keep_divisions, profile)
+                for c in components]
+    if reuse is None:
+        return _merge(schema, _run_components(all_args, on_event, should_stop, max_workers), previous, started)
+
+    keys = [_component_key(solve_args) for solve_args in all_args]
+    changed = [i for i, key in enumerate(keys) if key not in reuse]
+    logger.info("=== SOLVER DEBUG: %d of %d components changed ===", len(changed), len(components))
+    solved = dict(zip(changed, _run_components([all_args[i] for i in changed], on_event, should_stop, max_workers)))
+    results = []
+    for i, (solve_args, key) in enumerate(zip(all_args, keys)):
+        if i in solved:
+            results.append(solved[i])
+        else:
+            # Nothing was built or solved for it, so no phases or cost to count again
+            timetable, meta = reuse[key]
+            meta = {field: meta[field] for field in ("encoding", "status", "profile") if field in meta}
+            results.append((solve_args, (copy.deepcopy(timetable), {**meta, "reused": True})))
+
+    reuse.clear()
+    reuse.update({key: (copy.deepcopy(timetable), dict(meta)) for key, (_, (timetable, meta)) in zip(keys, results)
+                  if meta["status"] in ("OPTIMAL", "FEASIBLE")})
+    if len(components) == 1:
+        timetable, meta = results[0][1]
+    else:
+        timetable, meta = _merge(schema, results, previous, started)
+    meta["components_reused"] = len(components) - len(changed)
+    return timetable, meta
+
+
+def _run_components(all_args, on_event, should_stop, max_workers):
+    """Solve components (solve_with_meta arguments), returning [(arguments, (timetable, meta))] in order."""
+    if len(all_args) == 1:
+        return [(all_args[0], solve_with_meta(**all_args[0], on_event=on_event, should_stop=should_stop))]
+    if not all_args:
+        return []
+
+    logger.info("=== SOLVER DEBUG: Schema splits into %d independent components ===", len(all_args))
+    if on_event:
+        on_event("solving_components", {"components": len(all_args), "done": 0})
+    max_workers = max_workers or Config.SOLVER_DECOMPOSE_WORKERS
+    if max_workers > 1:
+        # Components run side by side, so split the search workers rather than oversubscribe
+        pool_size = min(max_workers, len(all_args))
+        all_args = [{**solve_args, "profile": {**solve_args["profile"],
+                                               "workers": max(1, solve_args["profile"]["workers"] // pool_size)}}
+                    for solve_args in all_args]
+
+    if max_workers <= 1:
+        results = []
+        for solve_args in all_args:
+            results.append((solve_args, solve_with_meta(**solve_args, should_stop=should_stop)))
+            if on_event:
+                on_event("solving_components", {"components": len(all_args), "done": len(results)})
+        return results
+
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(all_args)), mp_context=ctx,
+                             initializer=_init_component_worker, initargs=(stop_event,)) as pool:
+        futures = [pool.submit(_solve_component, solve_args) for solve_args in all_args]
+        pending = set(futures)
+        results = {}
+        while pending:
+            done, pending = wait(pending, timeout=STOP_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[future] = future.result()
+                # One unsolvable component sinks the whole timetable, so stop the rest
+                if results[future][0] is None:
+                    stop_event.set()
+            if done and on_event:
+                on_event("solving_components", {"components": len(all_args), "done": len(results)})
+            if should_stop and should_stop():
+                stop_event.set()
+
+    return [(solve_args, results[future]) for solve_args, future in zip(all_args, futures)]
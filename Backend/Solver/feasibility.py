@@ -0,0 +1,377 @@
+"""
+Pre-solve feasibility analysis.
+
+analyze_schema counts capacity against demand with the same caps and semantics the
+CP-SAT model uses, so each "error" it reports is a proof that the model has no
+solution: batch slots against LECTURES_PER_DAY (per batch and in total), subject frequency bounds, faculty
+load against limits, availability and one class at a time, slots left open by blocked slots and absent faculty,
+room demand per set of eligible rooms and conflicting fixed positions.
+"warning" entries point at input the model silently ignores. explain_infeasibility
+covers what counting cannot decide, using an assumption-literal core from CP-SAT.
+"""
+from Solver.model import (
+    DAYS, LECTURES_PER_DAY, LUNCH_BREAK_SLOTS, SLOTS_PER_DAY, batch_takes, division_takes, faculty_days,
+    infeasibility_core, parse_blocked_slots, parse_fixed_positions, slot_masks,
+)
+from Solver.rooms import capacity_groups, class_size, eligible_rooms
+
+TEACHING_SLOTS_PER_WEEK = (SLOTS_PER_DAY - len(LUNCH_BREAK_SLOTS)) * len(DAYS)
+CLASSES_PER_WEEK = LECTURES_PER_DAY * len(DAYS)
+
+
+def _issue(check, message, severity="error", **details):
+    return {"check": check, "severity": severity, "message": message, **details}
+
+
+def _frequency_bounds(subj):
+    """(min, max) per week exactly as the model clamps them."""
+    cap = 7 if subj["type"] == "Theory" else 5
+    return max(1, subj.get("min_per_week", 1)), min(subj.get("max_per_week", cap), cap)
+
+
+def _open_slots(schema):
+    """Teaching slots a week that are not blocked for everyone."""
+    blocked = parse_blocked_slots(schema.get("blocked_slots"))
+    return TEACHING_SLOTS_PER_WEEK - sum(1 for _, s in blocked if s not in LUNCH_BREAK_SLOTS)
+
+
+def _masks(schema):
+    """{subject code: (day, slot) pairs the model creates variables for}."""
+    blocked = parse_blocked_slots(schema.get("blocked_slots"))
+    return dict(zip((subj["code"] for subj in schema["subjects"]),
+                    slot_masks(schema["subjects"], schema["faculty"], blocked)))
+
+
+def _cells(subj, divisions):
+    """The cells a subject can occupy: (division,) for lectures, (division, batch) for labs."""
+    if subj["type"] == "Theory":
+        return [(div["name"],) for div in divisions if division_takes(subj, div["name"])]
+    return [(div["name"], batch) for div in divisions if division_takes(subj, div["name"])
+            for batch in div["batches"] if batch_takes(subj, batch)]
+
+
+def _check_references(schema, takers):
+    issues = []
+    division_names = {div["name"] for div in schema["divisions"]}
+    batch_names = {batch for div in schema["divisions"] for batch in div["batches"]}
+    for subj in schema["subjects"]:
+        unknown_divisions = sorted(set(subj.get("divisions", [])) - division_names)
+        unknown_batches = sorted(set(subj.get("batches", [])) - batch_names) if subj["type"] == "Lab" else []
+        if unknown_divisions:
+            issues.append(_issue("unknown_division", f"{subj['code']} lists divisions that do not exist",
+                                 "warning", subject=subj["code"], names=unknown_divisions))
+        if unknown_batches:
+            issues.append(_issue("unknown_batch", f"{subj['code']} lists batches that do not exist",
+                                 "warning", subject=subj["code"], names=unknown_batches))
+        if not takers[subj["code"]]:
+            issues.append(_issue("no_takers", f"{subj['code']} needs classes every week but no existing "
+                                              f"division or batch takes it", subject=subj["code"]))
+    return issues
+
+
+def _check_frequencies(schema, takers):
+    issues = []
+    for subj in schema["subjects"]:
+        low, high = _frequency_bounds(subj)
+        if takers[subj["code"]] and low > high:
+            issues.append(_issue("frequency_bounds",
+                                 f"{subj['code']} needs at least {low} classes a week but may have at most {high}",
+                                 subject=subj["code"], required=low, available=high))
+    return issues
+
+
+def _check_batch_slots(schema, takers):
+    """Every batch needs exactly CLASSES_PER_WEEK classes; compare with what its subjects allow."""
+    issues = []
+    open_slots = _open_slots(schema)
+    masks = _masks(schema)
+    for div in schema["divisions"]:
+        lectures = [subj for subj in schema["subjects"]
+                    if subj["type"] == "Theory" and (div["name"],) in takers[subj["code"]]]
+        exclusive_lectures = sum(_frequency_bounds(subj)[0] for subj in lectures
+                                 if takers[subj["code"]] == [(div["name"],)])
+        if not div["batches"] and exclusive_lectures > open_slots:
+            issues.append(_issue("division_slots",
+                                 f"Division {div['name']} needs {exclusive_lectures} lectures a week "
+                                 f"but has {open_slots} teaching slots",
+                                 division=div["name"], required=exclusive_lectures,
+                                 available=open_slots))
+        for batch in div["batches"]:
+            labs = [subj for subj in schema["subjects"]
+                    if subj["type"] == "Lab" and (div["name"], batch) in takers[subj["code"]]]
+            most = sum(min(_frequency_bounds(subj)[1], len(masks[subj["code"]])) for subj in lectures + labs)
+            if most < CLASSES_PER_WEEK:
+                issues.append(_issue("batch_slots",
+                                     f"Batch {batch} of {div['name']} needs {CLASSES_PER_WEEK} classes a week "
+                                     f"({LECTURES_PER_DAY} a day) but its subjects allow at most {most}",
+                                     division=div["name"], batch=batch, required=CLASSES_PER_WEEK,
+                                     available=most))
+            least = exclusive_lectures + sum(_frequency_bounds(subj)[0] for subj in labs
+                                             if takers[subj["code"]] == [(div["name"], batch)])
+            if least > CLASSES_PER_WEEK:
+                issues.append(_issue("batch_slots",
+                                     f"Batch {batch} of {div['name']} has room for {CLASSES_PER_WEEK} classes "
+                                     f"a week but its own subjects need at least {least}",
+                                     division=div["name"], batch=batch, required=least,
+                                     available=CLASSES_PER_WEEK))
+            # Slots where at least one of the batch's subjects can be taught, day by day
+            usable = set().union(*(masks[subj["code"]] for subj in lectures + labs))
+            for d in range(len(DAYS) if lectures + labs else 0):
+                slots = sum(1 for day, _ in usable if day == d)
+                if slots < LECTURES_PER_DAY:
+                    issues.append(_issue("batch_day",
+                                         f"Batch {batch} of {div['name']} needs {LECTURES_PER_DAY} classes on "
+                                         f"{DAYS[d]} but its subjects can only be taught in {slots} slots",
+                                         division=div["name"], batch=batch, day=DAYS[d],
+                                         required=LECTURES_PER_DAY, available=slots))
+    return issues
+
+
+def _check_total_slots(schema, takers):
+    """All batches together: a lecture fills a cell in every batch of its division, a lab one cell."""
+    issues = []
+    batch_count = {div["name"]: len(div["batches"]) for div in schema["divisions"]}
+    required = CLASSES_PER_WEEK * sum(batch_count.values())
+    most = 0
+    for subj in schema["subjects"]:
+        if not takers[subj["code"]]:
+            continue
+        per_class = max(batch_count[cell[0]] for cell in takers[subj["code"]]) if subj["type"] == "Theory" else 1
+        most += _frequency_bounds(subj)[1] * per_class
+    if required and most < required:
+        issues.append(_issue("total_slots",
+                             f"All batches together need {required} classes a week but the subjects "
+                             f"can fill at most {most} batch slots",
+                             required=required, available=most))
+    return issues
+
+
+def _check_faculty(schema, takers):
+    issues = []
+    available_days = faculty_days(schema["faculty"])
+    masks = _masks(schema)
+    for fac in schema["faculty"]:
+        max_per_day = min(fac.get("max_per_day", 5), 7)
+        max_per_week = min(fac.get("max_per_week", 25), 35)
+        subjects = [subj["code"] for subj in schema["subjects"]
+                    if fac["abbr"] in subj.get("faculty", []) and takers[subj["code"]]]
+        demand = sum(_frequency_bounds(subj)[0] for subj in schema["subjects"] if subj["code"] in subjects)
+        # One class at a time: no more than the slots any of their subjects can use
+        teachable = len(set().union(*(masks[code] for code in subjects)))
+        available = min(max_per_week, max_per_day * len(available_days.get(fac["abbr"], DAYS)), teachable)
+        if demand > available:
+            issues.append(_issue("faculty_load",
+                                 f"{fac['abbr']} must teach at least {demand} classes a week "
+                                 f"but may teach at most {available}",
+                                 faculty=fac["abbr"], subjects=subjects, required=demand, available=available))
+    return issues
+
+
+def _class_rooms(schema, takers):
+    """Eligible rooms of every class, keyed (subject code, cell) as the model sees them."""
+    divisions = {div["name"]: div for div in schema["divisions"]}
+    return {
+        (subj["code"], cell): eligible_rooms(subj, schema["rooms"], class_size(divisions[cell[0]], lab=len(cell) > 1))
+        for subj in schema["subjects"] for cell in takers[subj["code"]]
+    }
+
+
+def _room_groups(schema, takers):
+    """
+    The model's room capacity groups: (room names, class keys, codes of the subjects
+    whose classes all lie in the group). At most len(room names) of the classes run at once.
+    """
+    groups = []
+    for room_names, keys in capacity_groups(_class_rooms(schema, takers)):
+        keys = set(keys)
+        hosted = [code for code, cells in takers.items()
+                  if cells and all((code, cell) in keys for cell in cells)]
+        groups.append((room_names, keys, hosted))
+    return groups
+
+
+def _check_rooms(schema, takers):
+    issues = []
+    without_room = sorted({code for (code, _), names in _class_rooms(schema, takers).items() if not names})
+    for code in without_room:
+        issues.append(_issue("no_room", f"{code} has classes no room can hold; they get no room", "warning",
+                             subject=code))
+    room_types = {room["name"]: room["type"] for room in schema["rooms"]}
+    for room_names, _, hosted in _room_groups(schema, takers):
+        demand = sum(_frequency_bounds(subj)[0] for subj in schema["subjects"] if subj["code"] in hosted)
+        available = _open_slots(schema) * len(room_names)
+        if demand > available:
+            issues.append(_issue("room_demand",
+                                 f"Subjects held in {', '.join(room_names)} need at least "
+                                 f"{demand} room slots a week but only {available} exist",
+                                 rooms=room_names, room_types=sorted({room_types[name] for name in room_names}),
+                                 subjects=hosted, required=demand, available=available))
+    return issues
+
+
+def _check_slots(schema, takers):
+    """
+    A subject cannot be held more often than its open slots times the cells taking it,
+    or than its open slots alone when its teachers are in every one of its classes.
+    """
+    issues = []
+    masks = _masks(schema)
+    for subj in schema["subjects"]:
+        low = _frequency_bounds(subj)[0]
+        most = len(masks[subj["code"]]) * (1 if subj.get("faculty") else len(takers[subj["code"]]))
+        if takers[subj["code"]] and low > most:
+            issues.append(_issue("subject_slots",
+                                 f"{subj['code']} needs at least {low} classes a week but blocked slots and "
+                                 f"its faculty's availability leave room for {most}",
+                                 subject=subj["code"], required=low, available=most))
+    return issues
+
+
+def _check_fixed_positions(schema, fixed_positions, takers):
+    issues = []
+    masks = _masks(schema)
+    subjects = {subj["code"]: subj for subj in schema["subjects"]}
+    divisions = {div["name"]: div for div in schema["divisions"]}
+    lecture_pins = {}  # (division, day, slot) -> lecture codes pinned there
+    cells = {}  # subject code -> distinct pinned cells
+    batch_day = {}  # (division, batch, day) -> pinned cells
+    pinned_at = {}  # (day, slot) -> [(subject code, cell)]
+
+    for (div_name, batch_name, d, s), code in fixed_positions.items():
+        where = {"division": div_name, "batch": batch_name, "day": DAYS[d], "slot": s, "subject": code}
+        subj = subjects.get(code)
+        if subj is None:
+            issues.append(_issue("pin_subject", f"Pinned subject {code} does not exist and is ignored",
+                                 "warning", **where))
+            continue
+        if subj["type"] == "Lab" and not batch_name:
+            issues.append(_issue("pin_batch", f"Lab {code} is pinned without a batch and is ignored",
+                                 "warning", **where))
+            continue
+        if div_name not in divisions:
+            issues.append(_issue("pin_division", f"Division {div_name} does not exist", **where))
+            continue
+        if s in LUNCH_BREAK_SLOTS:
+            issues.append(_issue("pin_lunch", f"{code} is pinned into the lunch break", **where))
+            continue
+        if (d, s) not in masks[code]:
+            issues.append(_issue("pin_unavailable", f"{code} is pinned into a blocked slot or a day its "
+                                                    f"faculty are unavailable", **where))
+            continue
+        cell = (div_name,) if subj["type"] == "Theory" else (div_name, batch_name)
+        if cell not in takers[code]:
+            issues.append(_issue("pin_not_taken", f"{code} is pinned where it is not taught", **where))
+            continue
+
+        if subj["type"] == "Theory":
+            lecture_pins.setdefault((div_name, d, s), set()).add(code)
+            batches = divisions[div_name]["batches"]
+        else:
+            batches = [batch_name]
+        cells.setdefault(code, set()).add((d, s, *cell))
+        for batch in batches:
+            batch_day.setdefault((div_name, batch, d), set()).add((s, code))
+        pinned_at.setdefault((d, s), set()).add((code, cell))
+
+    for (div_name, d, s), codes in lecture_pins.items():
+        if len(codes) > 1:
+            issues.append(_issue("pin_clash", f"{div_name} has several lectures pinned at the same time",
+                                 division=div_name, day=DAYS[d], slot=s, subjects=sorted(codes)))
+    for (div_name, batch, d), pinned in batch_day.items():
+        by_slot = {}
+        for s, code in pinned:
+            by_slot.setdefault(s, set()).add(code)
+        for s, codes in by_slot.items():
+            if len(codes) > 1 and any(subjects[code]["type"] == "Lab" for code in codes):
+                issues.append(_issue("pin_clash", f"Batch {batch} has a lecture and a lab pinned at the same time",
+                                     division=div_name, batch=batch, day=DAYS[d], slot=s, subjects=sorted(codes)))
+        if len(by_slot) > LECTURES_PER_DAY:
+            issues.append(_issue("pin_daily", f"Batch {batch} has {len(by_slot)} classes pinned on {DAYS[d]} "
+                                              f"but takes {LECTURES_PER_DAY} a day",
+                                 division=div_name, batch=batch, day=DAYS[d], required=len(by_slot),
+                                 available=LECTURES_PER_DAY))
+    for code, pinned in cells.items():
+        high = _frequency_bounds(subjects[code])[1]
+        if len(pinned) > high:
+            issues.append(_issue("pin_frequency", f"{code} is pinned {len(pinned)} times but may be held {high} times",
+                                 subject=code, required=len(pinned), available=high))
+
+    for room_names, keys, _ in _room_groups(schema, takers):
+        for (d, s), pinned in pinned_at.items():
+            in_room = sorted(pinned & keys)
+            if len(in_room) > len(room_names):
+                issues.append(_issue("pin_room", f"{len(in_room)} classes pinned at the same time can only use "
+                                                 f"{', '.join(room_names)}",
+                                     rooms=room_names, day=DAYS[d], slot=s,
+                                     subjects=sorted({code for code, _ in in_room}),
+                                     required=len(in_room), available=len(room_names)))
+
+    for fac in schema["faculty"]:
+        max_per_day = min(fac.get("max_per_day", 5), 7)
+        taught = {code for code, subj in subjects.items() if fac["abbr"] in subj.get("faculty", [])}
+        for (d, s), pinned in pinned_at.items():
+            clashing = sorted(code for code, _ in pinned if code in taught)
+            if len(clashing) > 1:
+                issues.append(_issue("pin_faculty_clash", f"{fac['abbr']} has {len(clashing)} classes pinned "
+                                                          f"at the same time",
+                                     faculty=fac["abbr"], day=DAYS[d], slot=s, subjects=clashing,
+                                     required=len(clashing), available=1))
+        for d in range(len(DAYS)):
+            count = sum(1 for code in taught for cell in cells.get(code, ()) if cell[0] == d)
+            if count > max_per_day:
+                issues.append(_issue("pin_faculty", f"{fac['abbr']} has {count} classes pinned on {DAYS[d]} "
+                                                    f"but may teach {max_per_day} a day",
+                                     faculty=fac["abbr"], day=DAYS[d], required=count, available=max_per_day))
+    return issues
+
+
+def analyze_schema(schema, fixed_positions=None):
+    """
+    Return the list of violated bounds for a schema and its fixed positions. Any
+    entry with severity "error" means the solver cannot find a timetable.
+    Raises ValueError for malformed fixed positions, blocked slots or availability.
+    """
+    fixed_positions = parse_fixed_positions(fixed_positions)
+    takers = {subj["code"]: _cells(subj, schema["divisions"]) for subj in schema["subjects"]}
+    return (
+        _check_references(schema, takers)
+        + _check_frequencies(schema, takers)
+        + _check_batch_slots(schema, takers)
+        + _check_total_slots(schema, takers)
+        + _check_faculty(schema, takers)
+        + _check_slots(schema, takers)
+        + _check_rooms(schema, takers)
+        + _check_fixed_positions(schema, fixed_positions, takers)
+    )
+
+
+def has_errors(issues):
+    return any(issue["severity"] == "error" for issue in issues)
+
+
+_CORE_MESSAGES = {
+    "pin": "Fixed position {1}/{2} on {day} slot {4}",
+    "daily": "Batch {2} of {1} taking exactly " + str(LECTURES_PER_DAY) + " classes a day",
+    "frequency": "Weekly frequency limits of {1}",
+    "faculty": "Daily and weekly limits of {1}",
+    "clash": "{1} teaching one class at a time",
+    "room": "No more classes at a time than there are rooms in {rooms}",
+}
+
+
+def explain_infeasibility(schema, fixed_positions=None, time_limit=10.0):
+    """
+    Ask CP-SAT which constraint groups conflict when counting found nothing. Returns
+    issues with check "core" naming the groups that together are infeasible, [] when
+    the schema is feasible after all, or None when the solver could not decide.
+    """
+    core = infeasibility_core(schema, fixed_positions, time_limit)
+    if core is None:
+        return None
+    issues = []
+    for key in core:
+        message = _CORE_MESSAGES[key[0]].format(
+            *key, day=DAYS[key[3]] if key[0] == "pin" else None, rooms=", ".join(map(str, key[1:]))
+        )
+        issues.append(_issue("core", message, group=key[0], members=list(key[1:])))
+    return issues
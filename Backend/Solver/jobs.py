@@ -0,0 +1,314 @@
+"""
+Background timetable solve jobs.
+
+Solves run in a bounded process pool so Flask request threads only submit work and
+poll for it. Everything lives in this server process (no external broker), so a job
+id is only known to the process that created it. A job waits in Solver.scheduler for
+its turn and only then goes to the pool, with the search workers it was given.
+
+An anytime job (solve_args["anytime"]) keeps every improved timetable its search
+reports as a numbered version, so a client can fetch the best one so far while the
+search goes on, or accept it and stop the search.
+
+Every job also keeps its event log: {"type": "phase"} as the solve moves on (with
+"step" phases for each timed model-building and solving phase) and {"type":
+"solution"} for each version, numbered in order for streaming (see events()).
+"""
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from config import Config
+from Solver.cache import solution_cache
+from Solver.compact import from_compact, to_compact
+from Solver.decompose import solve_schema
+from Solver.metrics import solver_metrics
+from Solver.profiles import fit_to_cores
+from Solver.scheduler import ANONYMOUS, default_priority, solver_scheduler
+
+
+class QueueFullError(Exception):
+    """Raised when the configured number of unfinished jobs is already reached."""
+
+
+def _run_solve_job(job_id, solve_args, progress, cancelled, versions, events):
+    """
+    Worker-process entry point: run one solve, reporting phases, events and anytime
+    versions through the shared dicts. Returns (timetable, meta) as solve_schema does;
+    an accepted anytime job returns its latest version.
+    """
+    if job_id in cancelled:
+        return None, {"status": "STOPPED"}
+
+    def record(event):
+        events[job_id] = events.get(job_id, []) + [{**event, "time": time.time()}]
+
+    def on_event(phase, info):
+        # Steps are too short-lived to show as the job's progress, the event log has them
+        if phase != "step":
+            progress[job_id] = {"phase": phase, "updated_at": time.time(), **info}
+        record({"type": "phase", "phase": phase, **info})
+
+    def on_solution(timetable, info):
+        # Versions cross the process boundary in the smaller compact form
+        version = info["index"] + 1
+        versions[(job_id, version)] = to_compact(timetable)
+        summary = {"version": version, "objective": info["objective"], "bound": info["bound"],
+                   "seconds": info["seconds"], "found_at": time.time()}
+        versions[job_id] = versions.get(job_id, []) + [summary]
+        record({"type": "solution", **summary})
+
+    timetable, meta = solve_schema(
+        **solve_args,
+        on_event=on_event,
+        should_stop=lambda: job_id in cancelled,
+        on_solution=on_solution if solve_args.get("anytime") else None,
+    )
+    if timetable is None and cancelled.get(job_id) == "accept" and versions.get(job_id):
+        accepted = versions[job_id][-1]
+        timetable = from_compact(versions[(job_id, accepted["version"])])
+        meta.update(status="FEASIBLE", accepted=accepted)
+    return timetable, meta
+
+
+class SolveJobManager:
+    """Tracks solve jobs submitted to a shared process pool."""
+
+    def __init__(self, max_workers, max_pending, ttl_seconds):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._cancelled = None
+        self._versions = None  # job id -> version summaries, (job id, version) -> compact timetable
+        self._events = None  # job id -> event log
+
+    def _ensure_pool(self):
+        # Started lazily so importing the app never spawns processes. "spawn" keeps the
+        # workers clear of locks held by Flask threads at fork time.
+        if self._executor is None:
+            ctx = multiprocessing.get_context("spawn")
+            self._manager = ctx.Manager()
+            self._progress = self._manager.dict()
+            self._cancelled = self._manager.dict()
+            self._versions = self._manager.dict()
+            self._events = self._manager.dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and now - job["finished_at"] > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._progress.pop(job_id, None)
+            self._cancelled.pop(job_id, None)
+            self._events.pop(job_id, None)
+            for summary in self._versions.pop(job_id, []):
+                self._versions.pop((job_id, summary["version"]), None)
+
+    def submit(self, solve_args, cache_key=None, use_cache=True, tenant=ANONYMOUS, priority=None):
+        """
+        Queue a solve (keyword arguments for solve_schema) for a tenant and return its
+        job id. A solution cached under cache_key completes the job immediately unless
+        use_cache is False; a fresh solution is stored under cache_key when the job
+        finishes. priority defaults to the profile's (see scheduler.default_priority).
+        Raises QueueFullError, or the scheduler's QuotaExceededError.
+        """
+        cached = solution_cache.get(cache_key) if cache_key and use_cache else None
+        with self._lock:
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "cancel_requested": False,
+                "accept_requested": False,
+                "cached": cached is not None,
+                "cache_key": cache_key,
+                "anytime": bool(solve_args.get("anytime")),
+                "tenant": tenant,
+                "priority": priority or default_priority(solve_args["profile"]),
+                "cores": None,
+            }
+
+            if cached is not None:
+                job["future"] = Future()
+                job["future"].set_result((cached, {"status": "CACHED"}))
+                job["finished_at"] = job["submitted_at"]
+                self._jobs[job_id] = job
+                return job_id
+
+            self._ensure_pool()
+            self._purge_expired()
+            pending = sum(1 for other in self._jobs.values() if not other["future"].done())
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} solve jobs are already pending, try again later")
+
+            # Stands for the pool's future until the scheduler starts the job
+            job["future"] = Future()
+            solver_scheduler.enqueue(job_id, tenant, job["priority"], solve_args["profile"]["workers"],
+                                     lambda cores: self._start(job, solve_args, cores))
+            self._jobs[job_id] = job
+
+        job["future"].add_done_callback(lambda future: self._finish(job, future, cache_key))
+        return job_id
+
+    def _start(self, job, solve_args, cores):
+        """Send a job the scheduler let through to the pool, with the search workers it was given."""
+        if not job["future"].set_running_or_notify_cancel():
+            solver_scheduler.release(job["id"])
+            return
+        job["started_at"] = time.time()
+        job["cores"] = cores
+        profile, max_workers = fit_to_cores(solve_args["profile"], cores)
+        solve_args = {**solve_args, "profile": profile, "max_workers": max_workers}
+        pool_future = self._executor.submit(
+            _run_solve_job, job["id"], solve_args, self._progress, self._cancelled, self._versions, self._events
+        )
+        pool_future.add_done_callback(lambda future: self._complete(job, future))
+
+    def _complete(self, job, pool_future):
+        solver_scheduler.release(job["id"])
+        if pool_future.cancelled():
+            job["future"].set_result((None, {"status": "STOPPED"}))
+        elif pool_future.exception() is not None:
+            job["future"].set_exception(pool_future.exception())
+        else:
+            job["future"].set_result(pool_future.result())
+
+    def _finish(self, job, future, cache_key):
+        job["finished_at"] = time.time()
+        if future.cancelled() or future.exception() is not None:
+            return
+        timetable, meta = future.result()
+        solver_metrics.record(meta)
+        # An accepted version is only good enough for this client, not for the cache
+        if cache_key and timetable and "accepted" not in meta:
+            solution_cache.put(cache_key, timetable)
+
+    def _state(self, job):
+        future = job["future"]
+        if future.cancelled():
+            return "cancelled"
+        if future.done():
+            if future.exception() is not None:
+                return "failed"
+            if future.result()[0] is None:
+                return "cancelled" if job["cancel_requested"] else "failed"
+            return "done"
+        return "running" if job["id"] in self._progress else "queued"
+
+    def status(self, job_id):
+        """Return a JSON-ready status dict for a job, or None if the id is unknown."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        state = self._state(job)
+        finished_at = job["finished_at"]
+        if job["cached"]:
+            progress = {"phase": "cached"}
+        else:
+            progress = dict(self._progress.get(job_id, {"phase": "queued"}))
+        info = {
+            "job_id": job_id,
+            "status": state,
+            "progress": progress,
+            "cancel_requested": job["cancel_requested"],
+            "accept_requested": job["accept_requested"],
+            "cached": job["cached"],
+            "cache_key": job["cache_key"],
+            "tenant": job["tenant"],
+            "priority": job["priority"],
+            "cores": job["cores"],
+            "submitted_at": job["submitted_at"],
+            "started_at": job["started_at"],
+            "finished_at": finished_at,
+            "elapsed_seconds": round((finished_at or time.time()) - job["submitted_at"], 3),
+            "queue_wait_seconds": round((job["started_at"] or finished_at or time.time()) - job["submitted_at"], 3),
+        }
+        if state == "queued" and job["started_at"] is None:
+            info["queue_position"] = solver_scheduler.position(job_id)
+        if job["anytime"] and not job["cached"]:
+            info["versions"] = list(self._versions.get(job_id, []))
+        future = job["future"]
+        if future.done() and not future.cancelled():
+            if future.exception() is not None:
+                info["error"] = str(future.exception())
+            else:
+                info["meta"] = future.result()[1]
+        return info
+
+    def result(self, job_id, version=None):
+        """
+        Return (status dict, timetable). The timetable is the finished job's, or for an
+        anytime job the given version, by default the latest while the search still runs
+        (named in the status dict's "version"). It is None when there is none (yet).
+        """
+        info = self.status(job_id)
+        if info is None:
+            return None, None
+        if version is None:
+            if info["status"] == "done":
+                return info, self._jobs[job_id]["future"].result()[0]
+            if info["status"] not in ("queued", "running") or not info.get("versions"):
+                return info, None
+            version = info["versions"][-1]["version"]
+        if not any(summary["version"] == version for summary in info.get("versions", [])):
+            return info, None
+        compact = self._versions.get((job_id, version))
+        if compact is None:
+            return info, None
+        info["version"] = version
+        return info, from_compact(compact)
+
+    def events(self, job_id, start=0):
+        """A job's events from number start on (an empty list for an unknown job or none yet)."""
+        if self._events is None:
+            return []
+        return self._events.get(job_id, [])[start:]
+
+    def accept(self, job_id):
+        """
+        Stop a running anytime job and make its latest version the result. Returns the
+        new status, or None for an unknown job. Raises ValueError when there is nothing
+        to accept yet.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if not job["future"].done():
+            if not job["anytime"] or not self._versions.get(job_id):
+                raise ValueError("The job has no version to accept yet")
+            job["accept_requested"] = True
+            self._cancelled[job_id] = "accept"
+        return self.status(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop. Returns the new status or None."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if not job["future"].done():
+            job["cancel_requested"] = True
+            if solver_scheduler.remove(job_id):
+                job["future"].cancel()
+            elif not job["future"].cancel():
+                self._cancelled[job_id] = True
+        return self.status(job_id)
+
+
+job_manager = SolveJobManager(
+    Config.SOLVER_MAX_WORKERS,
+    Config.SOLVER_MAX_PENDING_JOBS,
+    Config.SOLVER_JOB_TTL_SECONDS,
+)
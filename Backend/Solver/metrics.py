@@ -0,0 +1,94 @@
+"""
+Phase timing for single solves and running totals across solves.
+
+PhaseTimer records, for each phase of one solve, how long it took and how many
+CP-SAT variables and constraints it added; the list ends up in meta["phases"].
+SolverMetrics folds those lists into per-phase totals for the metrics endpoint.
+Solves may run in worker processes, so totals are recorded from the returned meta
+in the server process rather than from inside the solver.
+"""
+import threading
+import time
+
+
+class PhaseTimer:
+    """
+    Times consecutive phases: start() ends the running phase and begins the next.
+    on_stop(record) is called with each finished phase's record as it is appended.
+    """
+
+    def __init__(self, model=None, on_stop=None):
+        self.model = model
+        self.on_stop = on_stop
+        self.phases = []
+        self._current = None
+
+    def _sizes(self):
+        if self.model is None:
+            return 0, 0
+        proto = self.model.Proto()
+        return len(proto.variables), len(proto.constraints)
+
+    def start(self, name):
+        self.stop()
+        variables, constraints = self._sizes()
+        self._current = (name, time.perf_counter(), variables, constraints)
+
+    def stop(self):
+        if self._current is None:
+            return
+        name, started, variables, constraints = self._current
+        end_variables, end_constraints = self._sizes()
+        self.phases.append({
+            "phase": name,
+            "seconds": round(time.perf_counter() - started, 4),
+            "variables": end_variables - variables,
+            "constraints": end_constraints - constraints,
+        })
+        self._current = None
+        if self.on_stop:
+            self.on_stop(self.phases[-1])
+
+
+class SolverMetrics:
+    """Thread-safe per-phase and per-status counters over every finished solve."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._solves = {}
+        self._phases = {}
+
+    def record(self, meta):
+        """Add one solve's meta (a decomposed solve counts each component's phases)."""
+        if not meta:
+            return
+        phase_lists = [component.get("phases", []) for component in meta.get("components", [])]
+        phase_lists.append(meta.get("phases", []))
+        with self._lock:
+            status = meta.get("status", "UNKNOWN")
+            self._solves[status] = self._solves.get(status, 0) + 1
+            for phases in phase_lists:
+                for phase in phases:
+                    totals = self._phases.setdefault(phase["phase"], {
+                        "count": 0, "seconds": 0.0, "max_seconds": 0.0, "variables": 0, "constraints": 0,
+                    })
+                    totals["count"] += 1
+                    totals["seconds"] += phase["seconds"]
+                    totals["max_seconds"] = max(totals["max_seconds"], phase["seconds"])
+                    totals["variables"] += phase.get("variables", 0)
+                    totals["constraints"] += phase.get("constraints", 0)
+
+    def snapshot(self):
+        """Counters as a JSON-ready dict, with the mean time of each phase."""
+        with self._lock:
+            phases = {}
+            for name, totals in self._phases.items():
+                phases[name] = {
+                    **totals,
+                    "seconds": round(totals["seconds"], 4),
+                    "mean_seconds": round(totals["seconds"] / totals["count"], 4),
+                }
+            return {"solves": dict(self._solves), "solve_count": sum(self._solves.values()), "phases": phases}
+
+
+solver_metrics = SolverMetrics()
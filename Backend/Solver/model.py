@@ -0,0 +1,1510 @@
+import functools
+import json
+import logging
+import math
+import threading
+import time
+import numpy as np
+from ortools.sat.python import cp_model
+
+from config import Config
+from Solver.metrics import PhaseTimer
+from Solver.profiles import apply_profile, resolve_profile, solve_cost
+from Solver.rooms import assign_rooms, capacity_groups, class_size, crossing_groups, eligible_rooms
+
+logger = logging.getLogger(__name__)
+
+# Solves also run in spawned worker processes that never import the app, so the
+# solver package sets up its own output. SOLVER_LOG_LEVEL=DEBUG restores the full trace.
+_solver_logger = logging.getLogger("Solver")
+if not _solver_logger.handlers:
+    _solver_logger.addHandler(logging.StreamHandler())
+_solver_logger.setLevel(Config.SOLVER_LOG_LEVEL)
+
+# Constants
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+SLOTS_PER_DAY = 9
+LUNCH_BREAK_SLOTS = [5]  # Only slot 5 (01:00 PM - 01:40 PM)
+LECTURES_PER_DAY = 4  # Enforce exactly 4 lectures per day per batch
+TIME_SLOTS = [
+    "08:50-09:40", "09:40-10:30", "10:30-11:20", "11:20-12:10", "12:10-01:00",
+    "01:00-01:40",  # LUNCH BREAK
+    "01:40-02:30", "02:30-03:20", "03:20-04:10"
+]
+ENCODINGS = ("onehot", "intvar", "interval")  # CP-SAT model formulations, first is the default
+SLOT_MINUTES = 50  # Length of a teaching slot; a lab's duration is rounded up to whole slots
+STOP_POLL_SECONDS = 0.25  # How often a running solve checks whether it should stop
+# Weights of the soft goals minimized by anytime solves, see _add_soft_objective
+OBJECTIVE_WEIGHTS = {"spread": 3, "gaps": 2, "faculty_gaps": 1}
+
+def load_schema(path):
+    """Load the timetable schema JSON."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+def parse_fixed_positions(fixed_positions):
+    """
+    Normalise pinned cells to {(division, batch, day, slot): subject_code}.
+    Accepts that dict, JSON keys of the form "division|batch|day|slot", or a list of
+    {"division", "batch", "day", "slot", "subject"} objects. Days may be indices or names.
+    Raises ValueError on anything else.
+    """
+    if not fixed_positions:
+        return {}
+
+    if isinstance(fixed_positions, dict):
+        entries = []
+        for key, subj_code in fixed_positions.items():
+            parts = key if isinstance(key, tuple) else str(key).split("|")
+            if len(parts) != 4:
+                raise ValueError(f"Fixed position key {key!r} must be division|batch|day|slot")
+            entries.append((*parts, subj_code))
+    elif isinstance(fixed_positions, list):
+        try:
+            entries = [(p["division"], p.get("batch", ""), p["day"], p["slot"], p["subject"]) for p in fixed_positions]
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError("Fixed positions need division, day, slot and subject")
+    else:
+        raise ValueError("fixed_positions must be an object or a list")
+
+    parsed = {}
+    for div_name, batch_name, day, slot, subj_code in entries:
+        day, slot = _day_slot(day, slot, f"fixed position for division {div_name}")
+        parsed[(div_name, batch_name or "", day, slot)] = subj_code
+    return parsed
+
+def day_index(day, what):
+    """A day given as an index or a name, as an index. Raises ValueError."""
+    if isinstance(day, str) and day in DAY_NAMES:
+        return DAY_NAMES.index(day)
+    try:
+        day = int(day)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid day in {what}")
+    if not 0 <= day < len(DAYS):
+        raise ValueError(f"Day {day} in {what} is out of range")
+    return day
+
+def _day_slot(day, slot, what):
+    """(day index, slot) from a day index or name and a slot index. Raises ValueError."""
+    day = day_index(day, what)
+    try:
+        slot = int(slot)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid slot in {what}")
+    if not 0 <= slot < SLOTS_PER_DAY:
+        raise ValueError(f"Day {day} / slot {slot} in {what} is out of range")
+    return day, slot
+
+def parse_blocked_slots(blocked_slots):
+    """
+    Normalise a schema's "blocked_slots" (slots nobody is taught in, like lunch) to a
+    set of (day, slot). Accepts a list of {"day", "slot"} objects or [day, slot] pairs;
+    days may be indices or names. Raises ValueError on anything else.
+    """
+    if not blocked_slots:
+        return set()
+    if not isinstance(blocked_slots, list):
+        raise ValueError("blocked_slots must be a list")
+    parsed = set()
+    for entry in blocked_slots:
+        if isinstance(entry, dict) and "day" in entry and "slot" in entry:
+            day, slot = entry["day"], entry["slot"]
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            day, slot = entry
+        else:
+            raise ValueError("Blocked slots need a day and a slot")
+        parsed.add(_day_slot(day, slot, "blocked slot"))
+    return parsed
+
+def faculty_days(faculty):
+    """{abbr: set of day indices} for faculty with an availability list; others teach every day."""
+    return {fac["abbr"]: {day_index(day, f"availability of {fac['abbr']}") for day in fac["availability"]}
+            for fac in faculty if fac.get("availability") is not None}
+
+def slot_masks(subjects, faculty, blocked_slots=()):
+    """
+    The (day, slot) pairs each subject may be taught in, in subject order: teaching
+    slots that are not blocked, on days all of the subject's faculty are available.
+    The models create no variables outside these masks.
+    """
+    available = faculty_days(faculty)
+    open_slots = [(d, s) for d in range(len(DAYS)) for s in range(SLOTS_PER_DAY)
+                  if s not in LUNCH_BREAK_SLOTS and (d, s) not in blocked_slots]
+    masks = []
+    for subj in subjects:
+        days = set(range(len(DAYS)))
+        for abbr in subj.get("faculty", []):
+            days &= available.get(abbr, days)
+        masks.append(frozenset((d, s) for d, s in open_slots if d in days))
+    return masks
+
+def _read_previous_solution(previous, lecture_subjects, lab_subjects):
+    """
+    Turn a timetable in the output format back into cell assignments:
+    ({(day, slot, division): lecture_index}, {(day, slot, division, batch): lab_index}).
+    Subjects that no longer exist are ignored.
+    """
+    lecture_index_map = {subj["code"]: idx for idx, subj in enumerate(lecture_subjects)}
+    lab_index_map = {subj["code"]: idx for idx, subj in enumerate(lab_subjects)}
+    prev_lectures, prev_labs = {}, {}
+    for div_name, div_data in previous.items():
+        for batch, schedule in div_data.get("batches", {}).items():
+            for d, day_name in enumerate(DAY_NAMES):
+                for s, cell in enumerate(schedule.get(day_name, [])[:SLOTS_PER_DAY]):
+                    if s in LUNCH_BREAK_SLOTS or cell in ("-", "LUNCH BREAK"):
+                        continue
+                    code = cell.split("\n")[0]
+                    if code in lecture_index_map:
+                        prev_lectures[(d, s, div_name)] = lecture_index_map[code]
+                    elif code in lab_index_map:
+                        prev_labs[(d, s, div_name, batch)] = lab_index_map[code]
+    return prev_lectures, prev_labs
+
+def solution_drift(previous, timetable):
+    """Count the teaching cells that differ between two timetables in the output format."""
+    compared = changed = 0
+    per_division = {}
+    for div_name, div_data in timetable.items():
+        previous_batches = previous.get(div_name, {}).get("batches", {})
+        div_changed = 0
+        for batch, schedule in div_data["batches"].items():
+            previous_schedule = previous_batches.get(batch)
+            if previous_schedule is None:
+                continue
+            for day_name, slots in schedule.items():
+                previous_slots = previous_schedule.get(day_name, [])
+                for s, cell in enumerate(slots):
+                    if s in LUNCH_BREAK_SLOTS or s >= len(previous_slots):
+                        continue
+                    compared += 1
+                    # Code and faculty only: the room is reassigned after every solve
+                    if cell.split("\n")[:2] != previous_slots[s].split("\n")[:2]:
+                        div_changed += 1
+        per_division[div_name] = div_changed
+        changed += div_changed
+    return {
+        "cells_compared": compared,
+        "cells_changed": changed,
+        "changed_fraction": round(changed / compared, 4) if compared else 0.0,
+        "divisions": per_division,
+    }
+
+def division_takes(subj, div_name):
+    """A subject with no explicit division list is taught to every division."""
+    division_names = subj.get("divisions", [])
+    return not division_names or div_name in division_names
+
+def lab_session_slots(subj):
+    """Consecutive slots one session of a lab fills, from its duration in minutes."""
+    return max(1, math.ceil(subj.get("duration", SLOT_MINUTES) / SLOT_MINUTES))
+
+def batch_takes(subj, batch):
+    """A lab with no explicit batch list is taken by every batch."""
+    batch_names = subj.get("batches", [])
+    return not batch_names or batch in batch_names
+
+class CompiledSchema:
+    """
+    A schema's relationships resolved once before a model is built. Subject codes are
+    interned to their index in lecture_subjects / lab_subjects, and the inverted indexes let the constraint builders walk only the
+    (subject, division or batch, slot) incidences that exist instead of testing every
+    faculty x subject x division x slot combination.
+    """
+
+    def __init__(self, divisions, lecture_subjects, lab_subjects, faculty, rooms, blocked_slots=()):
+        self.lecture_ids = {subj["code"]: j for j, subj in enumerate(lecture_subjects)}
+        self.lab_ids = {subj["code"]: k for k, subj in enumerate(lab_subjects)}
+        self.lecture_masks = slot_masks(lecture_subjects, faculty, blocked_slots)
+        self.lab_masks = slot_masks(lab_subjects, faculty, blocked_slots)
+        # The same masks as (day, slot) lists in week order, for iterating
+        self.lecture_slots = [sorted(mask) for mask in self.lecture_masks]
+        self.lab_slots = [sorted(mask) for mask in self.lab_masks]
+
+        # division -> lecture indices it takes, (division, batch) -> lab indices, and back
+        self.division_lectures = {div["name"]: [] for div in divisions}
+        self.batch_labs = {(div["name"], batch): [] for div in divisions for batch in div["batches"]}
+        self.lecture_takers = [[] for _ in lecture_subjects]
+        self.lab_takers = [[] for _ in lab_subjects]
+        for j, subj in enumerate(lecture_subjects):
+            names = set(subj.get("divisions", []))
+            for div in divisions:
+                if not names or div["name"] in names:
+                    self.division_lectures[div["name"]].append(j)
+                    self.lecture_takers[j].append(div["name"])
+        for k, subj in enumerate(lab_subjects):
+            names = set(subj.get("divisions", []))
+            batches = set(subj.get("batches", []))
+            for div in divisions:
+                if names and div["name"] not in names:
+                    continue
+                for batch in div["batches"]:
+                    if not batches or batch in batches:
+                        self.batch_labs[(div["name"], batch)].append(k)
+                        self.lab_takers[k].append((div["name"], batch))
+
+        # faculty abbr -> indices of the lectures and labs they teach
+        self.faculty_lectures = {}
+        self.faculty_labs = {}
+        for j, subj in enumerate(lecture_subjects):
+            for abbr in subj.get("faculty", []):
+                self.faculty_lectures.setdefault(abbr, []).append(j)
+        for k, subj in enumerate(lab_subjects):
+            for abbr in subj.get("faculty", []):
+                self.faculty_labs.setdefault(abbr, []).append(k)
+
+        # Eligible rooms of every class the model can schedule, keyed ("lec", division,
+        # lecture index) for a division's lecture and ("lab", division, batch, lab index).
+        # Candidate rooms come from a name / room type index rather than the whole list.
+        rooms_by_name = {room["name"]: room for room in rooms}
+        rooms_by_type = {}
+        for room in rooms:
+            rooms_by_type.setdefault(room["type"], []).append(room)
+
+        def hosting(subj):
+            if subj.get("required_room"):
+                return [rooms_by_name[subj["required_room"]]] if subj["required_room"] in rooms_by_name else []
+            return rooms_by_type.get(subj.get("room_type"), [])
+
+        lecture_hosts = [hosting(subj) for subj in lecture_subjects]
+        lab_hosts = [hosting(subj) for subj in lab_subjects]
+        self.room_classes = {}
+        for div in divisions:
+            for j in self.division_lectures[div["name"]]:
+                self.room_classes[("lec", div["name"], j)] = eligible_rooms(lecture_subjects[j], lecture_hosts[j],
+                                                                            class_size(div))
+            size = class_size(div, lab=True)
+            for batch in div["batches"]:
+                for k in self.batch_labs[(div["name"], batch)]:
+                    self.room_classes[("lab", div["name"], batch, k)] = eligible_rooms(lab_subjects[k], lab_hosts[k],
+                                                                                       size)
+
+def _faculty_cells(abbr, index):
+    """
+    (cell key, subject index, is_lab) for every cell one of a faculty member's subjects
+    may occupy: its mask slots in the divisions (lectures) or batches (labs) taking it.
+    Cell keys start with the day index.
+    """
+    for j in index.faculty_lectures.get(abbr, []):
+        for d, s in index.lecture_slots[j]:
+            for div_name in index.lecture_takers[j]:
+                yield (d, s, div_name), j, False
+    for k in index.faculty_labs.get(abbr, []):
+        for d, s in index.lab_slots[k]:
+            for div_name, batch in index.lab_takers[k]:
+                yield (d, s, div_name, batch), k, True
+
+def _guard(model, constraint, assumptions, key):
+    """Enforce a constraint only under the assumption literal for key, when collecting assumptions."""
+    if assumptions is None:
+        return
+    if key not in assumptions:
+        assumptions[key] = model.NewBoolVar("assume_" + "_".join(str(part) for part in key))
+    constraint.OnlyEnforceIf(assumptions[key])
+
+def _build_intvar_model(model, divisions, lecture_subjects, lab_subjects, faculty, rooms, fixed_positions,
+                        previous_cells=None, frozen_days=(), timer=None, blocked_slots=(),
+                        symmetry_breaking=False):
+    """
+    Original encoding: one IntVar per teaching cell holding the subject index (-1 means
+    free), its domain limited to the subjects whose slot mask allows the cell, with a
+    fresh reified BoolVar for every (cell, subject) fact each constraint needs.
+    Kept as a reference for comparing against the one-hot model.
+    """
+    timer = timer or PhaseTimer(model)
+
+    timer.start("compile")
+    index = CompiledSchema(divisions, lecture_subjects, lab_subjects, faculty, rooms, blocked_slots)
+
+    timer.start("variables")
+    # Subjects each cell may hold; lunch, blocked slots, absent faculty and subjects the
+    # division or batch does not take are left out of the domains instead of constrained away
+    lecture_domain = {}
+    lab_domain = {}
+    for d in range(len(DAYS)):
+        for s in range(SLOTS_PER_DAY):
+            if s in LUNCH_BREAK_SLOTS:
+                continue
+            for div in divisions:
+                lecture_domain[(d, s, div["name"])] = {
+                    j for j in index.division_lectures[div["name"]] if (d, s) in index.lecture_masks[j]
+                }
+                for batch in div["batches"]:
+                    lab_domain[(d, s, div["name"], batch)] = {
+                        k for k in index.batch_labs[(div["name"], batch)] if (d, s) in index.lab_masks[k]
+                    }
+
+    # Variables for lectures: timetable_lecture[(day, slot, division)] = lecture_subject_index (-1 means free)
+    timetable_lecture = {}
+    for (d, s, div_name), allowed in lecture_domain.items():
+        timetable_lecture[(d, s, div_name)] = model.NewIntVarFromDomain(
+            cp_model.Domain.FromValues([-1, *sorted(allowed)]), f"lec_{d}{s}{div_name}"
+        )
+
+    # Variables for labs: timetable_lab[(day, slot, division, batch)] = lab_subject_index (-1 means free)
+    timetable_lab = {}
+    for (d, s, div_name, batch), allowed in lab_domain.items():
+        timetable_lab[(d, s, div_name, batch)] = model.NewIntVarFromDomain(
+            cp_model.Domain.FromValues([-1, *sorted(allowed)]), f"lab_{d}{s}{div_name}_{batch}"
+        )
+
+    logger.debug("=== SOLVER DEBUG: Variables created ===")
+
+    # Warm start: hint every teaching cell with its previous value, fixing frozen days
+    timer.start("warm_start")
+    if previous_cells:
+        prev_lectures, prev_labs = previous_cells
+        previous_divisions = {key[2] for key in prev_lectures} | {key[2] for key in prev_labs}
+        for (d, s, div_name), var in timetable_lecture.items():
+            if s in LUNCH_BREAK_SLOTS or div_name not in previous_divisions:
+                continue
+            value = prev_lectures.get((d, s, div_name), -1)
+            model.AddHint(var, value)
+            if (div_name, d) in frozen_days:
+                model.Add(var == value)
+        for (d, s, div_name, batch), var in timetable_lab.items():
+            if s in LUNCH_BREAK_SLOTS or div_name not in previous_divisions:
+                continue
+            value = prev_labs.get((d, s, div_name, batch), -1)
+            model.AddHint(var, value)
+            if (div_name, d) in frozen_days:
+                model.Add(var == value)
+
+    # Apply fixed positions if provided
+    timer.start("fixed_positions")
+    if fixed_positions:
+        logger.debug("Applying %d fixed positions", len(fixed_positions))
+        for (div_name, batch_name, d, s), subj_code in fixed_positions.items():
+            if subj_code in index.lecture_ids:
+                var, subj_index = timetable_lecture.get((d, s, div_name)), index.lecture_ids[subj_code]
+            elif subj_code in index.lab_ids and batch_name:
+                var, subj_index = timetable_lab.get((d, s, div_name, batch_name)), index.lab_ids[subj_code]
+            else:
+                continue
+            if var is None:
+                # Lunch has no cell to pin, which makes the model infeasible
+                model.AddBoolOr([])
+            else:
+                model.Add(var == subj_index)
+
+    # Constraint: A division cannot have a lecture and a lab at the same time for the same slot
+    timer.start("conflict")
+    for d in range(len(DAYS)):
+        for s in range(SLOTS_PER_DAY):
+            if s in LUNCH_BREAK_SLOTS:
+                continue
+            for div in divisions:
+                # For each batch, ensure no conflict between division lecture and batch lab
+                for batch in div["batches"]:
+                    is_lecture = model.NewBoolVar(f"is_lec_{d}{s}{div['name']}")
+                    is_lab = model.NewBoolVar(f"is_lab_{d}{s}{div['name']}_{batch}")
+
+                    model.Add(timetable_lecture[(d, s, div["name"])] >= 0).OnlyEnforceIf(is_lecture)
+                    model.Add(timetable_lecture[(d, s, div["name"])] == -1).OnlyEnforceIf(is_lecture.Not())
+
+                    model.Add(timetable_lab[(d, s, div["name"], batch)] >= 0).OnlyEnforceIf(is_lab)
+                    model.Add(timetable_lab[(d, s, div["name"], batch)] == -1).OnlyEnforceIf(is_lab.Not())
+
+                    # At most one can be scheduled
+                    model.Add(is_lecture + is_lab <= 1)
+
+    # Constraint: Exactly 4 lectures per day per batch
+    timer.start("daily_count")
+    logger.debug("Adding daily lecture count constraint (%d lectures per day per batch)...", LECTURES_PER_DAY)
+    for d in range(len(DAYS)):
+        for div in divisions:
+            for batch in div["batches"]:
+                daily_class_vars = []
+
+                # Count lectures (these apply to the whole division, so affect this batch)
+                for s in range(SLOTS_PER_DAY):
+                    if s not in LUNCH_BREAK_SLOTS:
+                        # Boolean variable for whether there's a lecture in this slot
+                        has_lecture = model.NewBoolVar(f"has_lec_{d}{s}{div['name']}")
+                        model.Add(timetable_lecture[(d, s, div["name"])] >= 0).OnlyEnforceIf(has_lecture)
+                        model.Add(timetable_lecture[(d, s, div["name"])] == -1).OnlyEnforceIf(has_lecture.Not())
+                        daily_class_vars.append(has_lecture)
+
+                        # Boolean variable for whether there's a lab for this batch in this slot
+                        has_lab = model.NewBoolVar(f"has_lab_{d}{s}{div['name']}_{batch}")
+                        model.Add(timetable_lab[(d, s, div["name"], batch)] >= 0).OnlyEnforceIf(has_lab)
+                        model.Add(timetable_lab[(d, s, div["name"], batch)] == -1).OnlyEnforceIf(has_lab.Not())
+                        daily_class_vars.append(has_lab)
+
+                # Exactly 4 classes per day per batch
+                model.Add(sum(daily_class_vars) == LECTURES_PER_DAY)
+                logger.debug("Added constraint: Division %s, Batch %s must have exactly %d classes per day",
+                             div["name"], batch, LECTURES_PER_DAY)
+
+    # Lecture frequency constraints (min/max per week) - adjusted for new daily constraint
+    timer.start("frequency")
+    if lecture_subjects:
+        logger.debug("Adding lecture frequency constraints...")
+        for subj_index, subj in enumerate(lecture_subjects):
+            min_pw = max(1, subj.get("min_per_week", 1))
+            max_pw = min(subj.get("max_per_week", 7), 7)
+
+            vars_for_subj = []
+            for d, s in index.lecture_slots[subj_index]:
+                for div_name in index.lecture_takers[subj_index]:
+                    bvar = model.NewBoolVar(f"lec_subj_{subj_index}{d}{s}_{div_name}")
+                    model.Add(timetable_lecture[(d, s, div_name)] == subj_index).OnlyEnforceIf(bvar)
+                    model.Add(timetable_lecture[(d, s, div_name)] != subj_index).OnlyEnforceIf(bvar.Not())
+                    vars_for_subj.append(bvar)
+
+            if vars_for_subj:
+                model.Add(sum(vars_for_subj) >= min_pw)
+                model.Add(sum(vars_for_subj) <= max_pw)
+
+    # Lab frequency constraints (simplified)
+    if lab_subjects:
+        logger.debug("Adding lab frequency constraints...")
+        for subj_index, subj in enumerate(lab_subjects):
+            min_pw = max(1, subj.get("min_per_week", 1))
+            max_pw = min(subj.get("max_per_week", 5), 5)
+
+            vars_for_subj = []
+            for d, s in index.lab_slots[subj_index]:
+                # Only the batches that take this lab
+                for div_name, batch in index.lab_takers[subj_index]:
+                    bvar = model.NewBoolVar(f"lab_subj_{subj_index}{d}{s}{div_name}{batch}")
+                    model.Add(timetable_lab[(d, s, div_name, batch)] == subj_index).OnlyEnforceIf(bvar)
+                    model.Add(timetable_lab[(d, s, div_name, batch)] != subj_index).OnlyEnforceIf(bvar.Not())
+                    vars_for_subj.append(bvar)
+
+            if vars_for_subj:
+                model.Add(sum(vars_for_subj) >= min_pw)
+                model.Add(sum(vars_for_subj) <= max_pw)
+
+    # Enhanced faculty constraints
+    timer.start("faculty")
+    logger.debug("Adding faculty constraints...")
+    for fac in faculty:
+        max_per_day = min(fac.get("max_per_day", 5), 7)
+        max_per_week = min(fac.get("max_per_week", 25), 35)
+
+        weekly_assignments = []
+        daily_assignments = {d: [] for d in range(len(DAYS))}
+        slot_assignments = {}
+
+        # Only the cells this faculty member's subjects can occupy
+        for key, subj_index, is_lab in _faculty_cells(fac["abbr"], index):
+            var = timetable_lab[key] if is_lab else timetable_lecture[key]
+            bvar = model.NewBoolVar(f"fac_{fac['abbr']}{'lab' if is_lab else 'lec'}{'_'.join(map(str, key))}_{subj_index}")
+            model.Add(var == subj_index).OnlyEnforceIf(bvar)
+            model.Add(var != subj_index).OnlyEnforceIf(bvar.Not())
+            daily_assignments[key[0]].append(bvar)
+            slot_assignments.setdefault(key[:2], []).append(bvar)
+            weekly_assignments.append(bvar)
+
+        # One class at a time
+        for bvars in slot_assignments.values():
+            if len(bvars) > 1:
+                model.AddAtMostOne(bvars)
+
+        # Daily limit
+        for d in range(len(DAYS)):
+            if daily_assignments[d]:
+                model.Add(sum(daily_assignments[d]) <= max_per_day)
+
+        # Weekly limit for faculty
+        if weekly_assignments:
+            model.Add(sum(weekly_assignments) <= max_per_week)
+
+    # Room capacity: per slot, no more classes whose eligible rooms all lie in a set of
+    # rooms than the set holds. Rooms themselves are assigned after the solve.
+    timer.start("rooms")
+    logger.debug("Adding room constraints...")
+
+    def held(key, d, s):
+        """A fresh BoolVar for the class key being held at (d, s), None if its cell cannot hold it."""
+        if key[0] == "lec":
+            cell, subj_index = (d, s, key[1]), key[2]
+            var, allowed = timetable_lecture[cell], lecture_domain[cell]
+        else:
+            cell, subj_index = (d, s, key[1], key[2]), key[3]
+            var, allowed = timetable_lab[cell], lab_domain[cell]
+        if subj_index not in allowed:
+            return None
+        bvar = model.NewBoolVar(f"room_{'_'.join(map(str, key))}_{d}_{s}")
+        model.Add(var == subj_index).OnlyEnforceIf(bvar)
+        model.Add(var != subj_index).OnlyEnforceIf(bvar.Not())
+        return bvar
+
+    teaching_cells = [(d, s) for d in range(len(DAYS)) for s in range(SLOTS_PER_DAY) if s not in LUNCH_BREAK_SLOTS]
+    for room_names, keys in capacity_groups(index.room_classes):
+        if len(keys) <= len(room_names):
+            continue
+        for d, s in teaching_cells:
+            room_assignments = [bvar for bvar in (held(key, d, s) for key in keys) if bvar is not None]
+            if len(room_assignments) > len(room_names):
+                model.Add(sum(room_assignments) <= len(room_names))
+    _share_rooms(model, index, held, teaching_cells)
+
+    if symmetry_breaking:
+        timer.start("symmetry")
+        _add_symmetry_breaking(model, divisions, lecture_subjects, lab_subjects, fixed_positions,
+                               lambda d, s, div_name: timetable_lecture[(d, s, div_name)] + 1,
+                               lambda d, s, div_name, batch: timetable_lab[(d, s, div_name, batch)] + 1)
+    timer.stop()
+
+    # Each cell variable holds the subject index itself; lab ids follow the lecture ids
+    layout = _GridLayout(divisions, one_hot=False)
+    for (d, s, div_name), var in timetable_lecture.items():
+        layout.add(var, div_name, None, d, s, 0)
+    for (d, s, div_name, batch), var in timetable_lab.items():
+        layout.add(var, div_name, batch, d, s, len(lecture_subjects))
+    return layout.freeze()
+
+def _build_onehot_model(model, divisions, lecture_subjects, lab_subjects, faculty, rooms, fixed_positions,
+                        previous_cells=None, frozen_days=(), timer=None, assumptions=None, blocked_slots=(),
+                        lab_sessions=False, symmetry_breaking=False, objective=False, stay_close=False):
+    """
+    One-hot encoding: a single BoolVar per (cell, subject), created only for slots in
+    the subject's mask (see slot_masks) and for subjects the division (and, for labs,
+    the batch) actually takes. Cell exclusivity uses native AtMostOne
+    and every other constraint sums the same literals instead of reifying new ones.
+    With lab_sessions (the "interval" encoding) labs are placed as whole sessions of
+    lab_session_slots consecutive slots instead, see _add_lab_sessions.
+    With an assumptions dict, pins and the daily, frequency, faculty, clash and room
+    constraints are enforced through one assumption literal per group, collected in that dict.
+    With objective, the soft goals of _add_soft_objective are minimized. With stay_close
+    (and previous_cells), the number of previous classes that move or vanish is minimized.
+    """
+    teaching_slots = [s for s in range(SLOTS_PER_DAY) if s not in LUNCH_BREAK_SLOTS]
+    timer = timer or PhaseTimer(model)
+
+    timer.start("compile")
+    index = CompiledSchema(divisions, lecture_subjects, lab_subjects, faculty, rooms, blocked_slots)
+
+    timer.start("variables")
+    # lec_vars[(day, slot, division)] = {lecture_subject_index: BoolVar} for lectures the division takes
+    lec_vars = {}
+    # lab_vars[(day, slot, division, batch)] = {lab_subject_index: BoolVar} for labs the batch takes
+    lab_vars = {}
+    for d in range(len(DAYS)):
+        for s in teaching_slots:
+            for div in divisions:
+                lec_vars[(d, s, div["name"])] = {
+                    j: model.NewBoolVar(f"lec_{d}_{s}_{div['name']}_{j}")
+                    for j in index.division_lectures[div["name"]] if (d, s) in index.lecture_masks[j]
+                }
+                for batch in div["batches"]:
+                    lab_vars[(d, s, div["name"], batch)] = {} if lab_sessions else {
+                        k: model.NewBoolVar(f"lab_{d}_{s}_{div['name']}_{batch}_{k}")
+                        for k in index.batch_labs[(div["name"], batch)] if (d, s) in index.lab_masks[k]
+                    }
+    if lab_sessions:
+        sessions = _add_lab_sessions(model, lab_subjects, index, lab_vars)
+
+    logger.debug("=== SOLVER DEBUG: Variables created ===")
+
+    # Lunch, blocked slots and days a subject's faculty are away have no literals at all,
+    # so they need no constraints.
+
+    # Warm start: hint every literal with the previous solution, fixing frozen days
+    timer.start("warm_start")
+    kept_classes = []
+    if previous_cells:
+        prev_lectures, prev_labs = previous_cells
+        previous_divisions = {key[2] for key in prev_lectures} | {key[2] for key in prev_labs}
+        for key, cell in lec_vars.items():
+            if key[2] not in previous_divisions:
+                continue
+            previous_index = prev_lectures.get(key, -1)
+            for j, lit in cell.items():
+                model.AddHint(lit, j == previous_index)
+                if (key[2], key[0]) in frozen_days:
+                    model.Add(lit == int(j == previous_index))
+                elif j == previous_index:
+                    kept_classes.append(lit)
+        for key, cell in lab_vars.items():
+            if key[2] not in previous_divisions:
+                continue
+            previous_index = prev_labs.get(key, -1)
+            for k, lit in cell.items():
+                model.AddHint(lit, k == previous_index)
+                if (key[2], key[0]) in frozen_days:
+                    model.Add(lit == int(k == previous_index))
+                elif k == previous_index:
+                    kept_classes.append(lit)
+
+    # Apply fixed positions if provided. A pin on a lunch slot or on a subject the
+    # division or batch does not take has no literal to fix, which makes the model infeasible.
+    timer.start("fixed_positions")
+    if fixed_positions:
+        logger.debug("Applying %d fixed positions", len(fixed_positions))
+        for (div_name, batch_name, d, s), subj_code in fixed_positions.items():
+            if subj_code in index.lecture_ids:
+                lit = lec_vars.get((d, s, div_name), {}).get(index.lecture_ids[subj_code])
+                _guard(model, model.AddBoolOr([lit] if lit is not None else []), assumptions,
+                       ("pin", div_name, batch_name, d, s))
+            elif subj_code in index.lab_ids and batch_name:
+                lit = lab_vars.get((d, s, div_name, batch_name), {}).get(index.lab_ids[subj_code])
+                _guard(model, model.AddBoolOr([lit] if lit is not None else []), assumptions,
+                       ("pin", div_name, batch_name, d, s))
+
+    # Cell exclusivity: per batch, at most one of (division lecture, batch lab) in a slot
+    timer.start("conflict")
+    for d in range(len(DAYS)):
+        for s in teaching_slots:
+            for div in divisions:
+                lecture_lits = list(lec_vars[(d, s, div["name"])].values())
+                if not div["batches"] and len(lecture_lits) > 1:
+                    model.AddAtMostOne(lecture_lits)
+                for batch in div["batches"]:
+                    cell_lits = lecture_lits + list(lab_vars[(d, s, div["name"], batch)].values())
+                    if len(cell_lits) > 1:
+                        model.AddAtMostOne(cell_lits)
+
+    # Constraint: Exactly 4 lectures per day per batch
+    timer.start("daily_count")
+    logger.debug("Adding daily lecture count constraint (%d lectures per day per batch)...", LECTURES_PER_DAY)
+    for d in range(len(DAYS)):
+        for div in divisions:
+            for batch in div["batches"]:
+                daily_class_vars = []
+                for s in teaching_slots:
+                    daily_class_vars.extend(lec_vars[(d, s, div["name"])].values())
+                    daily_class_vars.extend(lab_vars[(d, s, div["name"], batch)].values())
+                _guard(model, model.Add(sum(daily_class_vars) == LECTURES_PER_DAY), assumptions,
+                       ("daily", div["name"], batch))
+
+    # Lecture frequency constraints (min/max per week)
+    timer.start("frequency")
+    if lecture_subjects:
+        logger.debug("Adding lecture frequency constraints...")
+        for subj_index, subj in enumerate(lecture_subjects):
+            min_pw = max(1, subj.get("min_per_week", 1))
+            max_pw = min(subj.get("max_per_week", 7), 7)
+            vars_for_subj = [lec_vars[(d, s, div_name)][subj_index] for d, s in index.lecture_slots[subj_index]
+                             for div_name in index.lecture_takers[subj_index]]
+            if vars_for_subj:
+                _guard(model, model.AddLinearConstraint(sum(vars_for_subj), min_pw, max_pw), assumptions,
+                       ("frequency", subj["code"]))
+
+    # Lab frequency constraints
+    if lab_subjects:
+        logger.debug("Adding lab frequency constraints...")
+        for subj_index, subj in enumerate(lab_subjects):
+            min_pw = max(1, subj.get("min_per_week", 1))
+            max_pw = min(subj.get("max_per_week", 5), 5)
+            # A session's covering literal is missing where no whole session fits
+            vars_for_subj = [lab_vars[(d, s, div_name, batch)][subj_index] for d, s in index.lab_slots[subj_index]
+                             for div_name, batch in index.lab_takers[subj_index]
+                             if subj_index in lab_vars[(d, s, div_name, batch)]]
+            if vars_for_subj:
+                _guard(model, model.AddLinearConstraint(sum(vars_for_subj), min_pw, max_pw), assumptions,
+                       ("frequency", subj["code"]))
+
+    # Faculty: one class at a time, daily and weekly limits
+    timer.start("faculty")
+    logger.debug("Adding faculty constraints...")
+    for fac in faculty:
+        max_per_day = min(fac.get("max_per_day", 5), 7)
+        max_per_week = min(fac.get("max_per_week", 25), 35)
+        daily_assignments = {d: [] for d in range(len(DAYS))}
+        slot_assignments = {}
+        for key, subj_index, is_lab in _faculty_cells(fac["abbr"], index):
+            cell = lab_vars[key] if is_lab else lec_vars[key]
+            if subj_index in cell:
+                daily_assignments[key[0]].append(cell[subj_index])
+                slot_assignments.setdefault(key[:2], []).append(cell[subj_index])
+
+        for lits in slot_assignments.values():
+            if len(lits) > 1:
+                _guard(model, model.AddAtMostOne(lits), assumptions, ("clash", fac["abbr"]))
+
+        weekly_assignments = []
+        for d in range(len(DAYS)):
+            if daily_assignments[d]:
+                _guard(model, model.Add(sum(daily_assignments[d]) <= max_per_day), assumptions,
+                       ("faculty", fac["abbr"]))
+            weekly_assignments.extend(daily_assignments[d])
+
+        if weekly_assignments:
+            _guard(model, model.Add(sum(weekly_assignments) <= max_per_week), assumptions,
+                   ("faculty", fac["abbr"]))
+
+    # Room capacity: per slot, no more classes whose eligible rooms all lie in a set of
+    # rooms than the set holds (one constraint per distinct eligible set and per set of
+    # rooms they connect), and crossing sets share out their rooms. Rooms themselves are
+    # assigned after the solve.
+    timer.start("rooms")
+    logger.debug("Adding room constraints...")
+    for room_names, keys in capacity_groups(index.room_classes):
+        if len(keys) <= len(room_names):
+            continue
+        for d in range(len(DAYS)):
+            for s in teaching_slots:
+                room_assignments = []
+                for key in keys:
+                    if key[0] == "lec":
+                        cell, j = lec_vars[(d, s, key[1])], key[2]
+                    else:
+                        cell, j = lab_vars[(d, s, key[1], key[2])], key[3]
+                    if j in cell:
+                        room_assignments.append(cell[j])
+                if len(room_assignments) <= len(room_names):
+                    continue
+                if len(room_names) == 1:
+                    constraint = model.AddAtMostOne(room_assignments)
+                else:
+                    constraint = model.Add(sum(room_assignments) <= len(room_names))
+                _guard(model, constraint, assumptions, ("room", *room_names))
+
+    def held(key, d, s):
+        if key[0] == "lec":
+            return lec_vars[(d, s, key[1])].get(key[2])
+        return lab_vars[(d, s, key[1], key[2])].get(key[3])
+
+    _share_rooms(model, index, held, [(d, s) for d in range(len(DAYS)) for s in teaching_slots], assumptions)
+
+    if lab_sessions:
+        timer.start("intervals")
+        _add_session_resources(model, divisions, index, lec_vars, sessions)
+
+    if symmetry_breaking:
+        timer.start("symmetry")
+        _add_symmetry_breaking(model, divisions, lecture_subjects, lab_subjects, fixed_positions,
+                               lambda d, s, div_name: sum((j + 1) * lit for j, lit in lec_vars[(d, s, div_name)].items()),
+                               lambda d, s, div_name, batch: sum((k + 1) * lit for k, lit
+                                                                 in lab_vars[(d, s, div_name, batch)].items()))
+    if objective:
+        timer.start("objective")
+        _add_soft_objective(model, divisions, index, lec_vars, lab_vars)
+    elif stay_close and kept_classes:
+        timer.start("objective")
+        model.Maximize(sum(kept_classes))
+    timer.stop()
+
+    # Each literal stands for one subject id; lab ids follow the lecture ids
+    layout = _GridLayout(divisions, one_hot=True)
+    for (d, s, div_name), cell in lec_vars.items():
+        for j, lit in cell.items():
+            layout.add(lit, div_name, None, d, s, j)
+    for (d, s, div_name, batch), cell in lab_vars.items():
+        for k, lit in cell.items():
+            layout.add(lit, div_name, batch, d, s, len(lecture_subjects) + k)
+    return layout.freeze()
+
+def _share_rooms(model, index, held, cells, assumptions=None):
+    """
+    Rooms of crossing eligible sets (see rooms.crossing_groups): per teaching cell, a
+    BoolVar per (eligible set, room) gives each set as many of its rooms as it has
+    classes held, and each room goes to one set. held(key, d, s) is the literal of a
+    class being held in that cell, or None when it cannot be.
+    """
+    for room_names, by_set in crossing_groups(index.room_classes):
+        for d, s in cells:
+            takers = {}  # room -> the BoolVars giving it to a set
+            for n, (names, keys) in enumerate(by_set.items()):
+                running = [lit for lit in (held(key, d, s) for key in keys) if lit is not None]
+                if not running:
+                    continue
+                picks = [model.NewBoolVar(f"share_{d}_{s}_{n}_{room}") for room in names]
+                _guard(model, model.Add(sum(picks) == sum(running)), assumptions, ("room", *room_names))
+                for room, pick in zip(names, picks):
+                    takers.setdefault(room, []).append(pick)
+            for picks in takers.values():
+                if len(picks) > 1:
+                    model.AddAtMostOne(picks)
+
+def _add_lab_sessions(model, lab_subjects, index, lab_vars):
+    """
+    Place labs as contiguous sessions. Every start slot whose whole session lies inside
+    the lab's mask gets a start literal (a session never crosses lunch or a blocked slot)
+    and an optional fixed-size interval on the week's slot axis (day * SLOTS_PER_DAY +
+    slot). The per-slot literals the other constraints use are filled into lab_vars as
+    "some session covers this slot". Returns {(division, batch, lab index): [interval]}.
+    """
+    sessions = {}
+    for (div_name, batch), labs in index.batch_labs.items():
+        for k in labs:
+            length = lab_session_slots(lab_subjects[k])
+            intervals = sessions.setdefault((div_name, batch, k), [])
+            for d in range(len(DAYS)):
+                starts = {
+                    s: model.NewBoolVar(f"lab_start_{d}_{s}_{div_name}_{batch}_{k}")
+                    for s in range(SLOTS_PER_DAY - length + 1)
+                    if all((d, t) in index.lab_masks[k] for t in range(s, s + length))
+                }
+                for s, start in starts.items():
+                    intervals.append(model.NewOptionalFixedSizeIntervalVar(
+                        d * SLOTS_PER_DAY + s, length, start, f"lab_session_{d}_{s}_{div_name}_{batch}_{k}"
+                    ))
+                for t in range(SLOTS_PER_DAY):
+                    covering = [start for s, start in starts.items() if s <= t < s + length]
+                    if not covering:
+                        continue
+                    if length == 1:
+                        lab_vars[(d, t, div_name, batch)][k] = covering[0]
+                        continue
+                    # A Bool cell literal also keeps sessions of the same lab from overlapping
+                    lit = model.NewBoolVar(f"lab_{d}_{t}_{div_name}_{batch}_{k}")
+                    model.Add(lit == sum(covering))
+                    lab_vars[(d, t, div_name, batch)][k] = lit
+    return sessions
+
+def _add_session_resources(model, divisions, index, lec_vars, sessions):
+    """
+    NoOverlap over lab sessions and lectures (one-slot intervals) per batch and per
+    faculty member, and a cumulative per room capacity group holding labs (NoOverlap
+    for a single room). They restate the per-slot constraints in a form CP-SAT
+    propagates over whole sessions.
+    """
+    lecture_intervals = {}
+
+    def lecture_interval(d, s, div_name, j):
+        key = (d, s, div_name, j)
+        if key not in lecture_intervals:
+            lecture_intervals[key] = model.NewOptionalFixedSizeIntervalVar(
+                d * SLOTS_PER_DAY + s, 1, lec_vars[(d, s, div_name)][j], f"lec_slot_{d}_{s}_{div_name}_{j}"
+            )
+        return lecture_intervals[key]
+
+    def lecture_intervals_of(div_name, j):
+        return [lecture_interval(d, s, div_name, j) for d, s in index.lecture_slots[j]]
+
+    for div in divisions:
+        division_lectures = [interval for j in index.division_lectures[div["name"]]
+                             for interval in lecture_intervals_of(div["name"], j)]
+        for batch in div["batches"]:
+            model.AddNoOverlap(division_lectures + [interval for k in index.batch_labs[(div["name"], batch)]
+                                                    for interval in sessions[(div["name"], batch, k)]])
+
+    for abbr in sorted(set(index.faculty_lectures) | set(index.faculty_labs)):
+        intervals = [interval for j in index.faculty_lectures.get(abbr, []) for div_name in index.lecture_takers[j]
+                     for interval in lecture_intervals_of(div_name, j)]
+        intervals += [interval for k in index.faculty_labs.get(abbr, []) for div_name, batch in index.lab_takers[k]
+                      for interval in sessions[(div_name, batch, k)]]
+        if len(intervals) > 1:
+            model.AddNoOverlap(intervals)
+
+    for room_names, keys in capacity_groups(index.room_classes):
+        if not any(key[0] == "lab" for key in keys):
+            continue
+        intervals = []
+        for key in keys:
+            if key[0] == "lab":
+                intervals.extend(sessions.get(key[1:], []))
+            else:
+                intervals.extend(lecture_intervals_of(key[1], key[2]))
+        if len(room_names) == 1:
+            model.AddNoOverlap(intervals)
+        else:
+            model.AddCumulative(intervals, [1] * len(intervals), len(room_names))
+
+def _idle_slots(model, cells, name):
+    """
+    Free teaching slots between the first and the last busy one of a day, as an IntVar.
+    cells lists the day's teaching slots in order as literal lists, of which
+    at most one is true; a day with nothing in it counts 0.
+    """
+    last_position = len(cells) - 1
+    first = model.NewIntVar(0, last_position, f"first_{name}")
+    last = model.NewIntVar(-1, last_position, f"last_{name}")
+    model.Add(last >= first - 1)
+    busy_total = []
+    for p, lits in enumerate(cells):
+        if not lits:
+            continue
+        busy = sum(lits)
+        model.Add(first <= p + (last_position - p) * (1 - busy))
+        model.Add(last >= (p + 1) * busy - 1)
+        busy_total.extend(lits)
+    # Never negative: the bound lets CP-SAT report a useful objective bound early on
+    idle = model.NewIntVar(0, last_position, f"idle_{name}")
+    model.Add(idle >= last - first + 1 - sum(busy_total))
+    return idle
+
+def _add_soft_objective(model, divisions, index, lec_vars, lab_vars):
+    """
+    Minimize the weighted (OBJECTIVE_WEIGHTS) soft goals of a one-hot model:
+    "spread", every repeat of a lecture on the same day for a division (a lab's slots
+    belong together, so labs are left out); "gaps", free slots inside a batch's day;
+    "faculty_gaps", free slots between a teacher's first and last class of a day. Lunch
+    is not a teaching slot, so a day running across it has no gap for that.
+    """
+    teaching_slots = [s for s in range(SLOTS_PER_DAY) if s not in LUNCH_BREAK_SLOTS]
+    terms = {name: [] for name in OBJECTIVE_WEIGHTS}
+
+    for div in divisions:
+        for d in range(len(DAYS)):
+            for j in index.division_lectures[div["name"]]:
+                lits = [lec_vars[(d, s, div["name"])][j] for s in teaching_slots if j in lec_vars[(d, s, div["name"])]]
+                if len(lits) > 1:
+                    repeats = model.NewIntVar(0, len(lits) - 1, f"repeats_{d}_{div['name']}_{j}")
+                    model.Add(repeats >= sum(lits) - 1)
+                    terms["spread"].append(repeats)
+            for batch in div["batches"]:
+                cells = [list(lec_vars[(d, s, div["name"])].values()) + list(lab_vars[(d, s, div["name"], batch)].values())
+                         for s in teaching_slots]
+                terms["gaps"].append(_idle_slots(model, cells, f"{d}_{div['name']}_{batch}"))
+
+    for abbr in sorted(set(index.faculty_lectures) | set(index.faculty_labs)):
+        cells = {}
+        for key, subj_index, is_lab in _faculty_cells(abbr, index):
+            cell = lab_vars[key] if is_lab else lec_vars[key]
+            if subj_index in cell:
+                cells.setdefault(key[:2], []).append(cell[subj_index])
+        for d in range(len(DAYS)):
+            if any(key[0] == d for key in cells):
+                terms["faculty_gaps"].append(_idle_slots(model, [cells.get((d, s), []) for s in teaching_slots],
+                                                         f"{d}_{abbr}"))
+
+    model.Minimize(sum(OBJECTIVE_WEIGHTS[name] * sum(exprs) for name, exprs in terms.items()))
+
+def _interchangeable_batches(div, lab_subjects, fixed_positions):
+    """
+    Groups (in batch order) of a division's batches that take exactly the same labs and
+    have no lab pinned. Swapping the lab cells of two such batches maps every timetable
+    to another valid one.
+    """
+    lab_codes = {subj["code"] for subj in lab_subjects}
+    pinned = {batch for (div_name, batch, _, _), code in fixed_positions.items()
+              if div_name == div["name"] and code in lab_codes}
+    groups = {}
+    for batch in div["batches"]:
+        if batch not in pinned:
+            groups.setdefault(tuple(batch_takes(subj, batch) for subj in lab_subjects), []).append(batch)
+    return [batches for batches in groups.values() if len(batches) > 1]
+
+def _interchangeable_divisions(divisions, lecture_subjects, lab_subjects, fixed_positions):
+    """
+    Groups (in division order) of divisions without pins that have the same size and take
+    the same lectures, with their batches (matched by position) taking the same labs.
+    """
+    pinned = {div_name for div_name, _, _, _ in fixed_positions}
+    groups = {}
+    for div in divisions:
+        if div["name"] in pinned:
+            continue
+        signature = (
+            div.get("size"),
+            tuple(division_takes(subj, div["name"]) for subj in lecture_subjects),
+            tuple(tuple(division_takes(subj, div["name"]) and batch_takes(subj, batch) for subj in lab_subjects)
+                  for batch in div["batches"]),
+        )
+        groups.setdefault(signature, []).append(div)
+    return [group for group in groups.values() if len(group) > 1]
+
+def _order_key(values):
+    """Position-weighted sum of a cell-value vector: equal vectors, equal keys."""
+    return sum((i + 1) * value for i, value in enumerate(values))
+
+def _add_symmetry_breaking(model, divisions, lecture_subjects, lab_subjects, fixed_positions,
+                           lecture_value, lab_value):
+    """
+    Order interchangeable batches and divisions by a key computed from their own cells,
+    so CP-SAT skips most permutations of one timetable. lecture_value(d, s, division) and
+    lab_value(d, s, division, batch) are expressions holding the subject index + 1 of a
+    cell (0 when free). Any timetable can be permuted into one that satisfies every
+    ordering: sort each division's batches first, then the divisions, whose keys read
+    their lecture cells followed by their batches' lab cells in batch order.
+
+    A full lex-leader chain over the same vectors also removes ties, but its reified
+    prefix constraints slowed the search down by one to two orders of magnitude on the
+    benchmark ladder; one linear inequality per pair costs almost nothing to build.
+    Whether it pays off depends on the input: CP-SAT's own presolve already finds the
+    batch symmetry, and on a single worker the ordering sometimes halves the time to a
+    first solution and sometimes leads the search astray, so profiles leave it off.
+    """
+    slots = [(d, s) for d in range(len(DAYS)) for s in range(SLOTS_PER_DAY) if s not in LUNCH_BREAK_SLOTS]
+
+    def batch_vector(div_name, batch):
+        return [lab_value(d, s, div_name, batch) for d, s in slots]
+
+    def division_vector(div):
+        vector = [lecture_value(d, s, div["name"]) for d, s in slots]
+        for batch in div["batches"]:
+            vector.extend(batch_vector(div["name"], batch))
+        return vector
+
+    for div in divisions:
+        for batches in _interchangeable_batches(div, lab_subjects, fixed_positions):
+            for first, second in zip(batches, batches[1:]):
+                model.Add(_order_key(batch_vector(div["name"], first)) >= _order_key(batch_vector(div["name"], second)))
+    for group in _interchangeable_divisions(divisions, lecture_subjects, lab_subjects, fixed_positions):
+        for first, second in zip(group, group[1:]):
+            model.Add(_order_key(division_vector(first)) >= _order_key(division_vector(second)))
+
+def _stop_when_requested(solver, should_stop, finished):
+    """Poll should_stop() while a solve runs and interrupt the search once it returns True."""
+    while not finished.wait(STOP_POLL_SECONDS):
+        if should_stop():
+            solver.StopSearch()
+            return
+
+class _GridLayout:
+    """
+    Where a model's cell variables sit in the solution grid, so a whole solution is read
+    with one array lookup instead of a Value() call per cell. The grid is an int array
+    indexed (division, batch, day, slot) holding ids into lecture_subjects + lab_subjects,
+    -1 for a free cell; a lecture fills its cell in every batch of its division.
+    one_hot: each variable is a literal standing for one subject id. Otherwise each
+    variable holds a subject index (-1 when free) that id_offset turns into an id.
+    """
+
+    def __init__(self, divisions, one_hot):
+        self.one_hot = one_hot
+        self.division_positions = {div["name"]: i for i, div in enumerate(divisions)}
+        self.batch_positions = {(div["name"], batch): b for div in divisions for b, batch in enumerate(div["batches"])}
+        batch_counts = np.array([len(div["batches"]) for div in divisions], dtype=np.int64)
+        self.shape = (len(divisions), int(batch_counts.max(initial=0)), len(DAYS), SLOTS_PER_DAY)
+        # Padding cells of divisions with fewer batches than the largest one
+        self.padding = np.arange(self.shape[1]) >= batch_counts[:, None]
+        self.rows = []
+
+    def add(self, var, div_name, batch, d, s, subject):
+        """batch is None for a lecture variable; subject is the id (one_hot) or the id offset."""
+        batch_position = -1 if batch is None else self.batch_positions[(div_name, batch)]
+        self.rows.append((var.Index(), self.division_positions[div_name], batch_position, d, s, subject))
+
+    def freeze(self):
+        rows = np.array(self.rows, dtype=np.int64).reshape(-1, 6)
+        self.variables, self.cells, self.subjects = rows[:, 0], rows[:, 1:5], rows[:, 5]
+        del self.rows
+        return self
+
+    def grid(self, values):
+        """The solution grid for an array of every variable's value (see _solution_values)."""
+        values = values[self.variables]
+        if self.one_hot:
+            chosen = values == 1
+            ids = self.subjects[chosen]
+        else:
+            chosen = values >= 0
+            ids = values[chosen] + self.subjects[chosen]
+        cells = self.cells[chosen]
+        grid = np.full(self.shape, -1, dtype=np.int64)
+        labs = cells[:, 1] >= 0
+        grid[cells[labs, 0], cells[labs, 1], cells[labs, 2], cells[labs, 3]] = ids[labs]
+        lectures = ~labs
+        grid[cells[lectures, 0], :, cells[lectures, 2], cells[lectures, 3]] = ids[lectures][:, None]
+        grid[self.padding] = -1
+        return grid
+
+def _run_solver(solver, model, callback, should_stop):
+    """Solve, interrupting the search once should_stop() returns True. Returns the status."""
+    if not should_stop:
+        return solver.Solve(model, callback)
+    finished = threading.Event()
+    watcher = threading.Thread(target=_stop_when_requested, args=(solver, should_stop, finished), daemon=True)
+    watcher.start()
+    try:
+        return solver.Solve(model, callback)
+    finally:
+        finished.set()
+
+def _objective_value(model, values):
+    """The model's objective value for an array of every variable's value."""
+    objective = model.Proto().objective
+    total = np.dot(np.asarray(objective.coeffs, dtype=np.int64), values[np.asarray(objective.vars, dtype=np.int64)])
+    return (float(total) + objective.offset) * (objective.scaling_factor or 1.0)
+
+def _solution_values(source):
+    """Every variable's value in a solver's (or solution callback's) current solution, by variable index."""
+    if isinstance(source, cp_model.CpSolverSolutionCallback):
+        return np.asarray(source.Response().solution, dtype=np.int64)
+    return np.asarray(source.ResponseProto().solution, dtype=np.int64)
+
+def _build_output(grid, divisions, subjects):
+    """
+    Turn a solution grid (see _GridLayout) into the nested division/batch/day grid the
+    frontend renders. subjects is lecture_subjects + lab_subjects, in grid id order.
+    """
+    labels = []
+    for subj in subjects:
+        faculty_list = subj.get("faculty", [])
+        labels.append(f"{subj['code']}\n{faculty_list[0] if faculty_list else 'TBA'}")
+    labels.append("-")  # Index -1: a free cell
+    lunch = [s for s in LUNCH_BREAK_SLOTS if s < SLOTS_PER_DAY]
+
+    output = {}
+    for i, div in enumerate(divisions):
+        batches = {}
+        for b, batch in enumerate(div["batches"]):
+            batch_schedule = {}
+            for d, day_name in enumerate(DAY_NAMES):
+                day_slots = [labels[x] for x in grid[i, b, d].tolist()]
+                for s in lunch:
+                    day_slots[s] = "LUNCH BREAK"
+                batch_schedule[day_name] = day_slots
+            batches[batch] = batch_schedule
+        output[div["name"]] = {"batches": batches}
+
+    logger.debug("=== SOLVER DEBUG: Output built for %d divisions ===", len(output))
+
+    # The per-day check is one array reduction; only its log lines walk the grid
+    daily_counts = (grid >= 0).sum(axis=3)
+    for i, b, d in zip(*np.nonzero(daily_counts != LECTURES_PER_DAY)):
+        if b < len(divisions[i]["batches"]):
+            logger.warning("Division %s, Batch %s, %s: expected %d classes but got %d",
+                           divisions[i]["name"], divisions[i]["batches"][b], DAY_NAMES[d],
+                           LECTURES_PER_DAY, daily_counts[i, b, d])
+
+    return output
+
+def infeasibility_core(schema, fixed_positions=None, time_limit=10.0):
+    """
+    Solve the one-hot model with every pin and every daily, frequency, faculty and room
+    constraint group behind an assumption literal. Returns the keys of the groups in a
+    subset CP-SAT found sufficient for infeasibility, [] when the model is feasible, or
+    None when the solver could not decide within time_limit.
+    """
+    lecture_subjects = [s for s in schema["subjects"] if s['type'] == 'Theory']
+    lab_subjects = [s for s in schema["subjects"] if s['type'] == 'Lab']
+    model = cp_model.CpModel()
+    assumptions = {}
+    _build_onehot_model(model, schema["divisions"], lecture_subjects, lab_subjects, schema["faculty"],
+                        schema["rooms"], parse_fixed_positions(fixed_positions), assumptions=assumptions,
+                        blocked_slots=parse_blocked_slots(schema.get("blocked_slots")))
+    model.AddAssumptions(list(assumptions.values()))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    # Cores come from a single search; the LP relaxation proves the counting conflicts quickly
+    solver.parameters.num_workers = 1
+    solver.parameters.linearization_level = 2
+    status = solver.Solve(model)
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return []
+    if status != cp_model.INFEASIBLE:
+        return None
+    by_index = {lit.Index(): key for key, lit in assumptions.items()}
+    return [by_index[index] for index in solver.SufficientAssumptionsForInfeasibility() if index in by_index]
+
+class _SolutionCollector(cp_model.CpSolverSolutionCallback):
+    """
+    Solution callback for enumerating alternatives: builds each solution's grid, keeps
+    it if it differs from every kept one in at least min_distance of the cells, passes
+    kept ones to on_solution and stops the search once enough are kept.
+    With improving set the search is optimizing instead: CP-SAT only reports solutions
+    better than the last one, so each becomes the one kept (a new version) and its
+    objective value and bound are passed along.
+    """
+
+    def __init__(self, build, limit, min_distance, on_solution, improving=False):
+        super().__init__()
+        self.build = build
+        self.limit = limit
+        self.min_distance = min_distance
+        self.on_solution = on_solution
+        self.improving = improving
+        self.kept = []
+        self.objective = None
+        self.offset = 0.0
+        self.found = 0
+        self.seen = 0
+
+    def add_first(self, timetable, objective, seconds):
+        """Report a first version found outside this search (improving mode)."""
+        self.seen += 1
+        self.kept = [timetable]
+        self.objective = objective
+        self.found = 1
+        self.offset = seconds  # Seconds reported by this search start after the first version
+        if self.on_solution:
+            self.on_solution(timetable, {"index": 0, "objective": objective, "bound": None,
+                                         "solutions_seen": self.seen, "seconds": round(seconds, 3)})
+
+    def on_solution_callback(self):
+        self.seen += 1
+        if self.improving and self.kept and self.ObjectiveValue() >= self.objective:
+            return  # The hinted first version found again
+        timetable = self.build(self)
+        info = {"index": self.found}
+        if self.improving:
+            self.kept = [timetable]
+            self.objective = self.ObjectiveValue()
+            info.update(objective=self.objective, bound=self.BestObjectiveBound())
+        else:
+            distance = None
+            if self.kept:
+                distance = min(solution_drift(kept, timetable)["changed_fraction"] for kept in self.kept)
+                if distance < self.min_distance:
+                    return
+            self.kept.append(timetable)
+            info["distance"] = distance
+        self.found += 1
+        if self.on_solution:
+            self.on_solution(timetable, {**info, "solutions_seen": self.seen,
+                                         "seconds": round(self.offset + self.WallTime(), 3)})
+        if self.found >= self.limit:
+            self.StopSearch()
+
+def solve_with_meta(schema, fixed_positions=None, encoding="onehot", on_event=None, should_stop=None,
+                    previous=None, keep_divisions=None, profile=None, solutions=1, min_distance=0.0,
+                    on_solution=None, anytime=False, free_days=None):
+    """
+    Solve timetable using Google OR-Tools CP-SAT.
+    Returns (timetable, meta): the frontend-ready grid (None when no solution was found)
+    and a dict describing the run (status, model size, timings, warm-start drift).
+
+    encoding selects the model formulation: "onehot" (default), the original "intvar",
+    or "interval", which is onehot with each lab held as one contiguous session of
+    lab_session_slots(subj) slots (a 100 minute lab fills two consecutive slots).
+    on_event(phase, info) is called as the solve moves through its phases (and with
+    phase "step" as each timed phase of meta["phases"] ends), and a should_stop() that
+    returns True abandons the solve.
+    previous is an earlier timetable in the output format. Its cells are passed to
+    CP-SAT as hints, and divisions in keep_divisions are fixed to their previous cells
+    ("auto" keeps every division without a fixed position). If the fixed divisions make
+    the model infeasible, the solve is retried with hints only. free_days, a set of
+    (division, day index) pairs, instead fixes every other day of every previous division
+    and is never relaxed: an infeasible result is returned as is (see Solver.repair).
+    The onehot and interval encodings then also minimize how many freed classes move.
+    Faculty availability (day indices) and the schema's optional "blocked_slots" decide
+    which slots each subject can use at all; see slot_masks.
+    profile is a settings dict from Solver.profiles.resolve_profile (the default
+    profile when None) and sets the CP-SAT time limit, workers, seed and logging.
+    solutions > 1 (or an on_solution callback) enumerates solutions in the same search,
+    keeping up to that many whose cells differ from all kept ones by at least
+    min_distance (a fraction). Each kept timetable is passed to on_solution(timetable,
+    info) as soon as it is found; the first one is returned.
+    anytime minimizes the soft goals of _add_soft_objective (onehot and interval
+    encodings only) for the profile's whole time limit. Every improved timetable is then
+    passed to on_solution, with the objective value and bound in info, and the best one
+    is returned.
+    """
+    def emit(phase, **info):
+        if on_event:
+            on_event(phase, info)
+
+    profile = profile or resolve_profile()
+    meta = {"encoding": encoding, "status": "UNKNOWN", "profile": profile}
+    try:
+        logger.info("=== SOLVER DEBUG: Starting solver ===")
+        emit("building")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
+        if anytime and encoding == "intvar":
+            raise ValueError("Anytime solving needs the onehot or interval encoding")
+        if anytime and solutions > 1:
+            raise ValueError("Anytime solving returns one timetable, not alternatives")
+        divisions = schema["divisions"]
+        subjects = schema["subjects"]
+        faculty = schema["faculty"]
+        rooms = schema["rooms"]
+        fixed_positions = parse_fixed_positions(fixed_positions)
+        blocked_slots = parse_blocked_slots(schema.get("blocked_slots"))
+        logger.info("Solver input: %d divisions, %d subjects, %d faculty, %d rooms",
+                    len(divisions), len(subjects), len(faculty), len(rooms))
+
+        # Separate subjects into lectures and labs
+        lecture_subjects = [s for s in subjects if s['type'] == 'Theory']
+        lab_subjects = [s for s in subjects if s['type'] == 'Lab']
+
+        logger.info("Subject breakdown: %d lectures, %d labs", len(lecture_subjects), len(lab_subjects))
+
+        previous_cells = None
+        frozen_divisions = set()
+        repair_days = set()  # (division, day) pairs fixed for free_days
+        if previous:
+            previous_cells = _read_previous_solution(previous, lecture_subjects, lab_subjects)
+            if keep_divisions == "auto":
+                pinned = {div_name for div_name, _, _, _ in fixed_positions}
+                keep_divisions = [div["name"] for div in divisions if div["name"] not in pinned]
+            frozen_divisions = set(keep_divisions or []) & set(previous)
+            meta["warm_start"] = {"hinted_cells": sum(map(len, previous_cells)),
+                                  "frozen_divisions": sorted(frozen_divisions)}
+            if free_days is not None:
+                repair_days = {(div["name"], d) for div in divisions if div["name"] in previous
+                               for d in range(len(DAYS))} - set(free_days)
+                meta["warm_start"]["frozen_days"] = len(repair_days)
+        frozen_days = repair_days | {(div_name, d) for div_name in frozen_divisions for d in range(len(DAYS))}
+
+        build_model = {
+            "onehot": _build_onehot_model,
+            "intvar": _build_intvar_model,
+            "interval": functools.partial(_build_onehot_model, lab_sessions=True),
+        }[encoding]
+        if anytime:
+            build_model = functools.partial(build_model, objective=True)
+        elif free_days is not None and encoding != "intvar":
+            # A repair should move as few of the freed classes as it can
+            build_model = functools.partial(build_model, stay_close=True)
+        timer = PhaseTimer(on_stop=lambda record: emit("step", name=record["phase"], seconds=record["seconds"],
+                                                       variables=record["variables"],
+                                                       constraints=record["constraints"]))
+        meta["phases"] = timer.phases
+
+        while True:
+            build_started = time.time()
+            model = cp_model.CpModel()
+            timer.model = model
+            layout = build_model(
+                model, divisions, lecture_subjects, lab_subjects, faculty, rooms, fixed_positions,
+                previous_cells, frozen_days, timer, blocked_slots=blocked_slots,
+                # A warm start should stay close to the previous timetable, not its lex leader
+                symmetry_breaking=profile["symmetry_breaking"] and not previous_cells,
+            )
+
+            proto = model.Proto()
+            meta.update(variables=len(proto.variables), constraints=len(proto.constraints),
+                        build_seconds=round(time.time() - build_started, 3))
+            logger.info("=== SOLVER DEBUG: All constraints added (%s: %d variables, %d constraints), starting solve ===",
+                        encoding, len(proto.variables), len(proto.constraints))
+            if should_stop and should_stop():
+                logger.info("=== SOLVER DEBUG: Stop requested before solve ===")
+                meta["status"] = "STOPPED"
+                return None, meta
+            emit("solving", variables=len(proto.variables), constraints=len(proto.constraints))
+
+            unassigned_rooms = {}  # id of a timetable built for the collector -> its classes without a room
+
+            def build_timetable(values):
+                output, unassigned = assign_rooms(
+                    _build_output(layout.grid(values), divisions, lecture_subjects + lab_subjects), schema)
+                unassigned_rooms[id(output)] = unassigned
+                return output
+
+            # Solve
+            solver = cp_model.CpSolver()
+            apply_profile(solver, profile)
+            collector = None
+            if anytime:
+                # The whole time limit is the budget for improving the first solution
+                solver.parameters.stop_after_first_solution = False
+            elif solutions > 1 or on_solution:
+                # Enumeration only runs in a single search worker
+                solver.parameters.enumerate_all_solutions = True
+                solver.parameters.num_workers = 1
+                solver.parameters.stop_after_first_solution = False
+            if solutions > 1 or on_solution:
+                collector = _SolutionCollector(
+                    lambda callback: build_timetable(_solution_values(callback)),
+                    math.inf if anytime else solutions, min_distance, on_solution, improving=anytime,
+                )
+            if encoding == "interval" and solver.parameters.num_workers == 1:
+                # A lone worker spends its time in the LP relaxation of the sessions; a
+                # multi-worker portfolio already runs LP-free workers next to it
+                solver.parameters.linearization_level = 0
+
+            status = first_solver = None
+            if anytime:
+                # With the objective CP-SAT takes many times longer to reach any timetable,
+                # so a plain pass on a copy of the model finds the first version and the
+                # optimizing search starts from it as a complete hint
+                timer.start("first_solution")
+                plain = model.Clone()
+                plain.ClearObjective()
+                first_solver = cp_model.CpSolver()
+                apply_profile(first_solver, {**profile, "first_solution": True})
+                if encoding == "interval" and first_solver.parameters.num_workers == 1:
+                    first_solver.parameters.linearization_level = 0
+                first_status = _run_solver(first_solver, plain, None, should_stop)
+                timer.stop()
+                remaining = profile["time_limit"] - (first_solver.ResponseProto().deterministic_time
+                                                     if profile["deterministic"] else first_solver.WallTime())
+                if first_status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                    values = _solution_values(first_solver)
+                    if collector:
+                        collector.add_first(build_timetable(values), _objective_value(model, values),
+                                            first_solver.WallTime())
+                if first_status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) or remaining <= 0:
+                    solver, status = first_solver, first_status
+                else:
+                    model.ClearHints()
+                    model.Proto().solution_hint.vars.extend(range(len(values)))
+                    model.Proto().solution_hint.values.extend(values.tolist())
+                    if profile["deterministic"]:
+                        solver.parameters.max_deterministic_time = (
+                            profile["time_limit"] - first_solver.ResponseProto().deterministic_time)
+                    else:
+                        solver.parameters.max_time_in_seconds = remaining
+
+            if status is None:
+                timer.start("solve")
+                status = _run_solver(solver, model, collector, should_stop)
+                timer.stop()
+                if first_solver and status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                    solver, status = first_solver, first_status  # Ran out of time before the hint was checked
+            if should_stop and should_stop():
+                logger.info("=== SOLVER DEBUG: Solve stopped on request ===")
+                meta["status"] = "STOPPED"
+                return None, meta
+
+            solve_seconds = solver.WallTime()
+            if first_solver and solver is not first_solver:
+                solve_seconds += first_solver.WallTime()
+            meta.update(status=solver.StatusName(status), solve_seconds=round(solve_seconds, 3),
+                        cost=solve_cost(solver))
+            if anytime and status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                if solver is first_solver:
+                    meta["objective"] = {"value": _objective_value(model, _solution_values(solver)), "bound": None}
+                else:
+                    meta["objective"] = {"value": solver.ObjectiveValue(), "bound": solver.BestObjectiveBound()}
+            logger.info("Solver status: %s", solver.StatusName(status))
+            logger.debug("Solver statistics: %s", solver.ResponseStats())
+
+            if status == cp_model.INFEASIBLE and frozen_divisions:
+                logger.warning("Keeping divisions %s fixed is infeasible, retrying with hints only",
+                               sorted(frozen_divisions))
+                meta["warm_start"]["freeze_relaxed"] = True
+                frozen_divisions = set()
+                frozen_days = repair_days
+                continue
+            break
+
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            logger.info("=== SOLVER DEBUG: Solution found, building output ===")
+            emit("building_output", status=solver.StatusName(status))
+
+            if collector:
+                # Kept timetables got their rooms as they were built
+                meta.update(solutions=collector.found, solutions_seen=collector.seen)
+                output = collector.kept[0]
+                unassigned = unassigned_rooms[id(output)]
+            else:
+                timer.start("output")
+                output = _build_output(layout.grid(_solution_values(solver)), divisions,
+                                       lecture_subjects + lab_subjects)
+                timer.start("room_assignment")
+                output, unassigned = assign_rooms(output, schema)
+                timer.stop()
+            if unassigned:
+                logger.warning("%d classes got no room", len(unassigned))
+                meta["unassigned_rooms"] = unassigned
+            taken = [item for item in unassigned if item["reason"] == "rooms_taken"]
+            if taken:
+                # The solution breaks a room limit the model should have enforced, so it is no timetable
+                logger.error("=== SOLVER DEBUG: %d classes lost the room matching ===", len(taken))
+                meta.update(status="ERROR", error=f"{len(taken)} scheduled classes could not all be given a room")
+                return None, meta
+            if previous:
+                meta["drift"] = solution_drift(previous, output)
+            return output, meta
+
+        else:
+            logger.warning("=== SOLVER DEBUG: No solution found, status: %s ===", solver.StatusName(status))
+            if status == cp_model.INFEASIBLE:
+                logger.warning("Problem is INFEASIBLE - constraints are too restrictive")
+            elif status == cp_model.UNKNOWN:
+                logger.warning("Solver timed out or ran into issues")
+            return None, meta
+
+    except Exception as e:
+        logger.exception("=== SOLVER EXCEPTION: %s ===", e)
+        meta.update(status="ERROR", error=str(e))
+        return None, meta
+
+def solve_timetable(schema, fixed_positions=None, encoding="onehot", **options):
+    """
+    Solve timetable using Google OR-Tools CP-SAT.
+    Returns frontend-ready timetable grid with proper display format using day names and time slots.
+    Enforces exactly 4 lectures per day per batch. See solve_with_meta for the options.
+    """
+    return solve_with_meta(schema, fixed_positions, encoding, **options)[0]
+
+if __name__ == "__main__":
+    # For testing this file directly
+    schema = load_schema("schema.json")
+    fixed_positions = {}
+    timetable = solve_timetable(schema, fixed_positions=fixed_positions)
+    if timetable:
+        print(json.dumps(timetable, indent=2))
+    else:
+        print("Failed to generate timetable")
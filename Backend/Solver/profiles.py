@@ -0,0 +1,124 @@
+"""
+Named CP-SAT tuning profiles.
+
+A solve request names a profile and may override single settings of it. The result
+is clamped to the server limits in config, so a client can ask for less time or
+fewer search workers than the server allows, never more.
+"""
+from config import Config
+
+DEFAULT_PROFILE = "balanced"
+
+SOLVER_PROFILES = {
+    # UI previews: the first feasible timetable within a few seconds, no search log
+    "fast-preview": {"workers": 4, "time_limit": 5.0, "first_solution": True, "deterministic": False,
+                     "seed": 0, "log": False, "symmetry_breaking": False},
+    # What /generate has always done: up to 3 minutes on every core
+    "balanced": {"workers": 0, "time_limit": 180.0, "first_solution": False, "deterministic": False,
+                 "seed": 0, "log": True, "symmetry_breaking": False},
+    # Nightly final runs: a long budget (in deterministic time) and the same answer for
+    # the same input on the same server
+    "thorough": {"workers": 0, "time_limit": 600.0, "first_solution": False, "deterministic": True,
+                 "seed": 0, "log": True, "symmetry_breaking": False},
+}
+
+# Settings a request may override, with the type each value is coerced to
+_OVERRIDABLE = {
+    "workers": int,
+    "time_limit": float,
+    "first_solution": bool,
+    "deterministic": bool,
+    "seed": int,
+    "log": bool,
+    # Ordering constraints between interchangeable batches and divisions (off by default,
+    # see model._add_symmetry_breaking)
+    "symmetry_breaking": bool,
+}
+
+
+def slot_cores():
+    """Cores the scheduler gives a solve at most: its share of the total per solve slot."""
+    return max(1, Config.SOLVER_TOTAL_CORES // Config.SOLVER_MAX_WORKERS)
+
+
+def resolve_profile(name=None, overrides=None):
+    """
+    Return the settings dict for a profile name (default "balanced") with overrides
+    applied and the server caps enforced. Raises ValueError for an unknown profile
+    or setting. workers=0 means as many as the server allows; a deterministic profile
+    may have no more than one scheduler slot's share of the cores (see slot_cores).
+    """
+    name = name or DEFAULT_PROFILE
+    if name not in SOLVER_PROFILES:
+        raise ValueError(f"Unknown solver profile '{name}', expected one of {sorted(SOLVER_PROFILES)}")
+    if overrides is not None and not isinstance(overrides, dict):
+        raise ValueError("solver_options must be an object")
+    settings = dict(SOLVER_PROFILES[name])
+    for key, value in (overrides or {}).items():
+        if key not in _OVERRIDABLE:
+            raise ValueError(f"Unknown solver option '{key}', expected one of {sorted(_OVERRIDABLE)}")
+        try:
+            settings[key] = _OVERRIDABLE[key](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for solver option '{key}': {value!r}")
+
+    max_workers = Config.SOLVER_MAX_SEARCH_WORKERS
+    if settings["deterministic"]:
+        # Its answer depends on the worker count, so the count is fixed here and always granted
+        max_workers = min(max_workers, slot_cores())
+        if settings["workers"] > max_workers:
+            raise ValueError(f"A deterministic profile may use at most {max_workers} workers on this server")
+    if settings["workers"] <= 0 or settings["workers"] > max_workers:
+        settings["workers"] = max_workers
+    if settings["time_limit"] <= 0 or settings["time_limit"] > Config.SOLVER_MAX_TIME_SECONDS:
+        settings["time_limit"] = float(Config.SOLVER_MAX_TIME_SECONDS)
+    settings["name"] = name
+    return settings
+
+
+def apply_profile(solver, settings):
+    """Copy resolved profile settings onto a CpSolver's parameters."""
+    params = solver.parameters
+    params.num_workers = settings["workers"]
+    params.stop_after_first_solution = settings["first_solution"]
+    params.random_seed = settings["seed"]
+    params.log_search_progress = settings["log"]
+    if settings["deterministic"]:
+        # Interleaved search stopped on deterministic time (work done, not seconds elapsed)
+        # gives the same result for the same input and worker count. The wall clock only
+        # keeps the server's hard cap, which a run that would differ never reaches first
+        params.interleave_search = True
+        params.max_deterministic_time = settings["time_limit"]
+        params.max_time_in_seconds = max(settings["time_limit"], Config.SOLVER_MAX_TIME_SECONDS)
+    else:
+        params.max_time_in_seconds = settings["time_limit"]
+
+
+def profile_key(settings):
+    """
+    The resolved settings a solve's answer depends on, for cache keys: all but the
+    workers, which the scheduler decides per solve, and the log, which changes nothing.
+    """
+    return {key: value for key, value in settings.items() if key not in ("workers", "log")}
+
+
+def fit_to_cores(settings, cores):
+    """
+    (settings, decomposition pool size) for a solve the scheduler gave cores search
+    workers. A deterministic profile keeps its worker count, which its answer depends
+    on and which the scheduler grants in full, and a pool sized from it.
+    """
+    if settings["deterministic"]:
+        return settings, min(settings["workers"], Config.SOLVER_DECOMPOSE_WORKERS)
+    return {**settings, "workers": cores}, min(cores, Config.SOLVER_DECOMPOSE_WORKERS)
+
+
+def solve_cost(solver):
+    """What a finished solve cost, JSON-ready."""
+    return {
+        "wall_seconds": round(solver.WallTime(), 3),
+        "user_seconds": round(solver.UserTime(), 3),
+        "deterministic_time": round(solver.ResponseProto().deterministic_time, 3),
+        "conflicts": solver.NumConflicts(),
+        "branches": solver.NumBranches(),
+    }
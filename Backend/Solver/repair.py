@@ -0,0 +1,148 @@
+"""
+Local repair of an existing timetable.
+
+A change (a teacher away on a day, a room taken out, a cell pinned) usually touches a
+handful of days. repair_timetable applies the change to the schema, frees only the
+(division, day) pairs it affects and fixes every other cell to the existing timetable,
+so CP-SAT presolve reduces the model to the freed neighbourhood. When that proves
+infeasible the neighbourhood is widened step by step, up to the whole timetable:
+
+    days      the affected (division, day) pairs
+    week      every day of the affected divisions
+    related   every day of the divisions sharing a subject or teacher with them
+    all       every cell, the previous timetable only hints the search
+
+Changes are JSON objects:
+
+    {"type": "faculty_unavailable", "faculty": "ABC", "day": "Monday"}
+    {"type": "room_removed", "room": "R101"}
+    {"type": "pin", "division": "A", "batch": "A1", "day": 0, "slot": 2, "subject": "CS101"}
+"""
+import copy
+import logging
+import time
+
+from Solver.feasibility import analyze_schema, has_errors
+from Solver.model import (
+    DAY_NAMES, DAYS, LUNCH_BREAK_SLOTS, day_index, division_takes, faculty_days, parse_fixed_positions,
+    solve_with_meta,
+)
+from Solver.profiles import resolve_profile
+
+logger = logging.getLogger(__name__)
+
+CHANGE_TYPES = ("faculty_unavailable", "room_removed", "pin")
+
+
+def _classes(timetable):
+    """(division, day index, code, faculty, room) for every class in a nested timetable."""
+    for div_name, div_data in timetable.items():
+        for schedule in div_data.get("batches", {}).values():
+            for d, day_name in enumerate(DAY_NAMES):
+                for s, cell in enumerate(schedule.get(day_name, [])):
+                    if s in LUNCH_BREAK_SLOTS or cell in ("-", "LUNCH BREAK"):
+                        continue
+                    parts = cell.split("\n") + ["", ""]
+                    yield div_name, d, parts[0], parts[1], parts[2]
+
+
+def apply_change(schema, fixed_positions, change, timetable):
+    """
+    Return (schema, fixed_positions, free_days) after a change: copies of the schema and
+    pins with the change applied, and the (division, day) pairs of timetable it
+    affects. Raises ValueError for a malformed or unknown change.
+    """
+    if not isinstance(change, dict) or change.get("type") not in CHANGE_TYPES:
+        raise ValueError(f"change needs a type, one of {list(CHANGE_TYPES)}")
+    schema = copy.deepcopy(schema)
+    fixed_positions = dict(parse_fixed_positions(fixed_positions))
+
+    if change["type"] == "faculty_unavailable":
+        abbr = change.get("faculty")
+        fac = next((fac for fac in schema["faculty"] if fac["abbr"] == abbr), None)
+        if fac is None:
+            raise ValueError(f"Unknown faculty '{abbr}'")
+        day = day_index(change.get("day"), "change")
+        days = faculty_days([fac]).get(abbr, set(range(len(DAYS))))
+        fac["availability"] = sorted(days - {day})
+        # A subject is only taught on days all of its faculty are in, see slot_masks
+        codes = {subj["code"] for subj in schema["subjects"] if abbr in subj.get("faculty", [])}
+        free_days = {(div_name, d) for div_name, d, code, _, _ in _classes(timetable) if d == day and code in codes}
+
+    elif change["type"] == "room_removed":
+        name = change.get("room")
+        if not any(room["name"] == name for room in schema["rooms"]):
+            raise ValueError(f"Unknown room '{name}'")
+        schema["rooms"] = [room for room in schema["rooms"] if room["name"] != name]
+        free_days = {(div_name, d) for div_name, d, _, _, room in _classes(timetable) if room == name}
+
+    else:
+        pin = parse_fixed_positions([change])
+        fixed_positions.update(pin)
+        free_days = {(div_name, d) for div_name, _, d, _ in pin}
+
+    return schema, fixed_positions, free_days
+
+
+def _related_divisions(schema, names):
+    """names plus every division taking a subject with them or taught by one of their teachers."""
+    subjects = [subj for subj in schema["subjects"] if any(division_takes(subj, name) for name in names)]
+    teachers = {abbr for subj in subjects for abbr in subj.get("faculty", [])}
+    related = set(names)
+    for subj in schema["subjects"]:
+        if subj in subjects or teachers & set(subj.get("faculty", [])):
+            related |= {div["name"] for div in schema["divisions"] if division_takes(subj, div["name"])}
+    return related
+
+
+def _neighbourhoods(schema, free_days):
+    """The widening (name, free (division, day) pairs) steps, smallest first, without repeats."""
+    def all_days(names):
+        return {(name, d) for name in names for d in range(len(DAYS))}
+
+    affected = {div_name for div_name, _ in free_days}
+    steps = [
+        ("days", set(free_days)),
+        ("week", all_days(affected)),
+        ("related", all_days(_related_divisions(schema, affected))),
+        ("all", all_days(div["name"] for div in schema["divisions"])),
+    ]
+    seen = []
+    for name, days in steps:
+        if days not in seen:
+            seen.append(days)
+            yield name, days
+
+
+def repair_timetable(schema, timetable, change, fixed_positions=None, encoding="onehot", profile=None):
+    """
+    Apply a change and re-solve only the part of timetable (nested format) it affects.
+    Returns (timetable, meta, schema, fixed_positions): the repaired timetable (None if
+    even a full solve failed), the solve metadata with a "repair" entry listing every
+    attempt, and the changed schema and pins. Raises ValueError for a malformed change.
+    """
+    profile = profile or resolve_profile()
+    schema, fixed_positions, free_days = apply_change(schema, fixed_positions, change, timetable)
+    repair = {"change": change, "attempts": []}
+
+    violations = analyze_schema(schema, fixed_positions)
+    if has_errors(violations):
+        logger.warning("=== SOLVER DEBUG: Change makes the schema infeasible: %d violations ===", len(violations))
+        return None, {"encoding": encoding, "status": "INFEASIBLE", "profile": profile,
+                      "violations": violations, "repair": repair}, schema, fixed_positions
+
+    for name, days in _neighbourhoods(schema, free_days):
+        started = time.time()
+        repaired, meta = solve_with_meta(schema, fixed_positions, encoding, previous=timetable,
+                                         free_days=days, profile=profile)
+        repair["attempts"].append({"neighbourhood": name, "free_days": len(days), "status": meta["status"],
+                                   "seconds": round(time.time() - started, 3)})
+        logger.info("=== SOLVER DEBUG: Repair over %s (%d free days): %s ===", name, len(days), meta["status"])
+        if meta["status"] != "INFEASIBLE":
+            break
+
+    repair["neighbourhood"] = name
+    meta["repair"] = repair
+    if violations:
+        meta["violations"] = violations
+    return repaired, meta, schema, fixed_positions
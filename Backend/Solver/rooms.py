@@ -0,0 +1,192 @@
+"""
+Room eligibility, aggregate room capacity and post-solve room assignment.
+
+The CP-SAT model no longer picks rooms. For every slot it only limits how many
+classes may run whose eligible rooms all lie within the same set of rooms (one
+constraint per distinct eligible set and per set of rooms they connect, limit =
+rooms in the set). Eligible sets are a subject's required room, or the rooms of its
+type large enough for the class, so they nest and these limits are exactly Hall's
+condition: every solved slot has a complete matching. Rooms open to only some
+departments (see Solver.batch) give crossing sets, for which limiting every union
+would take exponentially many constraints; there the model instead shares the
+connected rooms out between the eligible sets per slot (see crossing_groups), which
+is polynomial and exact. assign_rooms then finds the matching and writes a room into
+each cell.
+"""
+import math
+
+
+def room_hosts(room, subj):
+    """
+    A subject with a required room uses only that room, otherwise any room of its room_type.
+    A room listing "departments" (see Solver.batch) only hosts those departments' subjects.
+    """
+    if room.get("departments") is not None and subj.get("department") not in room["departments"]:
+        return False
+    if subj.get("required_room"):
+        return subj["required_room"] == room["name"]
+    return subj.get("room_type") == room["type"]
+
+
+def class_size(div, lab=False):
+    """Students in a division (its optional "size"), or in one of its batches for a lab."""
+    size = div.get("size") or 0
+    if lab and div.get("batches"):
+        return math.ceil(size / len(div["batches"]))
+    return size
+
+
+def eligible_rooms(subj, rooms, size=0):
+    """Names of the rooms that can hold a class of subj with size students, smallest first."""
+    fitting = [room for room in rooms if room_hosts(room, subj)
+               and (subj.get("required_room") or room.get("capacity", 0) >= size)]
+    return tuple(room["name"] for room in sorted(fitting, key=lambda room: (room.get("capacity", 0), room["name"])))
+
+
+def _connected_rooms(eligible_sets):
+    """The eligible sets grouped by the rooms they connect through overlapping: {rooms: [sets]}."""
+    parent = {}
+
+    def find(name):
+        while parent.setdefault(name, name) != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for names in eligible_sets:
+        first = find(next(iter(names)))
+        for name in names:
+            parent[find(name)] = first
+    connected = {}
+    for name in parent:
+        connected.setdefault(find(name), set()).add(name)
+    components = {frozenset(names): [] for names in connected.values()}
+    for names in eligible_sets:
+        components[frozenset(connected[find(next(iter(names)))])].append(names)
+    return components
+
+
+def capacity_groups(classes):
+    """
+    classes maps a class key to its eligible room names. Returns [(room_names, keys)]:
+    for each distinct eligible set, and each set of rooms eligible sets connect by
+    overlapping, the classes whose eligible rooms all lie in it. At most
+    len(room_names) of those keys may be scheduled in any one slot.
+    Classes with no eligible room are left out; they are not room-constrained.
+    """
+    eligible_sets = {frozenset(names) for names in classes.values() if names}
+    eligible_sets |= set(_connected_rooms(eligible_sets))
+    groups = []
+    for room_set in sorted(eligible_sets, key=lambda names: (len(names), sorted(names))):
+        keys = [key for key, names in classes.items() if names and room_set.issuperset(names)]
+        groups.append((sorted(room_set), keys))
+    return groups
+
+
+def crossing_groups(classes):
+    """
+    The connected room sets whose eligible sets cross (overlap without one holding the
+    other), for which capacity_groups is short of Hall's condition. Returns
+    [(room_names, {eligible set: keys})]; per slot the model gives each eligible set as
+    many of its rooms as it has classes running, each room to one set.
+    """
+    eligible_sets = {frozenset(names) for names in classes.values() if names}
+    groups = []
+    for room_set, sets in sorted(_connected_rooms(eligible_sets).items(), key=lambda item: sorted(item[0])):
+        if all(not a & b or a <= b or b <= a for i, a in enumerate(sets) for b in sets[i + 1:]):
+            continue
+        by_set = {names: [] for names in sets}
+        for key, names in classes.items():
+            if names and frozenset(names) in by_set:
+                by_set[frozenset(names)].append(key)
+        groups.append((sorted(room_set), by_set))
+    return groups
+
+
+def _match(candidates):
+    """
+    Maximum bipartite matching (augmenting paths) of class keys to rooms.
+    candidates maps each key to its rooms in order of preference. Returns (room_of,
+    short): {key: room}, and for each key left without a room the rooms its search
+    reached, fewer than the classes that can only use them (a set Hall's condition fails for).
+    """
+    room_of = {}
+    holder = {}
+    short = {}
+
+    def augment(key, visited):
+        for room in candidates[key]:
+            if room in visited:
+                continue
+            visited.add(room)
+            if room not in holder or augment(holder[room], visited):
+                holder[room] = key
+                room_of[key] = room
+                return True
+        return False
+
+    # Most constrained classes first keeps the augmenting paths short
+    for key in sorted(candidates, key=lambda key: len(candidates[key])):
+        visited = set()
+        if not augment(key, visited):
+            short[key] = visited
+    return room_of, short
+
+
+def assign_rooms(timetable, schema):
+    """
+    Give every scheduled class in a timetable (output format) a concrete room, appended
+    to its cell as a third line ("CODE\\nFACULTY\\nROOM"). A lecture keeps the same room in
+    all of its division's batch grids. Returns (timetable, unassigned), where unassigned
+    lists classes that had no eligible room (reason "no_room") or lost the matching
+    ("rooms_taken", with the "rooms" the other classes in the slot left too few of).
+    """
+    subjects = {subj["code"]: subj for subj in schema["subjects"]}
+    divisions = {div["name"]: div for div in schema["divisions"]}
+    rooms = schema.get("rooms", [])
+
+    def scheduled_classes():
+        """(cell position, class key, subject) for every teaching cell; a lecture's key has no batch."""
+        for div_name, div_data in timetable.items():
+            for batch, schedule in div_data["batches"].items():
+                for day_name, cells in schedule.items():
+                    for s, cell in enumerate(cells):
+                        subj = subjects.get(cell.split("\n")[0])
+                        if subj is None:  # "-", "LUNCH BREAK" or a subject no longer in the schema
+                            continue
+                        key = (div_name, batch if subj["type"] == "Lab" else None, subj["code"])
+                        yield (cells, s, day_name), key, subj
+
+    # slot -> {class key: eligible rooms}
+    slots = {}
+    for (_, s, day_name), key, subj in scheduled_classes():
+        div = divisions.get(key[0], {"batches": []})
+        size = class_size(div, lab=key[1] is not None)
+        slots.setdefault((day_name, s), {})[key] = eligible_rooms(subj, rooms, size)
+
+    assigned = {}
+    unassigned = []
+    # Slot by slot, so a class running on from the previous slot (a multi-slot lab
+    # session) tries the room it already has first
+    for (day_name, s), classes in sorted(slots.items(), key=lambda item: item[0][1]):
+        candidates = {}
+        for key, names in classes.items():
+            if names:
+                held = assigned.get((day_name, s - 1, key))
+                candidates[key] = (held, *(name for name in names if name != held)) if held in names else names
+        room_of, short = _match(candidates)
+        for key in classes:
+            if key in room_of:
+                assigned[(day_name, s, key)] = room_of[key]
+            elif key in short:
+                unassigned.append({"division": key[0], "batch": key[1], "subject": key[2], "day": day_name,
+                                   "slot": s, "reason": "rooms_taken", "rooms": sorted(short[key])})
+            else:
+                unassigned.append({"division": key[0], "batch": key[1], "subject": key[2],
+                                   "day": day_name, "slot": s, "reason": "no_room"})
+
+    for (cells, s, day_name), key, _ in list(scheduled_classes()):
+        room = assigned.get((day_name, s, key))
+        if room:
+            cells[s] = "\n".join(cells[s].split("\n")[:2] + [room])
+    return timetable, unassigned
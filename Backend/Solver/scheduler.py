@@ -0,0 +1,243 @@
+"""
+Fair-share scheduling of solves between admins.
+
+Every solve, background job or synchronous request, waits for its turn here. The
+scheduler keeps a global cap on solves running at once, and per tenant (the admin,
+or the client address for requests naming none) a cap on running and on queued
+solves. When a slot frees it starts, in order:
+
+    1. interactive solves (first-solution previews) before final runs
+    2. the tenant with the fewest solves running
+    3. the tenant with the least recent usage: core-seconds, halved every half-life
+    4. the oldest request
+
+Final runs leave one slot to previews whenever the cap allows more than one.
+Each solve is given CP-SAT search workers ("cores"): what it asked for, but no more
+than one slot's share of the cores or than are free, and at least one. A solve
+cannot change its worker count once started, so a tenant alone on the server never
+takes the cores the next tenant's solve will need. A deterministic profile asks for
+a fixed count of at most one slot's share, so it always gets and is billed for all of
+it (see profiles.resolve_profile).
+Queue wait and run time are totalled per tenant for the scheduler endpoint.
+"""
+import itertools
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import Config
+
+PRIORITIES = ("interactive", "final")
+ANONYMOUS = "anonymous"
+
+
+class QuotaExceededError(Exception):
+    """Raised when a tenant already has as many solves queued as it may."""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a synchronous solve waited too long for its turn."""
+
+
+def default_priority(profile):
+    """A first-solution profile is an interactive preview, anything else a final run."""
+    return "interactive" if profile.get("first_solution") else "final"
+
+
+class FairShareScheduler:
+    """Thread-safe admission of solves with per-tenant limits and core allocation."""
+
+    def __init__(self, max_running, total_cores, tenant_max_running, tenant_max_queued, half_life_seconds):
+        self.max_running = max_running
+        self.total_cores = total_cores
+        self.tenant_max_running = tenant_max_running
+        self.tenant_max_queued = tenant_max_queued
+        self.half_life_seconds = half_life_seconds
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._waiting = []  # tickets in arrival order
+        self._running = {}  # ticket id -> ticket
+        self._tenants = {}  # tenant -> totals
+
+    def _totals(self, tenant):
+        return self._tenants.setdefault(tenant, {
+            "submitted": 0, "rejected": 0, "timed_out": 0, "started": 0, "finished": 0,
+            "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0,
+            "run_seconds": 0.0, "max_run_seconds": 0.0, "core_seconds": 0.0,
+            "usage": 0.0, "usage_at": time.time(),
+        })
+
+    def _decayed(self, tenant, now):
+        totals = self._totals(tenant)
+        return totals["usage"] * 0.5 ** ((now - totals["usage_at"]) / self.half_life_seconds)
+
+    def _usage(self, tenant, now):
+        """Decayed core-seconds of a tenant, counting its running solves so far."""
+        return self._decayed(tenant, now) + sum((now - t["started_at"]) * t["cores"]
+                                                for t in self._running.values() if t["tenant"] == tenant)
+
+    def _rank(self, ticket, now):
+        """Sort key of a waiting solve, the first starts next (see the module docstring)."""
+        running = sum(1 for t in self._running.values() if t["tenant"] == ticket["tenant"])
+        return PRIORITIES.index(ticket["priority"]), running, self._usage(ticket["tenant"], now), ticket["order"]
+
+    def _slot_limit(self, priority):
+        if priority == "final" and self.max_running > 1:
+            return self.max_running - 1
+        return self.max_running
+
+    def enqueue(self, ticket_id, tenant, priority, cores, start):
+        """
+        Queue a solve asking for cores search workers. start(cores) is called, outside
+        the scheduler's lock, once it may run; release(ticket_id) must follow when it
+        ends. Raises QuotaExceededError when the tenant's queue is full.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {list(PRIORITIES)}")
+        with self._lock:
+            totals = self._totals(tenant)
+            queued = sum(1 for t in self._waiting if t["tenant"] == tenant)
+            if queued >= self.tenant_max_queued:
+                totals["rejected"] += 1
+                raise QuotaExceededError(f"{queued} solves of this admin are already queued, try again later")
+            totals["submitted"] += 1
+            self._waiting.append({
+                "id": ticket_id, "tenant": tenant, "priority": priority, "requested": max(1, cores),
+                "start": start, "order": next(self._order), "queued_at": time.time(),
+            })
+        self._dispatch()
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            now = time.time()
+            while self._waiting:
+                running = {}
+                for t in self._running.values():
+                    running[t["tenant"], t["priority"]] = running.get((t["tenant"], t["priority"]), 0) + 1
+                # A tenant's running limit holds per priority, so a long final run never blocks its previews
+                ready = [t for t in self._waiting
+                         if len(self._running) < self._slot_limit(t["priority"])
+                         and running.get((t["tenant"], t["priority"]), 0) < self.tenant_max_running]
+                if not ready:
+                    break
+                ticket = min(ready, key=lambda t: self._rank(t, now))
+                self._waiting.remove(ticket)
+
+                share = self.total_cores // self.max_running
+                free = self.total_cores - sum(t["cores"] for t in self._running.values())
+                ticket["cores"] = max(1, min(ticket["requested"], share, free))
+                ticket["started_at"] = now
+
+                totals = self._totals(ticket["tenant"])
+                wait = now - ticket["queued_at"]
+                totals["started"] += 1
+                totals["queue_wait_seconds"] += wait
+                totals["max_queue_wait_seconds"] = max(totals["max_queue_wait_seconds"], wait)
+                self._running[ticket["id"]] = ticket
+                started.append(ticket)
+        for ticket in started:
+            ticket["start"](ticket["cores"])
+
+    def release(self, ticket_id):
+        """End a running solve, book its time to its tenant and start whatever may run next."""
+        with self._lock:
+            ticket = self._running.pop(ticket_id, None)
+            if ticket is not None:
+                now = time.time()
+                totals = self._totals(ticket["tenant"])
+                run = now - ticket["started_at"]
+                totals["finished"] += 1
+                totals["run_seconds"] += run
+                totals["max_run_seconds"] = max(totals["max_run_seconds"], run)
+                totals["core_seconds"] += run * ticket["cores"]
+                totals["usage"] = self._decayed(ticket["tenant"], now) + run * ticket["cores"]
+                totals["usage_at"] = now
+        self._dispatch()
+
+    def remove(self, ticket_id):
+        """Drop a solve that has not started. Returns False when it already has (or is unknown)."""
+        with self._lock:
+            for ticket in self._waiting:
+                if ticket["id"] == ticket_id:
+                    self._waiting.remove(ticket)
+                    return True
+        return False
+
+    def position(self, ticket_id):
+        """1-based place of a waiting solve in the order they would start now, else None."""
+        with self._lock:
+            now = time.time()
+            ordered = sorted(self._waiting, key=lambda t: self._rank(t, now))
+            return next((i + 1 for i, t in enumerate(ordered) if t["id"] == ticket_id), None)
+
+    @contextmanager
+    def turn(self, tenant, priority, cores, timeout):
+        """
+        Wait (up to timeout seconds) for a synchronous solve's turn and yield its cores,
+        releasing the slot afterwards. Raises QuotaExceededError or QueueTimeoutError.
+        """
+        ticket_id = uuid.uuid4().hex
+        granted = []
+        ready = threading.Event()
+
+        def start(given):
+            granted.append(given)
+            ready.set()
+
+        self.enqueue(ticket_id, tenant, priority, cores, start)
+        if not ready.wait(timeout):
+            if self.remove(ticket_id):
+                with self._lock:
+                    self._totals(tenant)["timed_out"] += 1
+                raise QueueTimeoutError(f"No solver was free within {timeout:g} seconds, try again later")
+            ready.wait()  # Started just as the wait ran out
+        try:
+            yield granted[0]
+        finally:
+            self.release(ticket_id)
+
+    def snapshot(self, tenant=None):
+        """Limits, current load and per-tenant totals (one tenant's when given), JSON-ready."""
+        with self._lock:
+            now = time.time()
+            tenants = {}
+            for name, totals in self._tenants.items():
+                if tenant is not None and name != tenant:
+                    continue
+                running = [t for t in self._running.values() if t["tenant"] == name]
+                stats = {key: value for key, value in totals.items() if key not in ("usage", "usage_at")}
+                for key in ("queue_wait_seconds", "max_queue_wait_seconds", "run_seconds",
+                            "max_run_seconds", "core_seconds"):
+                    stats[key] = round(stats[key], 3)
+                stats.update(
+                    queued=sum(1 for t in self._waiting if t["tenant"] == name),
+                    running=len(running),
+                    cores=sum(t["cores"] for t in running),
+                    mean_queue_wait_seconds=round(totals["queue_wait_seconds"] / totals["started"], 3)
+                    if totals["started"] else None,
+                    mean_run_seconds=round(totals["run_seconds"] / totals["finished"], 3)
+                    if totals["finished"] else None,
+                    usage=round(self._usage(name, now), 3),
+                )
+                tenants[name] = stats
+            return {
+                "limits": {"max_running": self.max_running, "total_cores": self.total_cores,
+                           "tenant_max_running": self.tenant_max_running,
+                           "tenant_max_queued": self.tenant_max_queued,
+                           "half_life_seconds": self.half_life_seconds},
+                "running": len(self._running),
+                "queued": len(self._waiting),
+                "cores": sum(t["cores"] for t in self._running.values()),
+                "tenants": tenants,
+            }
+
+
+solver_scheduler = FairShareScheduler(
+    Config.SOLVER_MAX_WORKERS,
+    Config.SOLVER_TOTAL_CORES,
+    Config.SOLVER_TENANT_MAX_RUNNING,
+    Config.SOLVER_TENANT_MAX_QUEUED,
+    Config.SOLVER_FAIR_SHARE_HALF_LIFE_SECONDS,
+)
@@ -0,0 +1,228 @@
+"""
+Schema sessions for iterative editing.
+
+A client creates a session once with the full schema and pins, then sends small
+JSON-patch edits (RFC 6902 add, remove, replace and test) to the session document
+{"schema": ..., "fixed_positions": [...]} instead of resending everything. In paths
+a schema list may be indexed by position or by its items' key (a division's or
+room's name, a subject's code, a faculty member's abbr):
+
+    {"op": "add", "path": "/schema/subjects/-", "value": {"code": "CS105", ...}}
+    {"op": "replace", "path": "/schema/faculty/ABC/max_per_day", "value": 3}
+    {"op": "add", "path": "/fixed_positions/-", "value": {"division": "A", "batch": "A1",
+                                                           "day": 0, "slot": 2, "subject": "CS101"}}
+
+Solving a session hands solve_schema the session's reuse dict, so only the
+independent components an edit touched get a new model and search; the others keep
+their timetable from the last solve, which also warm-starts the changed ones.
+Sessions live in this server process; the least recently used go first when there
+are too many, and any left unused for the TTL expire.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from config import Config
+from Solver.decompose import solve_schema
+from Solver.model import parse_blocked_slots, parse_fixed_positions
+
+PATCH_OPS = ("add", "remove", "replace", "test")
+
+# The field a schema list's items are addressed by in patch paths
+_LIST_KEYS = {"divisions": "name", "subjects": "code", "faculty": "abbr", "rooms": "name"}
+
+
+class RevisionConflictError(Exception):
+    """Raised when a patch names a revision other than the session's current one."""
+
+
+def _tokens(path):
+    if not isinstance(path, str) or not path.startswith("/"):
+        raise ValueError(f"Patch path {path!r} must start with '/'")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+
+def _index(container, token, parent, path):
+    """The key or position token names in a dict or list. Raises ValueError."""
+    if isinstance(container, dict):
+        if token not in container:
+            raise ValueError(f"Patch path {path} names nothing at '{token}'")
+        return token
+    if isinstance(container, list):
+        if token.isdigit() and int(token) < len(container):
+            return int(token)
+        field = _LIST_KEYS.get(parent)
+        for i, item in enumerate(container):
+            if field and isinstance(item, dict) and str(item.get(field)) == token:
+                return i
+        raise ValueError(f"Patch path {path} names nothing at '{token}'")
+    raise ValueError(f"Patch path {path} goes below a value at '{token}'")
+
+
+def apply_patch(document, patch):
+    """Return a copy of document with the patch operations applied in order. Raises ValueError."""
+    if not isinstance(patch, list):
+        raise ValueError("patch must be a list of operations")
+    document = copy.deepcopy(document)
+    for n, op in enumerate(patch):
+        if not isinstance(op, dict) or op.get("op") not in PATCH_OPS:
+            raise ValueError(f"Patch operation {n} needs an op, one of {list(PATCH_OPS)}")
+        path = op.get("path")
+        tokens = _tokens(path)
+        if tokens == [""] or (op["op"] != "test" and len(tokens) < 2):
+            raise ValueError(f"Patch operation {n} cannot change {path} as a whole")
+        if op["op"] != "remove" and "value" not in op:
+            raise ValueError(f"Patch operation {n} needs a value")
+
+        parent, parent_token = document, None
+        for token in tokens[:-1]:
+            parent, parent_token = parent[_index(parent, token, parent_token, path)], token
+        last = tokens[-1]
+
+        if op["op"] == "add":
+            value = copy.deepcopy(op["value"])
+            if isinstance(parent, dict):
+                parent[last] = value
+            elif isinstance(parent, list) and last == "-":
+                parent.append(value)
+            elif isinstance(parent, list) and last.isdigit() and int(last) <= len(parent):
+                parent.insert(int(last), value)
+            else:
+                raise ValueError(f"Patch operation {n} cannot add at {path}")
+        elif op["op"] == "remove":
+            del parent[_index(parent, last, parent_token, path)]
+        elif op["op"] == "replace":
+            parent[_index(parent, last, parent_token, path)] = copy.deepcopy(op["value"])
+        elif parent[_index(parent, last, parent_token, path)] != op["value"]:
+            raise ValueError(f"Patch test {n} failed at {path}")
+    return document
+
+
+def _check_document(document):
+    """Raise ValueError unless document holds a usable schema and pins."""
+    schema = document.get("schema")
+    if not isinstance(schema, dict) or not all(isinstance(schema.get(key), list) for key in _LIST_KEYS):
+        raise ValueError(f"schema needs the lists {list(_LIST_KEYS)}")
+    for key, field in _LIST_KEYS.items():
+        names = [item.get(field) if isinstance(item, dict) else None for item in schema[key]]
+        if None in names or len(set(map(str, names))) != len(names):
+            raise ValueError(f"Every entry of {key} needs a distinct {field}")
+    parse_blocked_slots(schema.get("blocked_slots"))
+    parse_fixed_positions(document.get("fixed_positions"))
+
+
+class SchemaSessions:
+    """Thread-safe in-memory sessions, each a schema document, revision and reusable components."""
+
+    def __init__(self, max_sessions, ttl_seconds):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # id -> session, least recently used first
+
+    def _purge(self, now):
+        for session_id in [sid for sid, s in self._sessions.items() if now - s["used_at"] > self.ttl_seconds]:
+            del self._sessions[session_id]
+        while len(self._sessions) >= self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None or time.time() - session["used_at"] > self.ttl_seconds:
+            return None
+        session["used_at"] = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    @staticmethod
+    def _summary(session):
+        schema = session["document"]["schema"]
+        return {
+            "session_id": session["id"],
+            "revision": session["revision"],
+            "created_at": session["created_at"],
+            "updated_at": session["updated_at"],
+            "solved_revision": session["solved_revision"],
+            **{key: len(schema[key]) for key in _LIST_KEYS},
+            "fixed_positions": len(parse_fixed_positions(session["document"].get("fixed_positions"))),
+        }
+
+    def create(self, schema, fixed_positions=None):
+        """Start a session on a schema and pins and return its summary. Raises ValueError."""
+        document = {"schema": copy.deepcopy(schema), "fixed_positions": copy.deepcopy(fixed_positions or [])}
+        _check_document(document)
+        now = time.time()
+        session = {"id": uuid.uuid4().hex, "document": document, "revision": 1, "created_at": now,
+                   "updated_at": now, "used_at": now, "solved_revision": None, "timetable": None, "reuse": {}}
+        with self._lock:
+            self._purge(now)
+            self._sessions[session["id"]] = session
+        return self._summary(session)
+
+    def get(self, session_id, with_document=False):
+        """A session's summary (and its document when asked), or None for an unknown id."""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return None
+            summary = self._summary(session)
+            if with_document:
+                summary["document"] = copy.deepcopy(session["document"])
+            return summary
+
+    def patch(self, session_id, patch, revision=None):
+        """
+        Apply a patch as one new revision and return the summary, or None for an unknown
+        id. A failing patch leaves the session unchanged. Raises ValueError, or
+        RevisionConflictError when revision is given and is not the current one.
+        """
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return None
+            if revision is not None and revision != session["revision"]:
+                raise RevisionConflictError(f"Session is at revision {session['revision']}, not {revision}")
+            document = apply_patch(session["document"], patch)
+            _check_document(document)
+            session["document"] = document
+            session["revision"] += 1
+            session["updated_at"] = time.time()
+            return self._summary(session)
+
+    def delete(self, session_id):
+        """Forget a session. Returns False for an unknown id."""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def solve(self, session_id, **solve_args):
+        """
+        Solve a session's current revision with solve_schema (solve_args are its options),
+        reusing the components unchanged since the last solve. Returns (timetable, meta)
+        with meta["session"], or (None, None) for an unknown id.
+        """
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return None, None
+            revision = session["revision"]
+            document = session["document"]
+            previous = session["timetable"]
+            reuse = dict(session["reuse"])
+
+        timetable, meta = solve_schema(document["schema"], parse_fixed_positions(document.get("fixed_positions")),
+                                       previous=previous, reuse=reuse, **solve_args)
+        meta["session"] = {"session_id": session_id, "revision": revision,
+                           "components_reused": meta.pop("components_reused", 0)}
+
+        with self._lock:
+            # Reusable components are keyed by their content, so they hold for any revision
+            session["reuse"] = reuse
+            if timetable is not None and revision >= (session["solved_revision"] or 0):
+                session["timetable"] = timetable
+                session["solved_revision"] = revision
+        return timetable, meta
+
+
+schema_sessions = SchemaSessions(Config.SOLVER_MAX_SESSIONS, Config.SOLVER_SESSION_TTL_SECONDS)
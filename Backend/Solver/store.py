@@ -0,0 +1,229 @@
+"""
+Persistent, versioned timetable store.
+
+Saved timetables are numbered per (admin, term) in an SQLite file, each with its views:
+inverted indexes built once at save time so the read APIs never scan the timetable.
+
+    classes      every class once: division, batches, day, slot, subject, faculty, room
+                 (a lecture is one class for all of its division's batches)
+    faculty      {abbr: [class ids]}, a teacher's week
+    rooms        {room: [class ids]}, a room's week
+    occupancy    [day][slot] -> [class ids] held in that slot
+    room_at      [day][slot] -> {room: class id}
+    free_rooms   [day][slot] -> [room names nothing is held in]
+
+Loaded views are kept in a small in-memory LRU, so repeated reads are dict and list
+lookups.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from config import Config
+from Solver.compact import from_compact, to_compact
+from Solver.model import DAY_NAMES, LUNCH_BREAK_SLOTS, SLOTS_PER_DAY, TIME_SLOTS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timetables (
+    admin_id INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    label TEXT,
+    created_at REAL NOT NULL,
+    timetable TEXT NOT NULL,
+    views TEXT NOT NULL,
+    meta TEXT,
+    PRIMARY KEY (admin_id, term, version)
+)
+"""
+
+
+def _slot_minutes(clock):
+    """Minutes since midnight of a TIME_SLOTS clock time; the afternoon is written 01:00-04:10."""
+    hours, minutes = map(int, clock.split(":"))
+    return (hours + 12 if hours < 8 else hours) * 60 + minutes
+
+
+def current_slot(now=None):
+    """(day index, slot) for a datetime (default now), or None outside teaching hours."""
+    now = now or datetime.now()
+    if now.weekday() >= len(DAY_NAMES):
+        return None
+    minutes = now.hour * 60 + now.minute
+    for s, span in enumerate(TIME_SLOTS):
+        start, end = map(_slot_minutes, span.split("-"))
+        if start <= minutes < end:
+            return now.weekday(), s
+    return None
+
+
+def build_views(timetable, rooms=None):
+    """
+    The indexes above for a timetable (nested or compact). rooms lists every room name
+    for free_rooms; without it only the rooms the timetable uses are known.
+    """
+    compact = timetable if timetable.get("format") == "compact" else to_compact(timetable)
+    cells = np.array(compact["cells"], dtype=np.int64).reshape(compact["shape"])
+    subjects, faculty, room_names = compact["subjects"], compact["faculty"], compact["rooms"]
+    all_rooms = list(rooms) if rooms is not None else list(room_names)
+
+    classes, faculty_index, room_index = [], {}, {}
+    occupancy = [[[] for _ in range(SLOTS_PER_DAY)] for _ in DAY_NAMES]
+    room_at = [[{} for _ in range(SLOTS_PER_DAY)] for _ in DAY_NAMES]
+    for i, div_name in enumerate(compact["divisions"]):
+        batches = compact["batches"][i]
+        for d in range(len(DAY_NAMES)):
+            for s in range(SLOTS_PER_DAY):
+                if s in LUNCH_BREAK_SLOTS:
+                    continue
+                # Batches holding the same class (a lecture, or one lab room) share an entry
+                held = {}
+                for b, batch in enumerate(batches):
+                    if cells[i, b, d, s] >= 0:
+                        held.setdefault(int(cells[i, b, d, s]), []).append(batch)
+                for class_id, class_batches in held.items():
+                    subject, fac, room = compact["classes"][class_id]
+                    entry = {
+                        "division": div_name, "batches": class_batches, "day": DAY_NAMES[d], "slot": s,
+                        "time": TIME_SLOTS[s], "subject": subjects[subject],
+                        "faculty": faculty[fac] if fac >= 0 else None, "room": room_names[room] if room >= 0 else None,
+                    }
+                    entry_id = len(classes)
+                    classes.append(entry)
+                    occupancy[d][s].append(entry_id)
+                    if entry["faculty"]:
+                        faculty_index.setdefault(entry["faculty"], []).append(entry_id)
+                    if entry["room"]:
+                        room_index.setdefault(entry["room"], []).append(entry_id)
+                        room_at[d][s][entry["room"]] = entry_id
+
+    free_rooms = [[[] if s in LUNCH_BREAK_SLOTS else [room for room in all_rooms if room not in room_at[d][s]]
+                   for s in range(SLOTS_PER_DAY)] for d in range(len(DAY_NAMES))]
+    return {"classes": classes, "faculty": faculty_index, "rooms": room_index, "occupancy": occupancy,
+            "room_at": room_at, "free_rooms": free_rooms}
+
+
+class TimetableStore:
+    """Saved timetables in one SQLite file, with an LRU of loaded views."""
+
+    def __init__(self, path, cache_entries):
+        self.path = path
+        self.cache_entries = cache_entries
+        self._lock = threading.Lock()
+        self._views = OrderedDict()  # (admin_id, term, version) -> views
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute(_SCHEMA)
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def save(self, admin_id, term, timetable, rooms=None, label=None, meta=None):
+        """Store a timetable (nested or compact) as the next version for (admin, term) and return its summary."""
+        compact = timetable if timetable.get("format") == "compact" else to_compact(timetable)
+        views = build_views(compact, rooms)
+        created_at = time.time()
+        conn = self._connect()
+        try:
+            # The write lock is taken before the version is read, so concurrent saves number in turn
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT MAX(version) FROM timetables WHERE admin_id = ? AND term = ?",
+                               (admin_id, term)).fetchone()
+            version = (row[0] or 0) + 1
+            conn.execute(
+                "INSERT INTO timetables (admin_id, term, version, label, created_at, timetable, views, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (admin_id, term, version, label, created_at, json.dumps(compact, separators=(",", ":")),
+                 json.dumps(views, separators=(",", ":")), json.dumps(meta) if meta is not None else None),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self._remember((admin_id, term, version), views)
+        return {"admin_id": admin_id, "term": term, "version": version, "label": label, "created_at": created_at}
+
+    def versions(self, admin_id, term=None):
+        """Summaries of an admin's saved timetables, newest first, optionally for one term."""
+        query = "SELECT admin_id, term, version, label, created_at FROM timetables WHERE admin_id = ?"
+        params = [admin_id]
+        if term is not None:
+            query += " AND term = ?"
+            params.append(term)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query + " ORDER BY term, version DESC", params).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def _resolve(self, conn, admin_id, term, version):
+        if version == "latest":
+            row = conn.execute("SELECT MAX(version) FROM timetables WHERE admin_id = ? AND term = ?",
+                               (admin_id, term)).fetchone()
+            return row[0]
+        return int(version)
+
+    def timetable(self, admin_id, term, version="latest", output_format="nested"):
+        """(summary, timetable) of a saved version ("latest" or a number), or (None, None)."""
+        conn = self._connect()
+        try:
+            version = self._resolve(conn, admin_id, term, version)
+            row = conn.execute(
+                "SELECT admin_id, term, version, label, created_at, timetable, meta FROM timetables "
+                "WHERE admin_id = ? AND term = ? AND version = ?", (admin_id, term, version)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None, None
+        summary = {key: row[key] for key in ("admin_id", "term", "version", "label", "created_at")}
+        summary["meta"] = json.loads(row["meta"]) if row["meta"] else None
+        compact = json.loads(row["timetable"])
+        return summary, compact if output_format == "compact" else from_compact(compact)
+
+    def views(self, admin_id, term, version="latest"):
+        """(version number, views) of a saved version, or (None, None) if there is none."""
+        if version == "latest":
+            conn = self._connect()
+            try:
+                version = self._resolve(conn, admin_id, term, version)
+            finally:
+                conn.close()
+            if version is None:
+                return None, None
+        key = (admin_id, term, int(version))
+        with self._lock:
+            views = self._views.get(key)
+            if views is not None:
+                self._views.move_to_end(key)
+                return key[2], views
+
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT views FROM timetables WHERE admin_id = ? AND term = ? AND version = ?",
+                               key).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None, None
+        views = json.loads(row["views"])
+        self._remember(key, views)
+        return key[2], views
+
+    def _remember(self, key, views):
+        with self._lock:
+            self._views[key] = views
+            self._views.move_to_end(key)
+            while len(self._views) > self.cache_entries:
+                self._views.popitem(last=False)
+
+
+timetable_store = TimetableStore(Config.TIMETABLE_STORE_PATH, Config.TIMETABLE_STORE_CACHE_ENTRIES)
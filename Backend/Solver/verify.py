@@ -0,0 +1,244 @@
+"""
+Independent timetable verifier.
+
+verify_timetable recounts every rule the CP-SAT model enforces on a finished
+timetable (nested or compact output format) without building a model: the cells are
+turned into integer arrays once and each rule is a handful of NumPy reductions over
+the whole week, so it is cheap enough to run after every manual edit in the timetable
+UI and on every solver result in the benchmark. Issues have the same shape as the
+ones Solver.feasibility reports.
+"""
+import numpy as np
+
+from Solver.compact import to_compact, validate_compact
+from Solver.model import (
+    DAYS, LECTURES_PER_DAY, LUNCH_BREAK_SLOTS, SLOTS_PER_DAY, CompiledSchema, parse_blocked_slots,
+    parse_fixed_positions,
+)
+
+
+def _issue(check, message, severity="error", **details):
+    return {"check": check, "severity": severity, "message": message, **details}
+
+
+def _frequency_bounds(subj):
+    """(min, max) per week exactly as the model clamps them."""
+    cap = 7 if subj["type"] == "Theory" else 5
+    return max(1, subj.get("min_per_week", 1)), min(subj.get("max_per_week", cap), cap)
+
+
+def _schema_grid(compact, divisions, subject_ids, room_ids):
+    """
+    Subject and room id grids shaped (division, batch, day, slot) in schema order, -1
+    for a free cell, plus issues for divisions, batches, subjects and rooms the
+    timetable and schema do not agree on. Subject id -2 marks an unknown subject.
+    """
+    issues = []
+    classes = np.array(compact["classes"], dtype=np.int64).reshape(-1, 3)
+    # Class id -1 (a free cell) reads the trailing -1
+    class_subject = np.array([subject_ids.get(compact["subjects"][s], -2) for s in classes[:, 0]] + [-1],
+                             dtype=np.int64)
+    class_room = np.array([room_ids.get(compact["rooms"][r], -1) if r >= 0 else -1 for r in classes[:, 2]] + [-1],
+                          dtype=np.int64)
+    for s, in np.argwhere(class_subject[:-1] == -2):
+        issues.append(_issue("unknown_subject", f"Subject {compact['subjects'][classes[s, 0]]} is not in the schema"))
+    for r, in np.argwhere((classes[:, 2] >= 0) & (class_room[:-1] < 0)):
+        issues.append(_issue("unknown_room", f"Room {compact['rooms'][classes[r, 2]]} is not in the schema",
+                             "warning"))
+
+    cells = np.array(compact["cells"], dtype=np.int64).reshape(compact["shape"])
+    positions = {name: i for i, name in enumerate(compact["divisions"])}
+    for name in positions.keys() - {div["name"] for div in divisions}:
+        issues.append(_issue("unknown_division", f"Division {name} is not in the schema", division=name))
+
+    shape = (len(divisions), max((len(div["batches"]) for div in divisions), default=0), len(DAYS), SLOTS_PER_DAY)
+    subjects = np.full(shape, -1, dtype=np.int64)
+    rooms = np.full(shape, -1, dtype=np.int64)
+    for i, div in enumerate(divisions):
+        if div["name"] not in positions:
+            issues.append(_issue("missing_division", f"Division {div['name']} has no timetable",
+                                 division=div["name"]))
+            continue
+        ci = positions[div["name"]]
+        batch_positions = {batch: b for b, batch in enumerate(compact["batches"][ci])}
+        for b, batch in enumerate(div["batches"]):
+            if batch not in batch_positions:
+                issues.append(_issue("missing_batch", f"Batch {batch} of {div['name']} has no timetable",
+                                     division=div["name"], batch=batch))
+                continue
+            row = cells[ci, batch_positions[batch], :len(DAYS), :SLOTS_PER_DAY]
+            subjects[i, b, :row.shape[0], :row.shape[1]] = class_subject[row]
+            rooms[i, b, :row.shape[0], :row.shape[1]] = class_room[row]
+    return subjects, rooms, issues
+
+
+def verify_timetable(timetable, schema, fixed_positions=None):
+    """
+    Return the list of rules a timetable breaks: classes in lunch, blocked or
+    unavailable slots or where they are not taught, lectures missing from some batches,
+    the daily class count, weekly subject frequencies, faculty day and week limits,
+    faculty teaching two classes at once, rooms holding two classes at once or a class
+    they cannot host, and fixed positions not kept. An empty list (or one without
+    "error" entries) means the timetable is valid. Raises ValueError on a malformed
+    compact timetable, fixed positions or blocked slots.
+    """
+    divisions = schema["divisions"]
+    lecture_subjects = [subj for subj in schema["subjects"] if subj["type"] == "Theory"]
+    lab_subjects = [subj for subj in schema["subjects"] if subj["type"] == "Lab"]
+    subjects = lecture_subjects + lab_subjects
+    index = CompiledSchema(divisions, lecture_subjects, lab_subjects, schema["faculty"], schema["rooms"],
+                           parse_blocked_slots(schema.get("blocked_slots")))
+    lecture_count = len(lecture_subjects)
+    subject_ids = {subj["code"]: j for j, subj in enumerate(subjects)}
+    room_names = [room["name"] for room in schema["rooms"]]
+    room_ids = {name: r for r, name in enumerate(room_names)}
+
+    if timetable.get("format") == "compact":
+        compact = timetable
+        validate_compact(compact)
+    else:
+        compact = to_compact(timetable)
+    grid, room_grid, issues = _schema_grid(compact, divisions, subject_ids, room_ids)
+    n_divisions, n_batches = grid.shape[:2]
+    batch_counts = np.array([len(div["batches"]) for div in divisions], dtype=np.int64)
+    real = np.arange(n_batches) < batch_counts[:, None]
+
+    def where(i, b, d, s, j):
+        div = divisions[i]
+        return {"division": div["name"], "batch": div["batches"][b] if b >= 0 else None, "day": DAYS[d],
+                "slot": int(s), "subject": subjects[j]["code"]}
+
+    # Every class cell, one row each: division, batch, day, slot, subject id
+    i, b, d, s = np.nonzero(grid >= 0)
+    j = grid[i, b, d, s]
+    room = room_grid[i, b, d, s]
+
+    lunch = np.isin(s, LUNCH_BREAK_SLOTS)
+    for row in np.flatnonzero(lunch):
+        issues.append(_issue("lunch", f"{subjects[j[row]]['code']} is scheduled in the lunch break",
+                             **where(i[row], b[row], d[row], s[row], j[row])))
+
+    masks = np.zeros((len(subjects), len(DAYS), SLOTS_PER_DAY), dtype=bool)
+    for k, mask in enumerate(index.lecture_masks + index.lab_masks):
+        for day, slot in mask:
+            masks[k, day, slot] = True
+    for row in np.flatnonzero(~masks[j, d, s] & ~lunch):
+        issues.append(_issue("unavailable", f"{subjects[j[row]]['code']} is scheduled in a blocked slot or on a "
+                                            f"day its faculty are unavailable",
+                             **where(i[row], b[row], d[row], s[row], j[row])))
+
+    takes = np.zeros((n_divisions, n_batches, len(subjects)), dtype=bool)
+    positions = {div["name"]: p for p, div in enumerate(divisions)}
+    batch_positions = {(div["name"], batch): q for div in divisions for q, batch in enumerate(div["batches"])}
+    for div_name, lectures in index.division_lectures.items():
+        takes[positions[div_name], :, lectures] = True
+    for key, labs in index.batch_labs.items():
+        takes[positions[key[0]], batch_positions[key], [lecture_count + k for k in labs]] = True
+    for row in np.flatnonzero(~takes[i, b, j]):
+        issues.append(_issue("not_taken", f"{subjects[j[row]]['code']} is scheduled where it is not taught",
+                             **where(i[row], b[row], d[row], s[row], j[row])))
+
+    # A lecture is held for the whole division: the same cell in every batch
+    lecture = j < lecture_count
+    keys, first, counts = np.unique(np.stack([i[lecture], d[lecture], s[lecture], j[lecture]]), axis=1,
+                                    return_index=True, return_counts=True)
+    for row in np.flatnonzero(counts < batch_counts[keys[0]]):
+        issues.append(_issue("lecture_split", f"{subjects[keys[3, row]]['code']} is held for only some batches",
+                             **where(keys[0, row], -1, keys[1, row], keys[2, row], keys[3, row])))
+
+    daily = (grid >= 0).sum(axis=3)
+    for q, p, day in np.argwhere((daily != LECTURES_PER_DAY) & real[:, :, None]):
+        issues.append(_issue("daily_count", f"Batch {divisions[q]['batches'][p]} of {divisions[q]['name']} has "
+                                            f"{daily[q, p, day]} classes on {DAYS[day]} instead of {LECTURES_PER_DAY}",
+                             division=divisions[q]["name"], batch=divisions[q]["batches"][p], day=DAYS[day],
+                             required=LECTURES_PER_DAY, available=int(daily[q, p, day])))
+
+    # Classes, counting a lecture once per division rather than once per batch
+    lecture_rows = np.flatnonzero(lecture)[first]
+    classes = np.concatenate([lecture_rows, np.flatnonzero(~lecture)])
+    ci, cd, cs, cj, croom = i[classes], d[classes], s[classes], j[classes], room[classes]
+    cb = np.where(cj < lecture_count, -1, b[classes])
+
+    held = np.bincount(cj, minlength=len(subjects))
+    takers = index.lecture_takers + index.lab_takers
+    for k, subj in enumerate(subjects):
+        low, high = _frequency_bounds(subj)
+        if takers[k] and not low <= held[k] <= high:
+            issues.append(_issue("frequency", f"{subj['code']} is held {held[k]} times a week but must be held "
+                                              f"{low} to {high} times",
+                                 subject=subj["code"], required=low, maximum=high, available=int(held[k])))
+
+    faculty = schema["faculty"]
+    faculty_ids = {fac["abbr"]: f for f, fac in enumerate(faculty)}
+    taught_by = [[faculty_ids[abbr] for abbr in subj.get("faculty", []) if abbr in faculty_ids] for subj in subjects]
+    degree = np.array([len(ids) for ids in taught_by], dtype=np.int64)
+    # One row per (class, faculty member teaching it)
+    rows = np.repeat(np.arange(len(cj)), degree[cj])
+    teacher = np.array([f for k in cj for f in taught_by[k]], dtype=np.int64)
+    per_slot = np.zeros((len(faculty), len(DAYS), SLOTS_PER_DAY), dtype=np.int64)
+    np.add.at(per_slot, (teacher, cd[rows], cs[rows]), 1)
+    per_day = per_slot.sum(axis=2)
+    max_per_day = np.array([min(fac.get("max_per_day", 5), 7) for fac in faculty], dtype=np.int64)
+    max_per_week = np.array([min(fac.get("max_per_week", 25), 35) for fac in faculty], dtype=np.int64)
+    for f, day, slot in np.argwhere(per_slot > 1):
+        issues.append(_issue("faculty_clash", f"{faculty[f]['abbr']} teaches {per_slot[f, day, slot]} classes at "
+                                              f"the same time",
+                             faculty=faculty[f]["abbr"], day=DAYS[day], slot=int(slot),
+                             required=int(per_slot[f, day, slot]), available=1))
+    for f, day in np.argwhere(per_day > max_per_day[:, None]):
+        issues.append(_issue("faculty_day", f"{faculty[f]['abbr']} teaches {per_day[f, day]} classes on "
+                                            f"{DAYS[day]} but may teach {max_per_day[f]} a day",
+                             faculty=faculty[f]["abbr"], day=DAYS[day], required=int(per_day[f, day]),
+                             available=int(max_per_day[f])))
+    per_week = per_day.sum(axis=1)
+    for f in np.flatnonzero(per_week > max_per_week):
+        issues.append(_issue("faculty_week", f"{faculty[f]['abbr']} teaches {per_week[f]} classes a week "
+                                             f"but may teach {max_per_week[f]}",
+                             faculty=faculty[f]["abbr"], required=int(per_week[f]), available=int(max_per_week[f])))
+
+    booked = croom >= 0
+    per_room = np.zeros((len(room_names), len(DAYS), SLOTS_PER_DAY), dtype=np.int64)
+    np.add.at(per_room, (croom[booked], cd[booked], cs[booked]), 1)
+    for r, day, slot in np.argwhere(per_room > 1):
+        issues.append(_issue("room_clash", f"Room {room_names[r]} holds {per_room[r, day, slot]} classes at the "
+                                           f"same time",
+                             room=room_names[r], day=DAYS[day], slot=int(slot),
+                             required=int(per_room[r, day, slot]), available=1))
+
+    # (division, batch or -1, subject, room) of every class against the rooms that can host it
+    def flat(div, batch, subject, room):
+        return ((div * (n_batches + 1) + batch + 1) * len(subjects) + subject) * max(len(room_names), 1) + room
+
+    eligible = []
+    for key, names in index.room_classes.items():
+        div, batch, subject = ((positions[key[1]], -1, key[2]) if key[0] == "lec"
+                               else (positions[key[1]], batch_positions[key[1:3]], lecture_count + key[3]))
+        eligible.extend(flat(div, batch, subject, room_ids[name]) for name in names)
+    hosts = np.isin(flat(ci, cb, cj, croom), np.array(eligible, dtype=np.int64))
+    for row in np.flatnonzero(booked & ~hosts):
+        issues.append(_issue("room_ineligible", f"Room {room_names[croom[row]]} cannot host "
+                                                f"{subjects[cj[row]]['code']}", room=room_names[croom[row]],
+                             **where(ci[row], cb[row], cd[row], cs[row], cj[row])))
+    classes_with_rooms = {key for key, names in index.room_classes.items() if names}
+    for row in np.flatnonzero(~booked & ~lunch[classes]):
+        key = (("lec", divisions[ci[row]]["name"], cj[row]) if cb[row] < 0
+               else ("lab", divisions[ci[row]]["name"], divisions[ci[row]]["batches"][cb[row]], cj[row] - lecture_count))
+        if key in classes_with_rooms:
+            issues.append(_issue("no_room", f"{subjects[cj[row]]['code']} has no room", "warning",
+                                 **where(ci[row], cb[row], cd[row], cs[row], cj[row])))
+
+    for (div_name, batch_name, day, slot), code in parse_fixed_positions(fixed_positions).items():
+        if code not in subject_ids or div_name not in positions or not 0 <= slot < SLOTS_PER_DAY:
+            continue
+        k = subject_ids[code]
+        div = divisions[positions[div_name]]
+        if k < lecture_count:
+            batches = range(len(div["batches"]))
+        elif (div_name, batch_name) in batch_positions:
+            batches = [batch_positions[(div_name, batch_name)]]
+        else:
+            continue
+        if any(grid[positions[div_name], p, day, slot] != k for p in batches):
+            issues.append(_issue("pin", f"{code} is pinned here but not scheduled here", division=div_name,
+                                 batch=batch_name or None, day=DAYS[day], slot=slot, subject=code))
+    return issues
@@ -0,0 +1,101 @@
+"""
+Deterministic synthetic timetable schemas for benchmarking the solver.
+
+generate_schema builds a schema in the same shape the frontend posts to /generate.
+Every division takes its own theory and lab subjects, taught by a shared faculty
+pool. Theory is held in the division's home classroom and each lab subject in one of
+the lab rooms, so the schemas stay solvable as the division count grows while
+faculty and rooms still couple the divisions together.
+"""
+import math
+import random
+
+from Solver.model import DAYS, LECTURES_PER_DAY
+
+# Benchmark size ladder, smallest first
+SIZE_LADDER = {
+    "tiny": {"divisions": 1, "batches": 2, "theory": 4, "labs": 2, "faculty": 4, "rooms": 2},
+    "small": {"divisions": 2, "batches": 2, "theory": 5, "labs": 2, "faculty": 8, "rooms": 4},
+    "medium": {"divisions": 4, "batches": 3, "theory": 5, "labs": 3, "faculty": 14, "rooms": 7},
+    "large": {"divisions": 8, "batches": 3, "theory": 6, "labs": 3, "faculty": 28, "rooms": 12},
+    "xlarge": {"divisions": 12, "batches": 4, "theory": 6, "labs": 3, "faculty": 40, "rooms": 18},
+}
+
+
+def _split(total, parts, cap):
+    """Spread total over parts as evenly as possible, no part above cap."""
+    return [min(cap, total // parts + (1 if i < total % parts else 0)) for i in range(parts)]
+
+
+def generate_schema(divisions=2, batches=2, theory=5, labs=2, faculty=8, rooms=4, tightness=0.8, seed=0):
+    """
+    Return a schema with the given number of divisions (each with batches), theory and
+    lab subjects per division, faculty members and rooms. The first rooms are home
+    classrooms (shared round-robin when there are fewer rooms than divisions), the
+    rest are labs. tightness in (0, 1] is the share of each batch's weekly slots that
+    the subjects' min_per_week must fill and how close faculty limits sit to their load.
+    The same arguments always give the same schema.
+    """
+    if not 0 < tightness <= 1:
+        raise ValueError("tightness must be in (0, 1]")
+    rng = random.Random(seed)
+    weekly_slots = LECTURES_PER_DAY * len(DAYS)
+
+    classroom_count = max(1, min(divisions, rooms - 1)) if rooms > 1 else 1
+    room_list = [{"name": f"CR{i + 1}", "type": "Classroom", "capacity": 60} for i in range(classroom_count)]
+    room_list += [{"name": f"LAB{i + 1}", "type": "Lab", "capacity": 30}
+                  for i in range(max(1, rooms - classroom_count))]
+    lab_rooms = [room["name"] for room in room_list if room["type"] == "Lab"]
+
+    faculty_abbrs = [f"F{i + 1:03d}" for i in range(faculty)]
+    division_list = []
+    subjects = []
+    teaching_load = {abbr: 0 for abbr in faculty_abbrs}
+    # Minimum cells per batch and week, split between theory and labs by subject count
+    required = max(1, round(tightness * weekly_slots))
+    theory_share = round(required * theory / (theory + labs)) if theory + labs else 0
+    theory_mins = _split(theory_share, theory, 7) if theory else []
+    lab_mins = _split(required - theory_share, labs, 5) if labs else []
+
+    for d in range(divisions):
+        name = f"D{d + 1:02d}"
+        division_list.append({"name": name, "batches": [f"{name}-B{b + 1}" for b in range(batches)]})
+        for i in range(theory):
+            abbr = rng.choice(faculty_abbrs)
+            # Lectures fill whatever labs leave of the week, so count a full share
+            teaching_load[abbr] += min(7, math.ceil(weekly_slots / theory))
+            subjects.append({
+                "code": f"{name}-T{i + 1}", "name": f"{name} Theory {i + 1}", "type": "Theory",
+                "faculty": [abbr], "divisions": [name], "batches": [],
+                "room_type": "", "required_room": room_list[d % classroom_count]["name"],
+                "duration": 50, "min_per_week": max(1, theory_mins[i]), "max_per_week": 7,
+            })
+        for i in range(labs):
+            abbr = rng.choice(faculty_abbrs)
+            teaching_load[abbr] += max(1, lab_mins[i])
+            subjects.append({
+                "code": f"{name}-L{i + 1}", "name": f"{name} Lab {i + 1}", "type": "Lab",
+                "faculty": [abbr], "divisions": [name], "batches": [],
+                "room_type": "", "required_room": lab_rooms[(d * labs + i) % len(lab_rooms)],
+                "duration": 100, "min_per_week": max(1, lab_mins[i]), "max_per_week": 5,
+            })
+
+    # Looser limits at low tightness; never below the expected load
+    faculty_list = []
+    for abbr in faculty_abbrs:
+        per_week = min(35, max(5, math.ceil(teaching_load[abbr] / tightness)))
+        faculty_list.append({
+            "abbr": abbr, "name": f"Faculty {abbr}",
+            "max_per_day": min(7, max(3, math.ceil(per_week / len(DAYS)) + 1)),
+            "max_per_week": per_week,
+            "availability": list(range(len(DAYS))),
+        })
+
+    return {"divisions": division_list, "subjects": subjects, "faculty": faculty_list, "rooms": room_list}
+
+
+def ladder_schema(size, tightness=0.8, seed=0):
+    """Schema for a named rung of SIZE_LADDER."""
+    if size not in SIZE_LADDER:
+        raise ValueError(f"Unknown size '{size}', expected one of {list(SIZE_LADDER)}")
+    return generate_schema(**SIZE_LADDER[size], tightness=tightness, seed=seed)
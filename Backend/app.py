@@ -42,6 +42,7 @@ from Routes.password_routes import password_bp
 from Routes.student_routes import student_bp  # ✅ student route for form submission
 from Routes.contact_routes import contact_bp
 from Routes.solver_routes import solver_bp
+from Routes.timetable_routes import timetable_bp
 
 
 
@@ -57,6 +58,7 @@ app.register_blueprint(password_bp)
 app.register_blueprint(student_bp) 
 app.register_blueprint(contact_bp)
 app.register_blueprint(solver_bp)
+app.register_blueprint(timetable_bp)
 
 
 # Health check route
@@ -41,6 +41,31 @@ class Config:
     AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
     AWS_S3_ENCRYPTION = os.getenv("AWS_S3_ENCRYPTION", "AES256")  # Server-side encryption
 
+    # -----------------------
+    # Timetable Solver Settings
+    # -----------------------
+    SOLVER_MAX_WORKERS = int(os.getenv("SOLVER_MAX_WORKERS", "2"))  # Solves running at once, jobs and requests
+    SOLVER_MAX_PENDING_JOBS = int(os.getenv("SOLVER_MAX_PENDING_JOBS", "20"))  # Queued + running jobs
+    SOLVER_JOB_TTL_SECONDS = int(os.getenv("SOLVER_JOB_TTL_SECONDS", "3600"))  # Keep finished jobs this long
+    SOLVER_DECOMPOSE_WORKERS = int(os.getenv("SOLVER_DECOMPOSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    SOLVER_TOTAL_CORES = int(os.getenv("SOLVER_TOTAL_CORES", str(os.cpu_count() or 1)))  # Search workers shared out between running solves
+    SOLVER_TENANT_MAX_RUNNING = int(os.getenv("SOLVER_TENANT_MAX_RUNNING", "1"))  # Per admin and priority
+    SOLVER_TENANT_MAX_QUEUED = int(os.getenv("SOLVER_TENANT_MAX_QUEUED", "5"))  # Per admin, further solves get 429
+    SOLVER_QUEUE_WAIT_SECONDS = float(os.getenv("SOLVER_QUEUE_WAIT_SECONDS", "120"))  # Longest wait of a synchronous solve for its turn
+    SOLVER_FAIR_SHARE_HALF_LIFE_SECONDS = float(os.getenv("SOLVER_FAIR_SHARE_HALF_LIFE_SECONDS", "900"))  # Past usage counts half after this
+    SOLVER_MAX_SEARCH_WORKERS = int(os.getenv("SOLVER_MAX_SEARCH_WORKERS", str(os.cpu_count() or 1)))  # CP-SAT threads per solve
+    SOLVER_MAX_TIME_SECONDS = float(os.getenv("SOLVER_MAX_TIME_SECONDS", "600"))  # Longest time limit a profile may ask for
+    SOLVER_LOG_LEVEL = os.getenv("SOLVER_LOG_LEVEL", "WARNING").upper()  # DEBUG shows the per-batch solver trace
+    SOLVER_CORE_TIME_SECONDS = float(os.getenv("SOLVER_CORE_TIME_SECONDS", "10"))  # Explaining an infeasible schema, 0 disables
+    SOLVER_MAX_ALTERNATIVES = int(os.getenv("SOLVER_MAX_ALTERNATIVES", "20"))  # Timetables per /generate/alternatives
+    SOLVER_CACHE_DIR = os.getenv("SOLVER_CACHE_DIR", os.path.join(os.getcwd(), "solver_cache"))
+    SOLVER_CACHE_MEMORY_BYTES = int(os.getenv("SOLVER_CACHE_MEMORY_BYTES", str(16 * 1024 * 1024)))
+    SOLVER_CACHE_DISK_BYTES = int(os.getenv("SOLVER_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+    SOLVER_MAX_SESSIONS = int(os.getenv("SOLVER_MAX_SESSIONS", "100"))  # Schema sessions kept, least recently used dropped first
+    SOLVER_SESSION_TTL_SECONDS = int(os.getenv("SOLVER_SESSION_TTL_SECONDS", "3600"))  # Unused sessions expire after this
+    TIMETABLE_STORE_PATH = os.getenv("TIMETABLE_STORE_PATH", os.path.join(os.getcwd(), "timetable_store.db"))
+    TIMETABLE_STORE_CACHE_ENTRIES = int(os.getenv("TIMETABLE_STORE_CACHE_ENTRIES", "32"))  # Saved versions whose views stay loaded
+
     @staticmethod
     def allowed_file(filename):
         """Check if the file has an allowed extension."""
@@ -0,0 +1,42 @@
+import pytest
+from flask import Flask
+
+from Routes.solver_routes import solver_bp
+from Solver.compact import from_compact, to_compact
+from Solver.model import DAY_NAMES, LUNCH_BREAK_SLOTS, SLOTS_PER_DAY
+from Solver.workload import ladder_schema
+
+
+def timetable():
+    day = ["LUNCH BREAK" if s in LUNCH_BREAK_SLOTS else "-" for s in range(SLOTS_PER_DAY)]
+    day[0] = "D01-T1\nF1\nCR1"
+    day[1] = "D01-L1\nTBA"
+    return {"D01": {"batches": {"B1": {name: list(day) for name in DAY_NAMES},
+                                "B2": {name: list(day) for name in DAY_NAMES}}}}
+
+
+def test_compact_round_trip():
+    assert from_compact(to_compact(timetable())) == timetable()
+
+
+@pytest.mark.parametrize("change", [
+    {"cells": 99}, {"cells": -5}, {"classes": [[0, 5, 0]]}, {"classes": [[0, 0]]},
+    {"shape": "rows"}, {"days": ["Mon"]}, {"batches": [["B1", "B2", "B3"]]}, {"divisions": ["D01", "D02"]},
+])
+def test_malformed_compact_timetables_raise_value_error(change):
+    compact = to_compact(timetable())
+    if change.keys() == {"cells"}:
+        compact["cells"][0] = change["cells"]
+    else:
+        compact.update(change)
+    with pytest.raises(ValueError):
+        from_compact(compact)
+
+
+def test_verify_rejects_out_of_range_cells_with_400():
+    app = Flask("test")
+    app.register_blueprint(solver_bp)
+    compact = to_compact(timetable())
+    compact["cells"][0] = -5
+    response = app.test_client().post("/generate/verify", json={"schema": ladder_schema("tiny"), "timetable": compact})
+    assert response.status_code == 400
@@ -0,0 +1,44 @@
+import pytest
+from flask import Flask
+
+from config import Config
+from Routes.solver_routes import _read_solve_request
+from Solver.profiles import fit_to_cores, resolve_profile, slot_cores
+from Solver.scheduler import FairShareScheduler
+
+SCHEMA = {"divisions": [], "subjects": [], "faculty": [], "rooms": []}
+
+
+def cache_key(**body):
+    with Flask("test").test_request_context("/generate", method="POST", json={"schema": SCHEMA, **body}):
+        return _read_solve_request()[1]
+
+
+def test_cache_key_follows_profile_overrides():
+    plain = cache_key(profile="balanced")
+    assert cache_key(profile="balanced", solver_options={"first_solution": True, "time_limit": 5}) != plain
+    for override in ({"seed": 3}, {"deterministic": True}, {"symmetry_breaking": True}):
+        assert cache_key(solver_options=override) != plain
+
+
+def test_cache_key_ignores_workers_and_log():
+    assert cache_key(solver_options={"workers": 1, "log": False}) == cache_key()
+
+
+def test_deterministic_profiles_fit_one_scheduler_slot():
+    thorough = resolve_profile("thorough")
+    assert thorough["workers"] == min(slot_cores(), Config.SOLVER_MAX_SEARCH_WORKERS)
+    with pytest.raises(ValueError):
+        resolve_profile("thorough", {"workers": slot_cores() + 1})
+    settings, pool = fit_to_cores(thorough, thorough["workers"])
+    assert settings["workers"] == thorough["workers"] and pool <= thorough["workers"]
+
+
+def test_scheduler_grants_and_bills_a_full_slot_share():
+    scheduler = FairShareScheduler(max_running=2, total_cores=4, tenant_max_running=1, tenant_max_queued=5,
+                                   half_life_seconds=900)
+    granted = {}
+    scheduler.enqueue("a", "1", "interactive", 8, lambda cores: granted.__setitem__("a", cores))
+    scheduler.enqueue("b", "2", "interactive", 2, lambda cores: granted.__setitem__("b", cores))
+    assert granted == {"a": 2, "b": 2}
+    assert scheduler.snapshot()["cores"] == 4
@@ -0,0 +1,73 @@
+from Solver.batch import solve_departments
+from Solver.profiles import resolve_profile
+from Solver.rooms import capacity_groups, crossing_groups
+from Solver.workload import ladder_schema
+
+PROFILE = resolve_profile(None, {"time_limit": 60, "log": False})
+
+
+def department(name, seed):
+    """A generated department whose lectures use any classroom: its own or the one everyone declares."""
+    schema = ladder_schema("small", seed=seed)
+    for fac in schema["faculty"]:
+        fac["abbr"] = name + fac["abbr"]
+    for subj in schema["subjects"]:
+        subj["faculty"] = [name + abbr for abbr in subj["faculty"]]
+        if subj["type"] == "Theory":
+            subj.update(required_room="", room_type="Classroom")
+        else:
+            subj["required_room"] = name + subj["required_room"]
+    schema["rooms"] = [
+        {"name": "SHARED", "type": "Classroom", "capacity": 60},
+        {"name": name + "CR", "type": "Classroom", "capacity": 60},
+        {"name": name + "LAB1", "type": "Lab", "capacity": 30},
+        {"name": name + "LAB2", "type": "Lab", "capacity": 30},
+    ]
+    return {"name": name, "schema": schema}
+
+
+def test_capacity_groups_grow_linearly_with_crossing_departments():
+    departments = 14
+    classes = {(n, c): ("SHARED", f"R{n}") for n in range(departments) for c in range(10)}
+    groups = capacity_groups(classes)
+    assert len(groups) == departments + 1
+    assert groups[-1][0] == sorted({"SHARED"} | {f"R{n}" for n in range(departments)})
+    (room_names, by_set), = crossing_groups(classes)
+    assert len(room_names) == departments + 1 and len(by_set) == departments
+
+
+def test_nested_rooms_need_no_sharing():
+    classes = {"big": ("CR2",), "any": ("CR1", "CR2"), "lab": ("LAB1",)}
+    assert crossing_groups(classes) == []
+    assert [names for names, _ in capacity_groups(classes)] == [["CR2"], ["LAB1"], ["CR1", "CR2"]]
+
+
+def test_twelve_departments_sharing_a_room_all_get_rooms():
+    report = solve_departments([department(f"K{n}", seed) for n, seed in enumerate([1, 3, 4, 5] * 3)],
+                               profile=PROFILE, max_workers=1)
+    (group,) = report["groups"]
+    assert group["meta"]["status"] in ("OPTIMAL", "FEASIBLE")
+    assert not group["meta"].get("unassigned_rooms")
+
+    # room -> the classes in it per slot; a lecture shows in every batch grid of its division
+    held = {}
+    for name, result in report["departments"].items():
+        for div_name, div_data in result["timetable"].items():
+            for batch, schedule in div_data["batches"].items():
+                for day, cells in schedule.items():
+                    for s, cell in enumerate(cells):
+                        parts = cell.split("\n")
+                        if len(parts) == 3:
+                            lab = "-L" in parts[0]
+                            held.setdefault((day, s, parts[2]), set()).add((name, div_name, lab and batch, parts[0]))
+    assert all(len(classes) == 1 for classes in held.values())
+
+
+def test_crossing_rooms_short_in_a_slot_are_infeasible():
+    pins = [{"division": div_name, "day": 0, "slot": 0, "subject": div_name + "-T1"} for div_name in ("D01", "D02")]
+    departments = [department("X", 1), department("Y", 3), department("Z", 4)]
+    for dept in departments[:2]:
+        dept["fixed_positions"] = pins
+    # X and Y hold four lectures at once but only SHARED, XCR and YCR can take them
+    report = solve_departments(departments, profile=PROFILE, max_workers=1)
+    assert report["groups"][0]["meta"]["status"] == "INFEASIBLE"
@@ -0,0 +1,97 @@
+import copy
+
+import pytest
+
+from Solver.compact import to_compact
+from Solver.decompose import solve_schema
+from Solver.model import DAY_NAMES, ENCODINGS, LECTURES_PER_DAY, LUNCH_BREAK_SLOTS
+from Solver.profiles import resolve_profile
+from Solver.verify import verify_timetable
+from Solver.workload import ladder_schema
+
+PROFILE = resolve_profile(None, {"time_limit": 30, "log": False})
+
+
+def solve(schema, encoding="onehot"):
+    timetable, meta = solve_schema(schema, encoding=encoding, profile=PROFILE)
+    assert meta["status"] in ("OPTIMAL", "FEASIBLE")
+    return timetable
+
+
+def errors(timetable, schema):
+    return [issue for issue in verify_timetable(timetable, schema) if issue["severity"] == "error"]
+
+
+@pytest.fixture(scope="module")
+def solved():
+    schema = ladder_schema("tiny")
+    return schema, solve(schema)
+
+
+def lecture_slots(timetable, schema, div_name="D01"):
+    """(day, slot, subject code) of every lecture the division holds, in order."""
+    lectures = {subj["code"] for subj in schema["subjects"] if subj["type"] == "Theory"}
+    schedules = list(timetable[div_name]["batches"].values())
+    for day in DAY_NAMES:
+        for s, cell in enumerate(schedules[0][day]):
+            code = cell.split("\n")[0]
+            if code in lectures and all(schedule[day][s] == cell for schedule in schedules):
+                yield day, s, code
+
+
+def lab_cell(subj):
+    return "\n".join([subj["code"], subj["faculty"][0], subj["required_room"]])
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("size, seed", [("tiny", 0), ("small", 0), ("small", 1)])
+def test_solver_output_passes_the_verifier(size, seed, encoding):
+    schema = ladder_schema(size, seed=seed)
+    timetable = solve(schema, encoding)
+    assert errors(timetable, schema) == []
+    assert errors(to_compact(timetable), schema) == []
+
+
+def test_class_in_lunch_break(solved):
+    schema, timetable = solved
+    timetable = copy.deepcopy(timetable)
+    day, s, _ = next(lecture_slots(timetable, schema))
+    for schedule in timetable["D01"]["batches"].values():
+        schedule[day][LUNCH_BREAK_SLOTS[0]] = schedule[day][s]
+    lunch = [issue for issue in errors(timetable, schema) if issue["check"] == "lunch"]
+    assert {(issue["day"], issue["slot"]) for issue in lunch} == {(day, LUNCH_BREAK_SLOTS[0])}
+
+
+def test_daily_count(solved):
+    schema, timetable = solved
+    timetable = copy.deepcopy(timetable)
+    day, s, _ = next(lecture_slots(timetable, schema))
+    batch, schedule = next(iter(timetable["D01"]["batches"].items()))
+    schedule[day][s] = "-"
+    (issue,) = [issue for issue in errors(timetable, schema) if issue["check"] == "daily_count"]
+    assert (issue["batch"], issue["day"], issue["available"]) == (batch, day, LECTURES_PER_DAY - 1)
+
+
+def test_faculty_clash(solved):
+    schema, timetable = solved
+    timetable = copy.deepcopy(timetable)
+    subjects = {subj["code"]: subj for subj in schema["subjects"]}
+    labs = [subj for subj in schema["subjects"] if subj["type"] == "Lab"]
+    # One batch takes a lab from the faculty member lecturing the other batch
+    day, s, lab = next((day, s, lab) for day, s, code in lecture_slots(timetable, schema) for lab in labs
+                       if lab["faculty"][0] in subjects[code]["faculty"])
+    next(iter(timetable["D01"]["batches"].values()))[day][s] = lab_cell(lab)
+    clashes = [issue for issue in errors(timetable, schema) if issue["check"] == "faculty_clash"]
+    assert [(issue["faculty"], issue["day"], issue["slot"]) for issue in clashes] == [(lab["faculty"][0], day, s)]
+
+
+def test_room_double_booking(solved):
+    schema, timetable = solved
+    timetable = copy.deepcopy(timetable)
+    first, second = [subj for subj in schema["subjects"] if subj["type"] == "Lab"][:2]
+    assert first["required_room"] == second["required_room"]
+    day, s, _ = next(lecture_slots(timetable, schema))
+    for schedule, lab in zip(timetable["D01"]["batches"].values(), (first, second)):
+        schedule[day][s] = lab_cell(lab)
+    clashes = [issue for issue in errors(timetable, schema) if issue["check"] == "room_clash"]
+    assert [(issue["room"], issue["day"], issue["slot"]) for issue in clashes] == [(first["required_room"], day, s)]
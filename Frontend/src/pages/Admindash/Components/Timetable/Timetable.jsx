@@ -276,7 +276,8 @@ export default function TimetableForm() {
                 if (slot && slot !== "-") {
                   const parts = slot.split('\n');
                   if (parts.length >= 2) {
-                    return `${parts[0]}\n${parts[1]}`;
+                    // Code, faculty and, when assigned, the room
+                    return parts.slice(0, 3).join('\n');
                   }
                   return slot;
                 }
@@ -373,7 +374,9 @@ export default function TimetableForm() {
             const activity = grid[dayIndex][slotIndex];
             if (activity && activity !== '' && activity !== 'LUNCH\nBREAK') {
               const parts = activity.split('\n');
-              if (parts.length >= 2) {
+              if (parts.length >= 3) {
+                slotActivities.push(`${parts[0]}(${parts[1]})-${batch} [${parts[2]}]`);
+              } else if (parts.length >= 2) {
                 slotActivities.push(`${parts[0]}(${parts[1]})-${batch}`);
               } else {
                 slotActivities.push(`${activity}-${batch}`);